@@ -6,6 +6,9 @@ const STATUSES = {
   cancelled: { label: 'Отменено', color: '#f87171', emoji: '❌' }
 };
 
+// the same rule as REVENUE_STATUSES on the server: paid or completed orders, bucketed by creation date
+const REVENUE_STATUSES = ['paid', 'completed'];
+
 const PACKAGE_LABELS = {
   single: 'Single Test',
   mini: 'Mini Audit',
@@ -96,13 +99,7 @@ async function init() {
     return;
   }
 
-  state.orders = dataset.orders.map((order) => ({
-    ...order,
-    createdAt: new Date(order.createdAt),
-    paidAt: order.paidAt ? new Date(order.paidAt) : null,
-    startedAt: order.startedAt ? new Date(order.startedAt) : null,
-    completedAt: order.completedAt ? new Date(order.completedAt) : null
-  }));
+  state.orders = dataset.orders.map(hydrateOrder);
   state.testers = dataset.testers;
   state.activity = dataset.activity
     .map((item) => ({ ...item, createdAt: new Date(item.createdAt) }))
@@ -118,10 +115,68 @@ async function init() {
   attachEventListeners();
   renderAll();
 
-  setInterval(() => {
-    state.lastSync = new Date();
+  if (window.PaymentQA_subscribeOrders) {
+    window.PaymentQA_subscribeOrders({ onOrder: applyOrderChange, onRemove: applyOrderRemoval, onReset: applyReset });
+  }
+}
+
+function hydrateOrder(order) {
+  return {
+    ...order,
+    createdAt: new Date(order.createdAt),
+    paidAt: order.paidAt ? new Date(order.paidAt) : null,
+    startedAt: order.startedAt ? new Date(order.startedAt) : null,
+    completedAt: order.completedAt ? new Date(order.completedAt) : null
+  };
+}
+
+let renderScheduled = false;
+
+function scheduleRender() {
+  state.lastSync = new Date();
+  if (renderScheduled) return;
+  renderScheduled = true;
+  // a burst of change events costs one render per frame
+  requestAnimationFrame(() => {
+    renderScheduled = false;
     document.getElementById('last-sync').textContent = 'только что';
-  }, 30000);
+    renderAll();
+  });
+}
+
+function applyOrderChange(order) {
+  const hydrated = hydrateOrder(order);
+  const index = state.orders.findIndex((item) => item.id === hydrated.id);
+  if (index === -1) {
+    state.orders.unshift(hydrated);
+    state.activity.unshift({
+      id: `order_${hydrated.id}`,
+      type: 'order_created',
+      title: `Заказ #${hydrated.orderNumber}`,
+      user: hydrated.client.username || hydrated.client.telegramId || hydrated.id,
+      status: hydrated.status,
+      createdAt: hydrated.createdAt,
+      meta: { source: hydrated.source, geo: hydrated.geo }
+    });
+  } else {
+    const current = state.orders[index];
+    state.orders[index] = { ...hydrated, credentials: current.credentials, notes: current.notes, testerId: current.testerId };
+  }
+  scheduleRender();
+}
+
+function applyOrderRemoval(orderId) {
+  state.orders = state.orders.filter((order) => order.id !== orderId);
+  state.selected.delete(orderId);
+  scheduleRender();
+}
+
+function applyReset(dataset) {
+  state.orders = dataset.orders.map(hydrateOrder);
+  state.activity = dataset.activity
+    .map((item) => ({ ...item, createdAt: new Date(item.createdAt) }))
+    .sort((a, b) => b.createdAt - a.createdAt);
+  scheduleRender();
 }
 
 function hydrateFilters() {
@@ -153,7 +208,16 @@ function hydratePageSize() {
 }
 
 function attachEventListeners() {
-  document.getElementById('refresh-data').addEventListener('click', () => {
+  document.getElementById('refresh-data').addEventListener('click', async () => {
+    if (window.PaymentQA_syncOrders) {
+      try {
+        const { orders, removed } = await window.PaymentQA_syncOrders();
+        orders.forEach(applyOrderChange);
+        removed.forEach(applyOrderRemoval);
+      } catch (error) {
+        console.warn('Не удалось получить изменения заказов', error);
+      }
+    }
     showToast('🔄', 'Данные обновлены');
     state.lastSync = new Date();
     renderAll();
@@ -403,6 +467,29 @@ function handleFilterChange(event) {
   renderOrders();
   renderMetrics();
   renderCharts();
+  scheduleOrderSearch();
+}
+
+function scheduleOrderSearch() {
+  clearTimeout(state.searchTimer);
+  const query = state.filters.query;
+  if (!query) return;
+  state.searchTimer = setTimeout(() => loadSearchMatches(query), 250);
+}
+
+async function loadSearchMatches(query) {
+  // the loaded page only holds the latest orders; the API searches the whole history through its index
+  let orders;
+  try {
+    orders = await searchOrders(query);
+  } catch (error) {
+    return;
+  }
+  if (query !== state.filters.query) return;
+  const known = new Set(state.orders.map((order) => order.id));
+  orders.filter((order) => !known.has(order.id)).forEach((order) => state.orders.push(hydrateOrder(order)));
+  state.search = { query, ids: new Set(orders.map((order) => order.id)) };
+  renderOrders();
 }
 
 function resetFilters() {
@@ -488,9 +575,8 @@ function calculateMetrics() {
     return { id, title, value, previousValue, delta: deltaFormatted, trend, ...extra };
   }
 
-  const revenueStatuses = ['paid', 'in_progress', 'completed'];
-  const currentRevenueOrders = currentOrders.filter((order) => revenueStatuses.includes(order.status));
-  const previousRevenueOrders = previousOrders.filter((order) => revenueStatuses.includes(order.status));
+  const currentRevenueOrders = currentOrders.filter((order) => REVENUE_STATUSES.includes(order.status));
+  const previousRevenueOrders = previousOrders.filter((order) => REVENUE_STATUSES.includes(order.status));
 
   const totalRevenue = currentRevenueOrders.reduce((acc, order) => acc + order.priceEur, 0);
   const previousRevenue = previousRevenueOrders.reduce((acc, order) => acc + order.priceEur, 0);
@@ -503,18 +589,16 @@ function calculateMetrics() {
   const nowYear = now.getFullYear();
   const monthRevenueOrders = state.orders.filter(
     (order) =>
-      order.paidAt &&
-      order.paidAt.getMonth() === nowMonth &&
-      order.paidAt.getFullYear() === nowYear &&
-      revenueStatuses.includes(order.status)
+      order.createdAt.getMonth() === nowMonth &&
+      order.createdAt.getFullYear() === nowYear &&
+      REVENUE_STATUSES.includes(order.status)
   );
   const prevMonth = new Date(nowYear, nowMonth - 1, 1);
   const prevMonthOrders = state.orders.filter(
     (order) =>
-      order.paidAt &&
-      order.paidAt.getMonth() === prevMonth.getMonth() &&
-      order.paidAt.getFullYear() === prevMonth.getFullYear() &&
-      revenueStatuses.includes(order.status)
+      order.createdAt.getMonth() === prevMonth.getMonth() &&
+      order.createdAt.getFullYear() === prevMonth.getFullYear() &&
+      REVENUE_STATUSES.includes(order.status)
   );
   const monthRevenue = monthRevenueOrders.reduce((acc, order) => acc + order.priceEur, 0);
   const monthRevenuePrev = prevMonthOrders.reduce((acc, order) => acc + order.priceEur, 0);
@@ -593,7 +677,7 @@ function calculateMetrics() {
     icon: '🔁'
   });
 
-  const revenueCount = state.orders.filter((order) => revenueStatuses.includes(order.status)).length;
+  const revenueCount = state.orders.filter((order) => REVENUE_STATUSES.includes(order.status)).length;
   const conversion = state.orders.length ? (revenueCount / state.orders.length) * 100 : 0;
   result.conversion = makeMetric('conversion', 'Конверсия старт→оплата', conversion, conversion - 3, {
     formatted: `${conversion.toFixed(1)}%`,
@@ -748,9 +832,9 @@ function renderRevenueChart({ from, to }) {
   }
 
   state.orders.forEach((order) => {
-    if (!order.paidAt) return;
-    if (order.paidAt < from || order.paidAt > to) return;
-    const key = order.paidAt.toISOString().slice(0, 10);
+    if (!REVENUE_STATUSES.includes(order.status)) return;
+    if (order.createdAt < from || order.createdAt > to) return;
+    const key = order.createdAt.toISOString().slice(0, 10);
     const entry = seriesMap.get(key);
     if (entry) {
       entry.amount += order.priceEur;
@@ -758,6 +842,41 @@ function renderRevenueChart({ from, to }) {
     }
   });
 
+  drawRevenueChart(days, seriesMap);
+  loadRevenueSeries(days, from, to);
+}
+
+async function loadRevenueSeries(days, from, to) {
+  // the loaded page only holds the latest orders; the API answers from rollups that cover the whole history
+  const request = (state.revenueRequest = (state.revenueRequest || 0) + 1);
+  const end = new Date(to);
+  end.setDate(end.getDate() + 1);
+  const range = { bucket: 'day', from: new Date(from).toISOString().slice(0, 10), to: end.toISOString().slice(0, 10) };
+  let revenue;
+  let orders;
+  try {
+    [revenue, orders] = await Promise.all([
+      fetchTimeseries({ ...range, metric: 'revenue' }),
+      fetchTimeseries({ ...range, metric: 'orders', group: 'status' })
+    ]);
+  } catch (error) {
+    return;
+  }
+  if (request !== state.revenueRequest) return;
+  const seriesMap = new Map(days.map((day) => [day, { amount: 0, orders: 0 }]));
+  const fill = (payload, field, series) => {
+    payload.buckets.forEach((bucket, index) => {
+      const entry = seriesMap.get(bucket.slice(0, 10));
+      if (entry) entry[field] = series.reduce((sum, item) => sum + (item.values[index] ?? 0), 0);
+    });
+  };
+  fill(revenue, 'amount', revenue.series);
+  // only orders that count towards revenue, as in the fallback above
+  fill(orders, 'orders', orders.series.filter((item) => REVENUE_STATUSES.includes(item.key)));
+  drawRevenueChart(days, seriesMap);
+}
+
+function drawRevenueChart(days, seriesMap) {
   const labels = days.map((day) => day.slice(5).split('-').reverse().join('.'));
   const data = days.map((day) => seriesMap.get(day)?.amount ?? 0);
 
@@ -1017,7 +1136,8 @@ function getFilteredOrders() {
       ]
         .join(' ')
         .toLowerCase();
-      if (!haystack.includes(state.filters.query.toLowerCase())) return false;
+      const serverMatch = state.search?.query === state.filters.query && state.search.ids.has(order.id);
+      if (!serverMatch && !haystack.includes(state.filters.query.toLowerCase())) return false;
     }
 
     if (state.filters.period !== 'all' && state.filters.period !== 'custom') {
@@ -1411,8 +1531,8 @@ function openOrderModal(orderId) {
               ? `<a href="${order.websiteUrl}" target="_blank">${order.websiteUrl}</a>`
               : '—'
           }</div>
-          <div class="order-grid__item"><span>Логин</span>${order.credentials?.login || '—'}</div>
-          <div class="order-grid__item"><span>Пароль</span>${order.credentials?.password ? '••••••' : '—'}</div>
+          <div class="order-grid__item"><span>Логин</span><span data-credential="login">—</span></div>
+          <div class="order-grid__item"><span>Пароль</span><span data-credential="password">—</span></div>
         </div>
         <p><span class="badge">Комментарий клиента</span><br />${order.comments || 'Нет комментариев'}</p>
       </section>
@@ -1453,8 +1573,33 @@ function openOrderModal(orderId) {
       </section>
     </div>`;
 
+  dialog.dataset.orderId = order.id;
+  renderModalCredentials(container, order.credentials);
+  // the list endpoint leaves credentials out, so fetch them the way the order page does
+  if (order.credentials === null && window.PaymentQA_loadCredentials) {
+    container.querySelectorAll('[data-credential]').forEach((item) => {
+      item.textContent = '…';
+    });
+    window.PaymentQA_loadCredentials(order.id)
+      .then((credentials) => {
+        order.credentials = credentials;
+      })
+      .catch((error) => {
+        console.warn('Не удалось загрузить доступы заказа', error);
+      })
+      .finally(() => {
+        if (dialog.open && dialog.dataset.orderId === String(order.id)) {
+          renderModalCredentials(container, order.credentials);
+        }
+      });
+  }
   dialog.showModal();
 }
+
+function renderModalCredentials(container, credentials) {
+  container.querySelector('[data-credential="login"]').textContent = credentials?.login || '—';
+  container.querySelector('[data-credential="password"]').textContent = credentials?.password ? '••••••' : '—';
+}
 function openNoteModal(orderId) {
   const dialog = document.getElementById('note-modal');
   dialog.dataset.orderId = orderId;
@@ -118,7 +118,7 @@ function mapApiOrder(order) {
     testerId: null,
     paymentMethod: order.paymentMethod || '',
     websiteUrl: order.siteUrl || '',
-    credentials: { login: order.login || '', password: order.password || '' },
+    credentials: null,
     comments: order.comments || '',
     reportUrl: null,
     attachments: [],
@@ -133,14 +133,59 @@ function mapApiOrder(order) {
   };
 }
 
+const apiOrderCache = new Map();
+let changeCursor = null;
+
+function rememberApiOrders(orders) {
+  apiOrderCache.clear();
+  orders.forEach((order) => apiOrderCache.set(order.id, order));
+}
+
+async function fetchChanges(since) {
+  const response = await fetch(`/api/orders/changes?since=${encodeURIComponent(since)}`, {
+    headers: { Accept: 'application/json' }
+  });
+  if (!response.ok) {
+    throw new Error(`API returned ${response.status}`);
+  }
+  return response.json();
+}
+
+async function fetchTimeseries({ metric, group, bucket, from, to }) {
+  const params = new URLSearchParams({ metric, bucket });
+  if (group) params.set('group', group);
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+  const response = await fetch(`/api/stats/timeseries?${params}`, { headers: { Accept: 'application/json' } });
+  if (!response.ok) {
+    throw new Error(`API returned ${response.status}`);
+  }
+  return response.json();
+}
+
+async function searchOrders(query) {
+  const params = new URLSearchParams({ q: query, limit: '100' });
+  const response = await fetch(`/api/orders/search?${params}`, { headers: { Accept: 'application/json' } });
+  if (!response.ok) {
+    throw new Error(`API returned ${response.status}`);
+  }
+  const payload = await response.json();
+  payload.orders.forEach((order) => apiOrderCache.set(order.id, order));
+  return payload.orders.map(mapApiOrder);
+}
+
 async function loadAdminData() {
   try {
+    // take the cursor before the list so nothing written in between is missed
+    changeCursor = (await fetchChanges('latest')).cursor;
     const response = await fetch('/api/orders', { headers: { Accept: 'application/json' } });
     if (!response.ok) {
       throw new Error(`API returned ${response.status}`);
     }
     const payload = await response.json();
-    const apiOrders = Array.isArray(payload.orders) ? payload.orders.map(mapApiOrder) : [];
+    const rawOrders = Array.isArray(payload.orders) ? payload.orders : [];
+    rememberApiOrders(rawOrders);
+    const apiOrders = rawOrders.map(mapApiOrder);
     const orders = apiOrders.length ? apiOrders : FALLBACK_ORDERS;
     return {
       orders,
@@ -159,4 +204,80 @@ async function loadAdminData() {
   }
 }
 
+async function loadOrderCredentials(orderId) {
+  const response = await fetch(`/api/orders/${orderId}?fields=id,login,password`, {
+    headers: { Accept: 'application/json' }
+  });
+  if (!response.ok) {
+    throw new Error(`API returned ${response.status}`);
+  }
+  const payload = await response.json();
+  return { login: payload.login || '', password: payload.password || '' };
+}
+
+async function fetchApiOrder(orderId) {
+  const response = await fetch(`/api/orders/${orderId}`, { headers: { Accept: 'application/json' } });
+  if (!response.ok) {
+    throw new Error(`API returned ${response.status}`);
+  }
+  return response.json();
+}
+
+async function syncOrderChanges() {
+  if (!changeCursor) return { orders: [], removed: [] };
+  const orders = [];
+  const removed = [];
+  let page;
+  do {
+    page = await fetchChanges(changeCursor);
+    page.orders.forEach((order) => {
+      apiOrderCache.set(order.id, order);
+      orders.push(mapApiOrder(order));
+    });
+    page.tombstones.forEach((tombstone) => {
+      apiOrderCache.delete(tombstone.id);
+      removed.push(tombstone.id);
+    });
+    changeCursor = page.cursor;
+  } while (page.hasMore);
+  return { orders, removed };
+}
+
+function subscribeOrderChanges({ onOrder, onRemove, onReset }) {
+  if (typeof EventSource === 'undefined') return null;
+  // EventSource reconnects by itself and sends Last-Event-ID, a database cursor any API worker can resume from
+  const source = new EventSource('/api/orders/stream');
+  source.addEventListener('order', async (event) => {
+    const delta = JSON.parse(event.data);
+    if (delta.op === 'removed') {
+      apiOrderCache.delete(delta.id);
+      onRemove(delta.id);
+      return;
+    }
+    let raw = apiOrderCache.get(delta.id);
+    try {
+      if (raw) {
+        raw = { ...raw, ...delta.changes };
+      } else if (delta.op === 'created' && delta.changes.createdAt) {
+        raw = { id: delta.id, ...delta.changes };
+      } else {
+        raw = await fetchApiOrder(delta.id);
+      }
+    } catch (error) {
+      console.warn('Не удалось получить заказ из потока изменений', error);
+      return;
+    }
+    apiOrderCache.set(delta.id, raw);
+    onOrder(mapApiOrder(raw));
+  });
+  source.addEventListener('reset', async () => {
+    const dataset = await loadAdminData();
+    onReset(dataset);
+  });
+  return source;
+}
+
 window.PaymentQA_DATA_PROMISE = loadAdminData();
+window.PaymentQA_loadCredentials = loadOrderCredentials;
+window.PaymentQA_subscribeOrders = subscribeOrderChanges;
+window.PaymentQA_syncOrders = syncOrderChanges;
@@ -179,6 +179,21 @@ function renderDetailsSection(order) {
       <div class="order-grid__item"><span>Комментарий клиента</span>${order.comments || 'Нет комментариев'}</div>
     </div>
   `;
+  if (order.credentials === null && window.PaymentQA_loadCredentials) {
+    order.credentials = { login: '…', password: '…' };
+    window
+      .PaymentQA_loadCredentials(order.id)
+      .then((credentials) => {
+        order.credentials = credentials;
+      })
+      .catch((error) => {
+        console.warn('Не удалось загрузить доступы заказа', error);
+        order.credentials = { login: '', password: '' };
+      })
+      .finally(() => {
+        if (orders[orderIndex] === order) renderDetailsSection(order);
+      });
+  }
 }
 
 function renderFilesSection(order) {
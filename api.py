@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+from payment_qa_bot.api.service import main
+
+if __name__ == "__main__":
+    main()
@@ -2,43 +2,153 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import TelegramObject
 
 from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.api.service import build_encryptor, build_repositories, start_api_site
 from payment_qa_bot.config import load_config
 from payment_qa_bot.models.db import OrdersRepository
 from payment_qa_bot.routers.admin import get_admin_router
 from payment_qa_bot.routers.public import get_public_router
-from payment_qa_bot.services.security import CredentialEncryptor
+from payment_qa_bot.services.change_feed import relay_changes
+from payment_qa_bot.services.diagnostics import LoopLagMonitor, register_size_probe
+from payment_qa_bot.services.funnel import FunnelTracker
+from payment_qa_bot.services.key_rotation import reencrypt_credentials
+from payment_qa_bot.services.logs import TRACE_ID, new_trace_id, setup_logging
+from payment_qa_bot.services.metrics import REGISTRY
+from payment_qa_bot.services.notifications import AdminNotifier
+from payment_qa_bot.services.outbound import OutboundLimiter, OutboundRequestMiddleware, OutboundScheduler
+from payment_qa_bot.services.rollups import compact_rollups_periodically
+from payment_qa_bot.services.tracing import TRACER, TracedStorage, setup_tracing
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
-def build_dispatcher(repo: OrdersRepository, encryptor, config):
-    dp = Dispatcher()
-    dp.include_router(get_public_router(config, repo, encryptor))
+def build_dispatcher(
+    repo: OrdersRepository,
+    encryptor,
+    config,
+    notifier: AdminNotifier,
+    funnel: Optional[FunnelTracker] = None,
+):
+    # the wrapper only exists to time FSM reads and writes, so it is left out when tracing is off
+    dp = Dispatcher(storage=TracedStorage(MemoryStorage()) if TRACER.enabled else MemoryStorage())
+
+    @dp.update.outer_middleware()
+    async def trace_update(
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_id = getattr(event, "update_id", None)
+        trace_id = new_trace_id()
+        token = TRACE_ID.set(trace_id)
+        try:
+            logger.debug("update %s", update_id)
+            with TRACER.start_trace("update", trace_id, update_id=update_id):
+                return await handler(event, data)
+        finally:
+            TRACE_ID.reset(token)
+
+    dp.include_router(get_public_router(config, repo, encryptor, notifier, funnel=funnel))
     dp.include_router(get_admin_router(config, repo))
     return dp
 
 
+def register_bot_metrics(dp: Dispatcher, outbound: OutboundScheduler, limiter: OutboundLimiter) -> None:
+    storage = dp.storage
+    # MemoryStorage keeps one record per chat/user pair; other storages expose no cheap size
+    REGISTRY.gauge(
+        "bot_fsm_storage_records",
+        "Conversations held in FSM storage",
+        callback=lambda: len(getattr(storage, "storage", ())),
+    )
+    register_size_probe("fsm_storage", lambda: len(getattr(storage, "storage", ())))
+    register_size_probe(
+        "fsm_drafts",
+        lambda: sum(1 for record in getattr(storage, "storage", {}).values() if record.data.get("draft")),
+    )
+    register_size_probe("outbound_queue", lambda: outbound.queue_depth)
+    register_size_probe("outbound_chat_buckets", lambda: limiter.tracked_chats)
+    REGISTRY.gauge("bot_outbound_queue_depth", "Messages waiting in the outbound queue", callback=lambda: outbound.queue_depth)
+    REGISTRY.gauge("bot_outbound_in_flight", "Messages being sent right now", callback=lambda: outbound.in_flight)
+    REGISTRY.counter("bot_outbound_sent_total", "Messages delivered", callback=lambda: outbound.sent)
+    REGISTRY.counter("bot_outbound_failed_total", "Messages given up on", callback=lambda: outbound.failed)
+    REGISTRY.counter("bot_outbound_throttled_total", "Sends delayed by the Telegram rate limiter", callback=lambda: limiter.throttled)
+
+
 async def main() -> None:
     config = load_config()
-    repo = OrdersRepository(config.db_path)
+    setup_logging(config.log_level, json_output=config.log_json, debug_sample=config.log_debug_sample)
+    setup_tracing(config.trace_sample, config.trace_export)
+    lag_monitor: Optional[LoopLagMonitor] = None
+    if config.loop_lag_threshold > 0:
+        lag_monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        lag_monitor.start()
+    repo, read_repo = build_repositories(config)
     await repo.init()
-    encryptor = CredentialEncryptor(config.encryption_key)
+    encryptor, executor = build_encryptor(config)
     bot = Bot(token=config.bot_token, parse_mode="HTML")
-    dp = build_dispatcher(repo, encryptor, config)
-    api_app = create_api_app(repo, encryptor, config)
-    runner = web.AppRunner(api_app)
-    await runner.setup()
-    site = web.TCPSite(runner, host=config.api_host, port=config.api_port)
-    await site.start()
+    limiter = OutboundLimiter(
+        global_rate=config.tg_global_rate,
+        chat_rate=config.tg_chat_rate,
+        group_rate=config.tg_group_rate,
+    )
+    bot.session.middleware(OutboundRequestMiddleware(limiter))
+    await bot.me()
+    outbound = OutboundScheduler(bot, workers=config.outbound_workers)
+    await outbound.start()
+    notifier = AdminNotifier(
+        outbound,
+        config.admin_ids,
+        threshold=config.admin_digest_threshold,
+        window=config.admin_digest_window,
+        language=config.default_language,
+    )
+    funnel: Optional[FunnelTracker] = None
+    if config.funnel_flush_interval > 0:
+        funnel = FunnelTracker(idle_timeout=config.funnel_idle_timeout, flush_interval=config.funnel_flush_interval)
+        funnel.start(repo)
+        register_size_probe("funnel_active_users", lambda: funnel.active_users)
+    dp = build_dispatcher(repo, encryptor, config, notifier, funnel)
+    register_bot_metrics(dp, outbound, limiter)
+    runner: Optional[web.AppRunner] = None
+    if config.api_embedded:
+        api_app = create_api_app(repo, encryptor, config, read_repo=read_repo, lag_monitor=lag_monitor)
+        runner = await start_api_site(api_app, config)
+    background: List[asyncio.Task] = [
+        asyncio.create_task(
+            compact_rollups_periodically(repo, hourly_days=config.rollup_hourly_days), name="compact-rollups"
+        )
+    ]
+    if runner is not None and config.api_change_poll > 0:
+        # the relay also advances the change cursor that stream event ids are built from
+        background.append(
+            asyncio.create_task(relay_changes(repo, interval=config.api_change_poll), name="relay-changes")
+        )
+    if config.encryption_reencrypt_on_start:
+        background.append(asyncio.create_task(reencrypt_credentials(repo, encryptor), name="reencrypt-credentials"))
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
-        await runner.cleanup()
+        await notifier.close()
+        await outbound.stop()
+        if funnel is not None:
+            await funnel.stop(repo)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        if runner is not None:
+            await runner.cleanup()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if lag_monitor is not None:
+            await lag_monitor.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.payment_methods import PAYMENT_METHODS
+from payment_qa_bot.services.pricing import calculate_price
+
+T = TypeVar("T")
+
+# shares roughly follow the production order mix; only the shape matters, not the exact numbers
+GEO_WEIGHTS = {
+    "IN": 28, "BD": 10, "PK": 9, "ID": 9, "PH": 6, "EG": 5, "BR": 5, "TR": 4, "MY": 3,
+    "TH": 3, "VN": 3, "MX": 3, "UZ": 2, "KZ": 2, "CI": 2, "AR": 2, "CO": 2, "AZ": 2,
+}
+# GEOs without a curated list in PAYMENT_METHODS get what users type in by hand
+EXTRA_METHODS = {
+    "BR": ["Pix", "Boleto"],
+    "TR": ["Papara", "Havale"],
+    "VN": ["MoMo", "ZaloPay", "VietQR"],
+    "MX": ["SPEI", "OXXO"],
+    "CO": ["Nequi", "PSE"],
+    "AZ": ["M10", "Bank Transfer"],
+}
+STATUS_WEIGHTS = {
+    "draft": 18, "in_progress": 6, "submitted": 8, "awaiting_payment": 14, "proof_received": 4,
+    "paid": 10, "completed": 30, "cancelled": 8, "archived": 2,
+}
+SOURCE_WEIGHTS = {"tg": 65, "site": 35}
+TESTS_WEIGHTS = {1: 55, 2: 15, 3: 12, 5: 10, 10: 8}
+# (surcharge, withdraw, kyc), the same options the wizard offers
+PAYOUT_WEIGHTS = {(0, False, False): 60, (10, True, False): 30, (25, True, True): 10}
+WIZARD_STATES = ("draft", "in_progress", "submitted")
+PAID_STATUSES = ("proof_received", "paid", "completed", "archived")
+NETWORKS = ("TRC20", "ERC20", "BEP20")
+SITE_BRANDS = ("lucky", "spin", "royal", "bet", "jackpot", "cash", "vegas", "ace", "star", "gold")
+SITE_ZONES = ("com", "in", "io", "bet", "casino", "net")
+MAIL_DOMAINS = ("gmail.com", "yahoo.com", "outlook.com", "proton.me", "mail.ru")
+COMMENTS = (
+    "Deposit via {method} hangs on the confirmation screen",
+    "Check withdrawal to {method} after KYC",
+    "Проверить депозит и вывод через {method}",
+    "{method} callback arrives twice, balance is credited once",
+    "Need a screen recording of the full {method} flow",
+    "Промокод не применяется при оплате {method}",
+    "Refund to {method} takes more than 24h",
+)
+COLUMNS = (
+    "user_id", "username", "source", "state", "start_token", "geo", "method_user_text", "tests_count",
+    "withdraw_required", "custom_test_required", "custom_test_text", "kyc_required", "comments", "site_url",
+    "login", "password_enc", "payout_surcharge", "price_eur", "status", "payment_network", "payment_wallet",
+    "payment_txid", "payment_proof_file_id", "admin_notes", "payload_hash", "tg_user_id", "email",
+    "created_at", "updated_at",
+)
+INSERT_SQL = "INSERT INTO orders ({columns}) VALUES ({placeholders})".format(
+    columns=", ".join(COLUMNS), placeholders=", ".join("?" * len(COLUMNS))
+)
+
+
+def _weighted(weights: Dict[T, int]) -> Tuple[List[T], List[int]]:
+    return list(weights), list(accumulate(weights.values()))
+
+
+class OrderFactory:
+    def __init__(self, *, seed: int, users: int, start: datetime, end: datetime) -> None:
+        self.rng = random.Random(seed)
+        self.users = max(1, users)
+        self.start = start
+        self.span = (end - start).total_seconds()
+        self._geos = _weighted(GEO_WEIGHTS)
+        self._statuses = _weighted(STATUS_WEIGHTS)
+        self._sources = _weighted(SOURCE_WEIGHTS)
+        self._tests = _weighted(TESTS_WEIGHTS)
+        self._payouts = _weighted(PAYOUT_WEIGHTS)
+
+    def _pick(self, choices: Tuple[List[T], List[int]]) -> T:
+        return self.rng.choices(choices[0], cum_weights=choices[1])[0]
+
+    def row(self, index: int, total: int) -> Dict[str, Any]:
+        # order ids and created_at grow together, as they do with AUTOINCREMENT in production
+        rng = self.rng
+        geo = self._pick(self._geos)
+        method = rng.choice(PAYMENT_METHODS.get(geo) or EXTRA_METHODS[geo])
+        status = self._pick(self._statuses)
+        source = self._pick(self._sources)
+        tests = self._pick(self._tests)
+        surcharge, withdraw, kyc = self._pick(self._payouts)
+        user_id = 100_000 + rng.randrange(self.users)
+        username = f"{rng.choice(SITE_BRANDS)}_{user_id:x}" if rng.random() < 0.85 else None
+        created = self.start + timedelta(seconds=self.span * index / max(1, total) + rng.uniform(0, 60))
+        updated = created + timedelta(minutes=rng.randrange(0, 3 * 24 * 60) if status not in WIZARD_STATES else 5)
+        paid = status in PAID_STATUSES
+        custom = rng.random() < 0.1
+        return {
+            "user_id": user_id,
+            "username": username,
+            "source": source,
+            "state": status if status in WIZARD_STATES else "submitted",
+            "start_token": f"{index:x}{rng.getrandbits(40):010x}",
+            "geo": geo,
+            "method_user_text": method,
+            "tests_count": tests,
+            "withdraw_required": int(withdraw),
+            "custom_test_required": int(custom),
+            "custom_test_text": "Test a deposit with a promo code" if custom else None,
+            "kyc_required": int(kyc),
+            "comments": rng.choice(COMMENTS).format(method=method) if rng.random() < 0.4 else None,
+            "site_url": f"https://{rng.choice(SITE_BRANDS)}{rng.randrange(500)}.{rng.choice(SITE_ZONES)}",
+            "login": f"qa{user_id}" if rng.random() < 0.3 else None,
+            "password_enc": None,
+            "payout_surcharge": surcharge,
+            "price_eur": calculate_price(tests, surcharge).total,
+            "status": status,
+            "payment_network": rng.choice(NETWORKS) if paid else None,
+            "payment_wallet": f"T{rng.getrandbits(160):040x}"[:34] if paid else None,
+            "payment_txid": f"{rng.getrandbits(256):064x}" if paid else None,
+            "payment_proof_file_id": f"AgAC{rng.getrandbits(96):024x}" if paid else None,
+            "admin_notes": None,
+            "payload_hash": hashlib.sha256(f"{index}".encode()).hexdigest() if source == "site" else None,
+            "tg_user_id": user_id if source == "tg" or rng.random() < 0.5 else None,
+            "email": f"{username or user_id}@{rng.choice(MAIL_DOMAINS)}" if source == "site" else None,
+            "created_at": created.isoformat(timespec="seconds"),
+            "updated_at": updated.isoformat(timespec="seconds"),
+        }
+
+    def rows(self, first: int, count: int, total: int) -> Iterator[Tuple[Any, ...]]:
+        for index in range(first, first + count):
+            row = self.row(index, total)
+            yield tuple(row[column] for column in COLUMNS)
+
+
+def _derived_objects(db: sqlite3.Connection) -> Sequence[Tuple[str, str]]:
+    # everything init() recreates and backfills by itself: secondary indexes, rollups, the search index
+    return db.execute(
+        """
+        SELECT type, name FROM sqlite_master
+        WHERE (type = 'index' AND tbl_name = 'orders' AND sql IS NOT NULL)
+           OR (type = 'trigger' AND tbl_name = 'orders')
+           OR (type = 'table' AND name IN ('orders_fts', 'order_rollup_state'))
+        """
+    ).fetchall()
+
+
+def generate(
+    db_path: str,
+    count: int,
+    *,
+    chunk_size: int = 20_000,
+    seed: int = 1,
+    days: int = 365,
+    append: bool = False,
+    progress: bool = False,
+) -> float:
+    if os.path.exists(db_path) and not append:
+        raise SystemExit(f"{db_path} already exists, pass --append to add orders to it")
+    repo = OrdersRepository(db_path)
+    asyncio.run(repo.init())
+    started = time.perf_counter()
+    with sqlite3.connect(db_path) as db:
+        first = db.execute("SELECT COALESCE(MAX(order_id), 0) FROM orders").fetchone()[0]
+        if not append:
+            # a fresh file loads without triggers and indexes; init() rebuilds them in one pass afterwards,
+            # which is several times faster than maintaining them row by row
+            for kind, name in _derived_objects(db):
+                db.execute(f"DROP {kind.upper()} {name}")
+            db.commit()
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute("PRAGMA cache_size=-262144")
+        end = datetime.utcnow().replace(microsecond=0)
+        factory = OrderFactory(seed=seed + first, users=count // 3, start=end - timedelta(days=days), end=end)
+        for offset in range(0, count, chunk_size):
+            size = min(chunk_size, count - offset)
+            db.executemany(INSERT_SQL, factory.rows(first + offset, size, first + count))
+            db.commit()
+            if progress:
+                done = offset + size
+                rate = done / (time.perf_counter() - started)
+                print(f"\r{done:,}/{count:,} orders, {rate:,.0f}/s", end="", file=sys.stderr, flush=True)
+        if progress:
+            print(file=sys.stderr)
+    if not append:
+        asyncio.run(repo.init())
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill a SQLite database with synthetic orders")
+    parser.add_argument("db_path")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many days up to now")
+    parser.add_argument("--append", action="store_true", help="add to an existing database with triggers live")
+    args = parser.parse_args()
+
+    elapsed = generate(
+        args.db_path,
+        args.orders,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        days=args.days,
+        append=args.append,
+        progress=True,
+    )
+    print(f"{args.orders:,} orders in {elapsed:.1f} s ({args.orders / elapsed:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from payment_qa_bot.api.encoding import JsonEncoder, get_encoder
+from payment_qa_bot.api.server import DEFAULT_FIELDS, FULL_FIELDS, compile_serializer, encode_orders
+from payment_qa_bot.models.db import OrderRecord
+from payment_qa_bot.services.security import CredentialEncryptor
+
+
+def make_orders(count: int) -> List[OrderRecord]:
+    orders = []
+    for index in range(count):
+        orders.append(
+            OrderRecord(
+                order_id=index + 1,
+                user_id=100000 + index,
+                username=f"user{index}",
+                source="tg" if index % 3 else "site",
+                state="submitted",
+                start_token=f"token{index:08d}",
+                geo=("India", "Brazil", "Turkey", "Kenya")[index % 4],
+                method_user_text="UPI / PhonePe",
+                tests_count=1 + index % 5,
+                withdraw_required=bool(index % 2),
+                custom_test_required=False,
+                custom_test_text=None,
+                kyc_required=index % 7 == 0,
+                comments="Проверить депозит и вывод" if index % 5 == 0 else None,
+                site_url=f"https://casino{index % 50}.example.com",
+                login=f"login{index}",
+                password_enc=f"secret{index}",
+                payout_surcharge=10,
+                price_eur=85 + index % 5 * 85,
+                status="paid" if index % 4 == 0 else "await_payment",
+                payment_network="TRC20",
+                payment_wallet="TXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+                payment_txid=f"{index:064x}" if index % 4 == 0 else None,
+                payment_proof_file_id=None,
+                admin_notes=None,
+                payload_hash=None,
+                tg_user_id=100000 + index,
+                email=None,
+                created_at="2024-05-01T10:00:00+00:00",
+                updated_at="2024-05-01T10:05:00+00:00",
+            )
+        )
+    return orders
+
+
+def _dict_encoder(encoder: JsonEncoder, fields) -> Callable[[List[OrderRecord], CredentialEncryptor], bytes]:
+    serializer = compile_serializer(fields)
+
+    def run(orders: List[OrderRecord], encryptor: CredentialEncryptor) -> bytes:
+        return encoder.dumps({"orders": [serializer(order, encryptor) for order in orders]})
+
+    return run
+
+
+def _slots_encoder(fields) -> Callable[[List[OrderRecord], CredentialEncryptor], bytes]:
+    def run(orders: List[OrderRecord], encryptor: CredentialEncryptor) -> bytes:
+        return encode_orders(orders, encryptor, fields)
+
+    return run
+
+
+def _measure(run, orders, encryptor, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(orders, encryptor)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare JSON encoders for /api/orders payloads")
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--credentials", action="store_true", help="include login/password fields")
+    args = parser.parse_args()
+
+    orders = make_orders(args.orders)
+    encryptor = CredentialEncryptor(None)
+    fields = FULL_FIELDS if args.credentials else DEFAULT_FIELDS
+    candidates = {"stdlib dict": _dict_encoder(get_encoder("stdlib"), fields)}
+    orjson_encoder = get_encoder("auto")
+    if orjson_encoder.name == "orjson":
+        candidates["orjson dict"] = _dict_encoder(orjson_encoder, fields)
+    candidates["slots"] = _slots_encoder(fields)
+
+    reference = json.loads(candidates["stdlib dict"](orders, encryptor))
+    for name, run in candidates.items():
+        body = run(orders, encryptor)
+        if json.loads(body) != reference:
+            raise SystemExit(f"{name}: output differs from the stdlib encoder")
+        elapsed = _measure(run, orders, encryptor, args.repeat)
+        print(f"{name:<12} {elapsed:8.1f} ms  {len(body) / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from benchmarks.generate import OrderFactory, generate
+from payment_qa_bot.models.db import ChangeCursor, OrderCreate, OrderFilter, OrdersRepository
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_CONCURRENCY = (1, 8, 32)
+ACTIVE_STATES = ("draft", "in_progress")
+CREATE_FIELDS = tuple(item.name for item in fields(OrderCreate))
+SEARCH_TERMS = ("paytm", "upi", "refund", "gopay", "kyc", "bkash")
+PAYLOAD_BODY = '{"geo": "IN", "method": "UPI", "tests": 2}'
+SEEDED_PAYLOADS = 100
+
+
+@dataclass(slots=True)
+class Sample:
+    # real keys drawn from the generated table, so lookups hit rows the way production traffic does
+    order_ids: List[int]
+    user_ids: List[int]
+    emails: List[str]
+    tokens: List[str]
+    payload_hashes: List[tuple]
+    usernames: List[str]
+    cursors: List[str]
+    factory: OrderFactory
+    size: int
+    run_id: str
+
+    def pick(self, values: Sequence[Any], index: int) -> Any:
+        return values[index % len(values)]
+
+    def new_order(self, index: int) -> OrderCreate:
+        row = self.factory.row(self.size + index, self.size)
+        row["start_token"] = f"{self.run_id}-{index}"
+        row["state"] = "draft"
+        return OrderCreate(**{name: row[name] for name in CREATE_FIELDS})
+
+
+@dataclass(slots=True)
+class Case:
+    name: str
+    method: str
+    call: Callable[[OrdersRepository, Sample, int], Awaitable[Any]]
+
+
+async def _drain(repo: OrdersRepository, filters: OrderFilter) -> int:
+    count = 0
+    async for chunk in repo.iter_orders(filters):
+        count += len(chunk)
+    return count
+
+
+def _funnel_rows(index: int) -> List[tuple]:
+    period = f"2024-01-{index % 28 + 1:02d}T{index % 24:02d}:00:00"
+    return [(period, step, "entered", 1.0) for step in ("GEO", "METHOD", "TESTS")]
+
+
+# one entry per repository coroutine; the coverage check below keeps new methods from being forgotten
+CASES: List[Case] = [
+    Case("init", "init", lambda repo, s, i: repo.init()),
+    Case("ping", "ping", lambda repo, s, i: repo.ping()),
+    Case("get_order", "get_order", lambda repo, s, i: repo.get_order(s.pick(s.order_ids, i))),
+    Case("get_last_order", "get_last_order", lambda repo, s, i: repo.get_last_order(s.pick(s.user_ids, i))),
+    Case("get_by_start_token", "get_by_start_token", lambda repo, s, i: repo.get_by_start_token(s.pick(s.tokens, i))),
+    Case(
+        "find_by_payload_hash",
+        "find_by_payload_hash",
+        lambda repo, s, i: repo.find_by_payload_hash(*s.pick(s.payload_hashes, i)),
+    ),
+    Case(
+        "find_active_for_email",
+        "find_active_for_email",
+        lambda repo, s, i: repo.find_active_for_email(s.pick(s.emails, i), ACTIVE_STATES),
+    ),
+    Case(
+        "find_active_for_tg",
+        "find_active_for_tg",
+        lambda repo, s, i: repo.find_active_for_tg(s.pick(s.user_ids, i), ACTIVE_STATES),
+    ),
+    Case("list_by_status", "list_by_status", lambda repo, s, i: repo.list_by_status("proof_received")),
+    Case("list_recent", "list_recent", lambda repo, s, i: repo.list_recent(200)),
+    Case(
+        "list_recent:filtered",
+        "list_recent",
+        lambda repo, s, i: repo.list_recent(200, OrderFilter(status="awaiting_payment", geo="IN")),
+    ),
+    Case(
+        "iter_orders",
+        "iter_orders",
+        lambda repo, s, i: _drain(repo, OrderFilter(status="proof_received", geo="IN")),
+    ),
+    Case(
+        "changes_since",
+        "changes_since",
+        lambda repo, s, i: repo.changes_since(ChangeCursor(s.pick(s.cursors, i)), limit=500),
+    ),
+    Case("latest_change_cursor", "latest_change_cursor", lambda repo, s, i: repo.latest_change_cursor()),
+    Case("data_version", "data_version", lambda repo, s, i: repo.data_version()),
+    Case("get_stats", "get_stats", lambda repo, s, i: repo.get_stats()),
+    Case(
+        "order_timeseries",
+        "order_timeseries",
+        lambda repo, s, i: repo.order_timeseries("day", "geo", since=s.cursors[0]),
+    ),
+    Case("search_orders:common", "search_orders", lambda repo, s, i: repo.search_orders(s.pick(SEARCH_TERMS, i))),
+    Case("search_orders:exact", "search_orders", lambda repo, s, i: repo.search_orders(s.pick(s.usernames, i))),
+    Case("get_language", "get_language", lambda repo, s, i: repo.get_language(s.pick(s.user_ids, i))),
+    Case("get_job_cursor", "get_job_cursor", lambda repo, s, i: repo.get_job_cursor("bench")),
+    Case(
+        "fetch_credentials_after",
+        "fetch_credentials_after",
+        lambda repo, s, i: repo.fetch_credentials_after(s.pick(s.order_ids, i), 500),
+    ),
+    Case(
+        "get_payload_reference",
+        "get_payload_reference",
+        lambda repo, s, i: repo.get_payload_reference(f"{s.run_id}-seed-{i % SEEDED_PAYLOADS}"),
+    ),
+    Case("get_funnel_stats", "get_funnel_stats", lambda repo, s, i: repo.get_funnel_stats()),
+    # writes come last so the reads above see the table exactly as generated
+    Case("create_order", "create_order", lambda repo, s, i: repo.create_order(s.new_order(i))),
+    Case(
+        "update_order",
+        "update_order",
+        lambda repo, s, i: repo.update_order(s.pick(s.order_ids, i), status="paid", admin_notes=f"bench {i}"),
+    ),
+    Case("submit_order", "submit_order", lambda repo, s, i: repo.submit_order(s.pick(s.order_ids, i))),
+    Case(
+        "update_from_telegram",
+        "update_from_telegram",
+        lambda repo, s, i: repo.update_from_telegram(s.pick(s.order_ids, i), tg_user_id=s.pick(s.user_ids, i)),
+    ),
+    Case(
+        "upsert_draft_order",
+        "upsert_draft_order",
+        lambda repo, s, i: repo.upsert_draft_order(s.new_order(-i - 1), match_email=s.pick(s.emails, i)),
+    ),
+    Case(
+        "save_payload_reference",
+        "save_payload_reference",
+        lambda repo, s, i: repo.save_payload_reference(f"{s.run_id}-{i}", PAYLOAD_BODY),
+    ),
+    Case(
+        "delete_payload_reference",
+        "delete_payload_reference",
+        lambda repo, s, i: repo.delete_payload_reference(f"{s.run_id}-{i}"),
+    ),
+    Case(
+        "cleanup_payload_references",
+        "cleanup_payload_references",
+        lambda repo, s, i: repo.cleanup_payload_references(72),
+    ),
+    Case(
+        "claim_idempotency_key",
+        "claim_idempotency_key",
+        lambda repo, s, i: repo.claim_idempotency_key(f"{s.run_id}-{i}", "fingerprint"),
+    ),
+    Case(
+        "complete_idempotency_key",
+        "complete_idempotency_key",
+        lambda repo, s, i: repo.complete_idempotency_key(f"{s.run_id}-{i}", 200, "application/json", b"{}"),
+    ),
+    Case(
+        "release_idempotency_key",
+        "release_idempotency_key",
+        lambda repo, s, i: repo.release_idempotency_key(f"{s.run_id}-{i}", pending_only=False),
+    ),
+    Case(
+        "cleanup_idempotency_keys",
+        "cleanup_idempotency_keys",
+        lambda repo, s, i: repo.cleanup_idempotency_keys(86400),
+    ),
+    Case("add_funnel_stats", "add_funnel_stats", lambda repo, s, i: repo.add_funnel_stats(_funnel_rows(i))),
+    Case("set_language", "set_language", lambda repo, s, i: repo.set_language(s.pick(s.user_ids, i), "en")),
+    Case(
+        "update_credentials_batch",
+        "update_credentials_batch",
+        lambda repo, s, i: repo.update_credentials_batch(
+            [(s.pick(s.order_ids, i), "qa-login", None, "qa-login", None)], job_name="bench", job_cursor=i
+        ),
+    ),
+    Case("compact_rollups", "compact_rollups", lambda repo, s, i: repo.compact_rollups(s.cursors[0])),
+]
+
+
+def uncovered_methods() -> List[str]:
+    covered = {case.method for case in CASES}
+    public = [
+        name
+        for name, member in inspect.getmembers(OrdersRepository)
+        if not name.startswith("_")
+        and name != "close"
+        and (inspect.iscoroutinefunction(member) or inspect.isasyncgenfunction(member))
+    ]
+    return sorted(set(public) - covered)
+
+
+def load_sample(db_path: str, *, size: int, seed: int, run_id: str, count: int = 2000) -> Sample:
+    rng = random.Random(seed)
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as db:
+        top = db.execute("SELECT MAX(order_id) FROM orders").fetchone()[0] or 0
+        ids = sorted({rng.randint(1, top) for _ in range(count)}) if top else []
+        marks = ",".join("?" * len(ids))
+        rows = db.execute(
+            f"SELECT order_id, user_id, email, start_token, payload_hash, username, updated_at "
+            f"FROM orders WHERE order_id IN ({marks})",
+            ids,
+        ).fetchall()
+    rng.shuffle(rows)
+    if not rows:
+        raise SystemExit(f"{db_path} has no orders to sample")
+    now = datetime.utcnow()
+    factory = OrderFactory(seed=seed, users=max(1, size // 3), start=now - timedelta(days=1), end=now)
+    return Sample(
+        order_ids=[row[0] for row in rows],
+        user_ids=[row[1] for row in rows],
+        emails=[row[2] for row in rows if row[2]] or ["nobody@example.com"],
+        tokens=[row[3] for row in rows],
+        payload_hashes=[(row[1], row[4]) for row in rows if row[4]] or [(0, "")],
+        usernames=[row[5] for row in rows if row[5]] or ["nobody"],
+        # a week back: changes_since and the time series read a realistic recent window
+        cursors=[(now - timedelta(days=7)).isoformat(timespec="seconds")],
+        factory=factory,
+        size=size,
+        run_id=run_id,
+    )
+
+
+def summarize(latencies: List[float], wall: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def percentile(fraction: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)] * 1000, 3)
+
+    return {
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) / wall, 1) if wall else None,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else None,
+    }
+
+
+async def run_case(
+    repo: OrdersRepository,
+    case: Case,
+    sample: Sample,
+    *,
+    concurrency: int,
+    duration: float,
+    max_ops: int,
+) -> Dict[str, Any]:
+    # workers share one counter, so the op budget is split however the database lets them progress
+    latencies: List[float] = []
+    errors: List[str] = []
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while True:
+            index = next(counter)
+            if index >= max_ops or time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                await case.call(repo, sample, index)
+            except Exception as exc:  # noqa: BLE001 - a failing call is reported, the run goes on
+                errors.append(f"{type(exc).__name__}: {exc}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = {"case": case.name, "method": case.method, "concurrency": concurrency}
+    result.update(summarize(latencies, time.perf_counter() - started))
+    result["errors"] = len(errors)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+async def run_suite(
+    db_path: str,
+    *,
+    size: int,
+    concurrency: Sequence[int],
+    cases: Sequence[Case],
+    duration: float,
+    max_ops: int,
+    seed: int,
+    log: Callable[[str], None] = lambda line: None,
+) -> List[Dict[str, Any]]:
+    repo = OrdersRepository(db_path)
+    await repo.init()
+    results = []
+    try:
+        for level in concurrency:
+            # keys are unique per round, so claims and payload tokens never collide with an earlier round
+            sample = load_sample(db_path, size=size, seed=seed, run_id=f"bench{time.time_ns():x}")
+            for index in range(SEEDED_PAYLOADS):
+                await repo.save_payload_reference(f"{sample.run_id}-seed-{index}", PAYLOAD_BODY)
+            for case in cases:
+                result = await run_case(repo, case, sample, concurrency=level, duration=duration, max_ops=max_ops)
+                result["size"] = size
+                results.append(result)
+                log(
+                    f"{size:>10,} x{level:<3} {case.name:<28} {result['ops_per_sec'] or 0:>10,.1f} ops/s  "
+                    f"p50 {result['p50_ms'] or 0:>9.3f}  p95 {result['p95_ms'] or 0:>9.3f}  "
+                    f"p99 {result['p99_ms'] or 0:>9.3f} ms"
+                    + (f"  {result['errors']} errors" if result["errors"] else "")
+                )
+    finally:
+        await repo.close()
+    return results
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], *, threshold: float, min_delta_ms: float) -> List[str]:
+    # p95 only: p50 hides tail regressions and p99 of a short run is a handful of samples
+    previous = {(row["size"], row["concurrency"], row["case"]): row for row in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        before = previous.get((row["size"], row["concurrency"], row["case"]))
+        if before is None or before["p95_ms"] is None or row["p95_ms"] is None:
+            continue
+        delta = row["p95_ms"] - before["p95_ms"]
+        if delta > min_delta_ms and row["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{row['case']} size={row['size']} x{row['concurrency']}: "
+                f"p95 {before['p95_ms']:.3f} -> {row['p95_ms']:.3f} ms (+{delta / before['p95_ms']:.0%})"
+            )
+    return regressions
+
+
+def remove_database(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def working_copy(source: str, target: str) -> str:
+    # the write cases insert, update and compact rollups, so every run starts from a fresh copy of the cache;
+    # the backup API also carries over anything still in the source's WAL
+    remove_database(target)
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+    return target
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.strip() or None
+
+
+def _int_list(raw: str) -> List[int]:
+    return [int(part.replace("_", "")) for part in raw.split(",") if part.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time every OrdersRepository method on generated databases")
+    parser.add_argument("--sizes", type=_int_list, default=list(DEFAULT_SIZES))
+    parser.add_argument("--concurrency", type=_int_list, default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per case and concurrency level")
+    parser.add_argument("--max-ops", type=int, default=2000, help="operations per case and concurrency level")
+    parser.add_argument("--cases", help="comma separated case names, default all")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "payment_qa_bench"))
+    parser.add_argument("--regenerate", action="store_true", help="rebuild cached databases")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON from an earlier run; exit 1 when p95 regressed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative p95 growth")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore p95 changes smaller than this")
+    args = parser.parse_args()
+
+    missing = uncovered_methods()
+    if missing:
+        print(f"warning: no benchmark case for {', '.join(missing)}", file=sys.stderr)
+    cases = CASES
+    if args.cases:
+        wanted = set(args.cases.split(","))
+        cases = [case for case in CASES if case.name in wanted or case.method in wanted]
+        if not cases:
+            raise SystemExit(f"no cases match {args.cases}")
+
+    def log(line: str) -> None:
+        print(line, file=sys.stderr, flush=True)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        # databases are cached per size and seed, so comparing branches does not pay for generation twice
+        db_path = os.path.join(args.workdir, f"orders-{size}-{args.seed}.db")
+        if args.regenerate:
+            remove_database(db_path)
+        if not os.path.exists(db_path):
+            log(f"generating {size:,} orders into {db_path}")
+            generate(db_path, size, seed=args.seed, progress=True)
+        run_path = working_copy(db_path, os.path.join(args.workdir, f"run-{size}-{args.seed}.db"))
+        try:
+            results.extend(
+                asyncio.run(
+                    run_suite(
+                        run_path,
+                        size=size,
+                        concurrency=args.concurrency,
+                        cases=cases,
+                        duration=args.duration,
+                        max_ops=args.max_ops,
+                        seed=args.seed,
+                        log=log,
+                    )
+                )
+            )
+        finally:
+            remove_database(run_path)
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(body + "\n")
+    else:
+        print(body)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(baseline, report, threshold=args.threshold, min_delta_ms=args.min_delta_ms)
+        for line in regressions:
+            log(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        log(f"no p95 regressions against {args.baseline} (revision {baseline['meta'].get('revision')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import hdrs, web
+
+try:  # optional, gzip is always available
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None  # type: ignore[assignment]
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def choose_encoding(accept_encoding: str, *, allow_brotli: bool = True) -> Optional[str]:
+    accepted = {}
+    for chunk in accept_encoding.lower().split(","):
+        name, _, params = chunk.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip()] = quality
+    if allow_brotli and brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compression_middleware(
+    *,
+    min_size: int = 1024,
+    executor_threshold: int = 64 * 1024,
+    allow_brotli: bool = True,
+) -> Callable[[web.Request, Handler], Awaitable[web.StreamResponse]]:
+    @web.middleware
+    async def middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
+        response = await handler(request)
+        # streamed responses (export, SSE) and bodies that are not plain bytes are left alone
+        if type(response) is not web.Response or not isinstance(response.body, bytes):
+            return response
+        body = response.body
+        if len(body) < min_size or response.status in (204, 304) or hdrs.CONTENT_ENCODING in response.headers:
+            return response
+        if not response.content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        response.headers.add(hdrs.VARY, hdrs.ACCEPT_ENCODING)
+        encoding = choose_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""), allow_brotli=allow_brotli)
+        if encoding is None:
+            return response
+        if len(body) >= executor_threshold:
+            # large bodies would stall every other request for milliseconds; compress them on a worker thread
+            compressed = await asyncio.get_running_loop().run_in_executor(None, compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+        response.body = compressed
+        response.headers[hdrs.CONTENT_ENCODING] = encoding
+        return response
+
+    return middleware
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict
+
+LOW = "low"
+NORMAL = "normal"
+HIGH = "high"
+
+# share of the current limit each priority may fill; the rest is kept for more important requests
+PRIORITY_SHARE: Dict[str, float] = {LOW: 0.5, NORMAL: 0.8, HIGH: 1.0}
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        *,
+        max_limit: int = 64,
+        min_limit: int = 4,
+        initial_limit: int = 0,
+        latency_target: float = 0.1,
+        backoff: float = 0.75,
+        cooldown: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_limit = float(max_limit)
+        self._min_limit = float(min(min_limit, max_limit))
+        self._latency_target = latency_target
+        self._backoff = backoff
+        self._cooldown = cooldown
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self.limit = float(initial_limit or max(self._min_limit, max_limit / 2))
+        self.inflight = 0
+        self.admitted = 0
+        self.decreases = 0
+        self.shed: Dict[str, int] = {LOW: 0, NORMAL: 0, HIGH: 0}
+
+    def observe(self, latency: float) -> None:
+        # AIMD on database latency: back off multiplicatively when queries queue up behind the writer,
+        # grow by roughly one slot per limit's worth of fast queries otherwise
+        if latency > self._latency_target:
+            now = self._clock()
+            if now - self._last_decrease >= self._cooldown:
+                self._last_decrease = now
+                self.limit = max(self._min_limit, self.limit * self._backoff)
+                self.decreases += 1
+        elif self.inflight >= self.limit / 2:
+            # only grow while the limit is actually in use, or it drifts to the maximum during quiet periods
+            self.limit = min(self._max_limit, self.limit + 1 / self.limit)
+
+    def try_acquire(self, priority: str = NORMAL) -> bool:
+        if self.inflight >= max(1.0, self.limit * PRIORITY_SHARE[priority]):
+            self.shed[priority] += 1
+            return False
+        self.inflight += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+import typing
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+
+try:  # optional speedup, the stdlib encoder is always available
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+JSON_CONTENT_TYPE = "application/json"
+
+FieldSource = Union[str, Callable[[Any], Any]]
+
+
+class JsonEncoder:
+    name = "stdlib"
+    # orjson encodes dicts faster than the generated slots encoder can build strings; stdlib is the other way round
+    prefers_dicts = False
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("ascii")
+
+
+class OrjsonEncoder(JsonEncoder):
+    name = "orjson"
+    prefers_dicts = True
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+
+def get_encoder(name: str = "auto") -> JsonEncoder:
+    if name not in {"auto", "orjson", "stdlib"}:
+        raise ValueError(f"unknown JSON encoder {name!r}")
+    if name == "stdlib":
+        return JsonEncoder()
+    if orjson is None:
+        if name == "orjson":
+            raise RuntimeError("orjson encoder requested but orjson is not installed")
+        return JsonEncoder()
+    return OrjsonEncoder()
+
+
+def json_response(
+    data: Any,
+    encoder: JsonEncoder,
+    *,
+    status: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> web.Response:
+    return web.Response(body=encoder.dumps(data), status=status, headers=headers, content_type=JSON_CONTENT_TYPE)
+
+
+def raw_json_response(
+    body: bytes,
+    *,
+    status: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> web.Response:
+    return web.Response(body=body, status=status, headers=headers, content_type=JSON_CONTENT_TYPE)
+
+
+def _encode_str(value: Optional[str]) -> str:
+    return "null" if value is None else encode_basestring_ascii(value)
+
+
+def _encode_int(value: Optional[int]) -> str:
+    return "null" if value is None else str(int(value))
+
+
+def _encode_bool(value: Optional[bool]) -> str:
+    if value is None:
+        return "null"
+    return "true" if value else "false"
+
+
+def _encode_any(value: Any) -> str:
+    return json.dumps(value)
+
+
+_SPECIALIZED: Dict[Any, str] = {
+    str: "_str",
+    Optional[str]: "_str",
+    int: "_int",
+    Optional[int]: "_int",
+    bool: "_bool",
+    Optional[bool]: "_bool",
+}
+
+
+def compile_slots_encoder(
+    record_type: type,
+    fields: Sequence[Tuple[str, FieldSource, bool]],
+) -> Callable[[Any, Any], str]:
+    """Build ``encode(record, decryptor) -> str`` emitting one JSON object per record.
+
+    Each field is ``(json_key, attribute name or callable, decrypt)``. The generated
+    function reads slots directly and picks a per-type encoder from the record's
+    annotations, so no intermediate dict is built. Output is ASCII-only JSON.
+    """
+    hints = typing.get_type_hints(record_type)
+    namespace: Dict[str, Any] = {
+        "_str": _encode_str,
+        "_int": _encode_int,
+        "_bool": _encode_bool,
+        "_any": _encode_any,
+    }
+    parts = []
+    for index, (key, source, decrypt) in enumerate(fields):
+        prefix = ("{" if index == 0 else ",") + json.dumps(key) + ":"
+        if isinstance(source, str):
+            if not source.isidentifier() or source not in hints:
+                raise ValueError(f"unknown attribute {source!r}")
+            value = f"record.{source}"
+            encoder = _SPECIALIZED.get(hints[source], "_any")
+        else:
+            helper = f"_field{index}"
+            namespace[helper] = source
+            value = f"{helper}(record)"
+            encoder = "_any"
+        if decrypt:
+            value = f"decryptor.decrypt({value})"
+            encoder = "_str"
+        parts.append(repr(prefix))
+        parts.append(f"{encoder}({value})")
+    if not parts:
+        parts.append(repr("{"))
+    source_code = "def encode(record, decryptor):\n    return ''.join((" + ", ".join(parts) + ", '}'))\n"
+    exec(compile(source_code, f"<slots encoder {record_type.__name__}>", "exec"), namespace)  # noqa: S102
+    return namespace["encode"]
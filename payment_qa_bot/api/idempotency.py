@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from payment_qa_bot.models.db import OrdersRepository
+
+REPLAY_HEADER = "Idempotent-Replayed"
+CLEANUP_INTERVAL = 600.0
+
+
+@dataclass(slots=True)
+class StoredResponse:
+    fingerprint: str
+    status: int
+    content_type: str
+    body: bytes
+    expires_at: float
+
+    def replay(self) -> web.Response:
+        response = web.Response(status=self.status, body=self.body, content_type=self.content_type)
+        response.headers[REPLAY_HEADER] = "true"
+        return response
+
+
+def _age_seconds(created_at: str) -> float:
+    return (datetime.utcnow() - datetime.fromisoformat(created_at)).total_seconds()
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        repo: OrdersRepository,
+        *,
+        ttl: float = 86400.0,
+        max_entries: int = 2048,
+        wait_timeout: float = 5.0,
+        lock_timeout: float = 30.0,
+        poll_interval: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._repo = repo
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._wait_timeout = wait_timeout
+        self._lock_timeout = lock_timeout
+        self._poll_interval = poll_interval
+        self._clock = clock
+        self._memory: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[Optional[StoredResponse]]"] = {}
+        self._last_cleanup = float("-inf")
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+
+    @property
+    def cached(self) -> int:
+        return len(self._memory)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        self._memory[key] = stored
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _cached(self, key: str) -> Optional[StoredResponse]:
+        stored = self._memory.get(key)
+        if stored is not None and stored.expires_at <= self._clock():
+            del self._memory[key]
+            return None
+        return stored
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> web.Response:
+        if stored.fingerprint != fingerprint:
+            self.conflicts += 1
+            raise web.HTTPUnprocessableEntity(text="idempotency_key_reused")
+        self.replayed += 1
+        return stored.replay()
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        stored = self._cached(key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # same key already executing in this process: wait for its result instead of running twice
+            self.coalesced += 1
+            stored = await asyncio.shield(inflight)
+            if stored is None:
+                return await self.run(key, fingerprint, execute)
+            return self._replay(stored, fingerprint)
+
+        future: "asyncio.Future[Optional[StoredResponse]]" = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = future
+        try:
+            response, stored = await self._execute(key, fingerprint, execute)
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(stored)
+        finally:
+            self._inflight.pop(key, None)
+        return response
+
+    async def _execute(
+        self,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[web.StreamResponse]],
+    ) -> Tuple[web.StreamResponse, Optional[StoredResponse]]:
+        started = self._clock()
+        while True:
+            existing = await self._repo.claim_idempotency_key(key, fingerprint)
+            if existing is None:
+                break
+            stored_fingerprint, status, content_type, body, created_at = existing
+            age = _age_seconds(created_at)
+            if status is not None and age < self._ttl:
+                stored = StoredResponse(stored_fingerprint, status, content_type, bytes(body), self._clock() + self._ttl - age)
+                self._remember(key, stored)
+                return self._replay(stored, fingerprint), stored
+            if status is not None or age >= self._lock_timeout:
+                # expired result or an owner that died mid-request: take the key over, unless another worker
+                # already has; the next claim then sees its row
+                await self._repo.release_idempotency_key(
+                    key, pending_only=False, created_at=created_at, fingerprint=stored_fingerprint
+                )
+                continue
+            if stored_fingerprint != fingerprint:
+                self.conflicts += 1
+                raise web.HTTPUnprocessableEntity(text="idempotency_key_reused")
+            # another worker process is executing the same request right now
+            if self._clock() - started >= self._wait_timeout:
+                self.conflicts += 1
+                raise web.HTTPConflict(text="idempotency_key_in_progress")
+            await asyncio.sleep(self._poll_interval)
+
+        await self._maybe_cleanup()
+        self.executed += 1
+        try:
+            response = await execute()
+        except BaseException:
+            await self._repo.release_idempotency_key(key)
+            raise
+        if type(response) is not web.Response or not isinstance(response.body, bytes) or response.status >= 500:
+            await self._repo.release_idempotency_key(key)
+            return response, None
+        stored = StoredResponse(fingerprint, response.status, response.content_type, response.body, self._clock() + self._ttl)
+        await self._repo.complete_idempotency_key(key, stored.status, stored.content_type, stored.body)
+        self._remember(key, stored)
+        return response, stored
+
+    async def _maybe_cleanup(self) -> None:
+        now = self._clock()
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        await self._repo.cleanup_idempotency_keys(self._ttl)
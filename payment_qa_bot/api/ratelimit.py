@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from payment_qa_bot.services.ratelimit import TokenBucket
+
+
+@dataclass(slots=True, frozen=True)
+class RateRule:
+    name: str
+    rate: float
+    burst: float
+    route_rate: float = 0.0
+
+
+def _is_trusted_peer(peer: Optional[str]) -> bool:
+    if not peer:
+        return False
+    try:
+        address = ipaddress.ip_address(peer)
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+
+def client_address(request: web.Request) -> str:
+    peer = request.remote
+    # X-Real-IP is set by nginx; only a proxy on a private network may speak for the client
+    if _is_trusted_peer(peer):
+        forwarded = (request.headers.get("X-Real-IP") or "").strip()
+        if forwarded:
+            return forwarded
+    return peer or "unknown"
+
+
+def retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        *,
+        max_clients: int = 10_000,
+        idle_ttl: float = 600.0,
+        clock=time.monotonic,
+    ) -> None:
+        self._max_clients = max_clients
+        self._idle_ttl = idle_ttl
+        self._clock = clock
+        self._clients: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._routes: Dict[str, TokenBucket] = {}
+        self.allowed = 0
+        self.limited = 0
+        self.limited_by_rule: Dict[str, int] = {}
+        self.evicted = 0
+
+    @property
+    def tracked_clients(self) -> int:
+        return len(self._clients)
+
+    def _expire(self, now: float) -> None:
+        # buckets are kept in last-use order, so the idle ones sit at the front
+        while self._clients:
+            key, bucket = next(iter(self._clients.items()))
+            if len(self._clients) <= self._max_clients and now - bucket.updated < self._idle_ttl:
+                break
+            del self._clients[key]
+            self.evicted += 1
+
+    def _client_bucket(self, rule: RateRule, client: str, now: float) -> TokenBucket:
+        key = (rule.name, client)
+        bucket = self._clients.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rule.rate, rule.burst, now)
+            self._clients[key] = bucket
+            self._expire(now)
+        else:
+            self._clients.move_to_end(key)
+        return bucket
+
+    def check(self, rule: RateRule, client: str) -> float:
+        now = self._clock()
+        bucket = self._client_bucket(rule, client, now)
+        wait = bucket.delay(now)
+        route_bucket = None
+        if wait == 0.0 and rule.route_rate > 0:
+            route_bucket = self._routes.get(rule.name)
+            if route_bucket is None:
+                route_bucket = self._routes[rule.name] = TokenBucket(rule.route_rate, max(1.0, rule.route_rate), now)
+            wait = route_bucket.delay(now)
+        if wait > 0.0:
+            self.limited += 1
+            self.limited_by_rule[rule.name] = self.limited_by_rule.get(rule.name, 0) + 1
+            return wait
+        bucket.consume(now)
+        if route_bucket is not None:
+            route_bucket.consume(now)
+        self.allowed += 1
+        return 0.0
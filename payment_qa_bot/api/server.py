@@ -1,23 +1,130 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import binascii
+import csv
 import hashlib
+import io
 import json
 import re
 import secrets
-from typing import Any, Dict, Optional
+import threading
+import time
+from contextlib import aclosing
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
 
 from aiohttp import web
 
+from payment_qa_bot.api.compression import compression_middleware
+from payment_qa_bot.api.concurrency import HIGH, LOW, NORMAL, AdaptiveLimiter
+from payment_qa_bot.api.encoding import (
+    FieldSource,
+    JsonEncoder,
+    compile_slots_encoder,
+    get_encoder,
+    json_response,
+    raw_json_response,
+)
+from payment_qa_bot.api.idempotency import IdempotencyStore
+from payment_qa_bot.api.ratelimit import RateLimiter, RateRule, client_address, retry_after
 from payment_qa_bot.config import Config
-from payment_qa_bot.models.db import OrderCreate, OrderRecord, OrdersRepository
+from payment_qa_bot.models.db import (
+    ARCHIVED_STATUSES,
+    ROLLUP_BUCKETS,
+    ROLLUP_DIMENSIONS,
+    SEARCH_WINDOW,
+    ChangeCursor,
+    OrderCreate,
+    OrderFilter,
+    OrderRecord,
+    OrdersRepository,
+)
+from payment_qa_bot.services.diagnostics import (
+    AllocationTracker,
+    LoopLagMonitor,
+    collapse_stacks,
+    dump_tasks,
+    process_memory,
+    register_size_probe,
+    sample_stacks,
+    structure_sizes,
+    top_object_types,
+)
+from payment_qa_bot.services.events import REMOVED, UPDATED, OrderEvent
+from payment_qa_bot.services.funnel import summarize_funnel
+from payment_qa_bot.services.logs import TRACE_HEADER, TRACE_ID, accept_trace_id
+from payment_qa_bot.services.metrics import API_REQUEST_SECONDS, API_REQUESTS, CONTENT_TYPE, REGISTRY
 from payment_qa_bot.services.pricing import calculate_price
 from payment_qa_bot.services.security import CredentialEncryptor
+from payment_qa_bot.services.tracing import TRACER
 
 PAYLOAD_MAX_LENGTH = 4096
 PAYLOAD_CLEANUP_HOURS = 72
 MAX_CALC_TESTS = 25
 EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 ACTIVE_STATES = ("draft", "in_progress")
+EXPORT_CHUNK_SIZE = 500
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 5000
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_QUERY_LENGTH = 200
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+STREAM_HEARTBEAT_SECONDS = 20.0
+STREAM_RETRY_MS = 3000
+# a client that missed more than this since its Last-Event-ID reloads the list instead of replaying
+STREAM_REPLAY_LIMIT = 1000
+# browsers revalidate every time (cheap 304s); nginx may serve the same body for one second
+SHARED_CACHE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Expires": "1"}
+PRIVATE_CACHE_HEADERS = {"Cache-Control": "private, no-store", "X-Accel-Expires": "0"}
+# long-lived or trivial routes that never hold a database slot
+UNLIMITED_ROUTES = frozenset(
+    {
+        "/health/live",
+        "/health/ready",
+        "/api/orders/stream",
+        "/metrics",
+        "/debug/loop",
+        "/debug/profile",
+        "/debug/tasks",
+        "/debug/memory",
+        "/debug/memory/allocations",
+    }
+)
+# shed first under load: bulk reads the admin can simply retry
+LOW_PRIORITY_ROUTES = frozenset(
+    {"/api/orders", "/api/orders/export", "/api/stats", "/api/stats/funnel", "/api/stats/timeseries"}
+)
+TIMESERIES_METRICS = {"orders": 2, "revenue": 3}
+SHED_RETRY_AFTER = "1"
+
+PROFILE_DEFAULT_SECONDS = 5.0
+PROFILE_MAX_SECONDS = 60.0
+
+QUERY_PROFILE_ORDER = {
+    "total": "total_seconds",
+    "max": "max_seconds",
+    "calls": "calls",
+    "rows": "rows",
+    "lock": "lock_waits",
+}
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PATCH, OPTIONS",
+}
 
 PAYOUT_CODE_MAP = {
     "N": {"surcharge": 0, "withdraw_required": False, "kyc_required": False, "text_key": "payout.option.none"},
@@ -32,7 +139,8 @@ def _generate_payload_token() -> str:
 
 def _derive_user_id(email: str) -> int:
     digest = hashlib.sha256(email.lower().encode("utf-8")).digest()
-    return int.from_bytes(digest[:8], byteorder="big", signed=False)
+    # SQLite INTEGER is signed 64-bit; masking keeps ids that already fit unchanged
+    return int.from_bytes(digest[:8], byteorder="big", signed=False) & 0x7FFF_FFFF_FFFF_FFFF
 
 
 def _compute_payload_hash(payload: Optional[str], fallback_parts: Dict[str, Any]) -> str:
@@ -51,40 +159,364 @@ def _payout_label(order: OrderRecord) -> str:
     return "none"
 
 
-def serialize_order(order: OrderRecord, encryptor: CredentialEncryptor) -> Dict[str, Any]:
-    return {
-        "id": order.order_id,
-        "userId": order.user_id,
-        "username": order.username,
-        "source": order.source,
-        "state": order.state,
-        "startToken": order.start_token,
-        "geo": order.geo,
-        "paymentMethod": order.method_user_text,
-        "testsCount": order.tests_count,
-        "withdrawRequired": order.withdraw_required,
-        "kycRequired": order.kyc_required,
-        "payoutOption": _payout_label(order),
-        "comments": order.comments,
-        "siteUrl": order.site_url,
-        "login": encryptor.decrypt(order.login),
-        "password": encryptor.decrypt(order.password_enc),
-        "priceEur": order.price_eur,
-        "payoutSurcharge": order.payout_surcharge,
-        "status": order.status,
-        "paymentNetwork": order.payment_network,
-        "paymentWallet": order.payment_wallet,
-        "paymentTxid": order.payment_txid,
-        "payloadHash": order.payload_hash,
-        "tgUserId": order.tg_user_id,
-        "email": order.email,
-        "createdAt": order.created_at,
-        "updatedAt": order.updated_at,
-    }
+ORDER_FIELDS: Dict[str, FieldSource] = {
+    "id": "order_id",
+    "userId": "user_id",
+    "username": "username",
+    "source": "source",
+    "state": "state",
+    "startToken": "start_token",
+    "geo": "geo",
+    "paymentMethod": "method_user_text",
+    "testsCount": "tests_count",
+    "withdrawRequired": "withdraw_required",
+    "kycRequired": "kyc_required",
+    "payoutOption": _payout_label,
+    "comments": "comments",
+    "siteUrl": "site_url",
+    "priceEur": "price_eur",
+    "payoutSurcharge": "payout_surcharge",
+    "status": "status",
+    "paymentNetwork": "payment_network",
+    "paymentWallet": "payment_wallet",
+    "paymentTxid": "payment_txid",
+    "payloadHash": "payload_hash",
+    "tgUserId": "tg_user_id",
+    "email": "email",
+    "createdAt": "created_at",
+    "updatedAt": "updated_at",
+}
+CREDENTIAL_FIELDS: Dict[str, str] = {
+    "login": "login",
+    "password": "password_enc",
+}
+DEFAULT_FIELDS = tuple(ORDER_FIELDS)
+FULL_FIELDS = DEFAULT_FIELDS + tuple(CREDENTIAL_FIELDS)
+
+# credentials and internal columns have no public name and never leave through the change feed
+COLUMN_FIELDS: Dict[str, str] = {source: name for name, source in ORDER_FIELDS.items() if isinstance(source, str)}
+BOOLEAN_COLUMNS = ("withdraw_required", "kyc_required")
+
+OrderSerializer = Callable[[OrderRecord, CredentialEncryptor], Dict[str, Any]]
+OrderEncoder = Callable[[OrderRecord, CredentialEncryptor], str]
+
+
+def _getter(source: FieldSource) -> Callable[[OrderRecord], Any]:
+    return attrgetter(source) if isinstance(source, str) else source
+
+
+@lru_cache(maxsize=64)
+def compile_serializer(fields: Tuple[str, ...]) -> OrderSerializer:
+    plain = [(name, _getter(ORDER_FIELDS[name])) for name in fields if name in ORDER_FIELDS]
+    secret = [(name, _getter(CREDENTIAL_FIELDS[name])) for name in fields if name in CREDENTIAL_FIELDS]
+
+    if not secret:
+
+        def serialize(order: OrderRecord, encryptor: CredentialEncryptor) -> Dict[str, Any]:
+            return {name: getter(order) for name, getter in plain}
+
+        return serialize
+
+    def serialize_with_credentials(order: OrderRecord, encryptor: CredentialEncryptor) -> Dict[str, Any]:
+        result = {name: getter(order) for name, getter in plain}
+        for name, getter in secret:
+            result[name] = encryptor.decrypt(getter(order))
+        return result
+
+    return serialize_with_credentials
+
+
+@lru_cache(maxsize=64)
+def compile_order_encoder(fields: Tuple[str, ...]) -> OrderEncoder:
+    spec = []
+    for name in fields:
+        if name in CREDENTIAL_FIELDS:
+            spec.append((name, CREDENTIAL_FIELDS[name], True))
+        else:
+            spec.append((name, ORDER_FIELDS[name], False))
+    return compile_slots_encoder(OrderRecord, spec)
+
+
+def encode_orders(
+    orders: List[OrderRecord],
+    encryptor: CredentialEncryptor,
+    fields: Tuple[str, ...],
+    encoder: Optional[JsonEncoder] = None,
+) -> bytes:
+    if encoder is not None and encoder.prefers_dicts:
+        serializer = compile_serializer(fields)
+        return encoder.dumps({"orders": [serializer(order, encryptor) for order in orders]})
+    encode = compile_order_encoder(fields)
+    return ('{"orders":[' + ",".join([encode(order, encryptor) for order in orders]) + "]}").encode("ascii")
+
+
+def encode_order(
+    order: OrderRecord,
+    encryptor: CredentialEncryptor,
+    fields: Tuple[str, ...],
+    encoder: Optional[JsonEncoder] = None,
+) -> bytes:
+    if encoder is not None and encoder.prefers_dicts:
+        return encoder.dumps(compile_serializer(fields)(order, encryptor))
+    return compile_order_encoder(fields)(order, encryptor).encode("ascii")
+
+
+def parse_fields(
+    raw_fields: Optional[str],
+    *,
+    include: Optional[str] = None,
+    allow_credentials: bool = False,
+) -> Tuple[str, ...]:
+    if raw_fields:
+        requested = tuple(dict.fromkeys(chunk.strip() for chunk in raw_fields.split(",") if chunk.strip()))
+        unknown = [name for name in requested if name not in ORDER_FIELDS and name not in CREDENTIAL_FIELDS]
+        if unknown:
+            raise web.HTTPBadRequest(text="invalid_fields")
+    else:
+        requested = DEFAULT_FIELDS
+    if include:
+        extras = {chunk.strip() for chunk in include.split(",")}
+        if "credentials" in extras:
+            requested = requested + tuple(name for name in CREDENTIAL_FIELDS if name not in requested)
+    if not allow_credentials and any(name in CREDENTIAL_FIELDS for name in requested):
+        raise web.HTTPBadRequest(text="credentials_detail_only")
+    return requested
+
+
+def wants_credentials(query: Mapping[str, str]) -> bool:
+    return "credentials" in (query.get("include") or "") or any(
+        name in CREDENTIAL_FIELDS for name in (query.get("fields") or "").split(",")
+    )
 
 
-def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, config: Config) -> web.Application:
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    # If-None-Match uses weak comparison: W/ prefixes are ignored
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+@dataclass(slots=True)
+class Readiness:
+    # created before startup: a running Application is frozen, but the object it holds can still change
+    ready: bool = True
+
+
+def _parse_limit(raw: Optional[str], default: int, maximum: int) -> int:
+    try:
+        value = int(raw) if raw else default
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
+
+
+def _parse_timestamp(raw: Optional[str], error: str) -> Optional[str]:
+    if not raw:
+        return None
+    try:
+        moment = datetime.fromisoformat(raw.strip())
+    except ValueError as exc:
+        raise web.HTTPBadRequest(text=error) from exc
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.isoformat(timespec="seconds")
+
+
+def parse_order_filter(query: Mapping[str, str]) -> OrderFilter:
+    geo = (query.get("geo") or "").strip().upper()
+    return OrderFilter(
+        status=(query.get("status") or "").strip() or None,
+        state=(query.get("state") or "").strip() or None,
+        geo=geo or None,
+        source=(query.get("source") or "").strip() or None,
+        since=_parse_timestamp(query.get("since"), "invalid_since"),
+        until=_parse_timestamp(query.get("until"), "invalid_until"),
+    )
+
+
+def ndjson_line_encoder(
+    fields: Tuple[str, ...],
+    encoder: JsonEncoder,
+) -> Callable[[OrderRecord, CredentialEncryptor], bytes]:
+    if encoder.prefers_dicts:
+        serializer = compile_serializer(fields)
+        return lambda order, encryptor: encoder.dumps(serializer(order, encryptor)) + b"\n"
+    encode = compile_order_encoder(fields)
+    return lambda order, encryptor: (encode(order, encryptor) + "\n").encode("ascii")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def encode_csv_rows(
+    orders: List[OrderRecord],
+    encryptor: CredentialEncryptor,
+    fields: Tuple[str, ...],
+    *,
+    header: bool = False,
+) -> bytes:
+    serializer = compile_serializer(fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    for order in orders:
+        payload = serializer(order, encryptor)
+        writer.writerow([_csv_value(payload[name]) for name in fields])
+    return buffer.getvalue().encode("utf-8")
+
+
+def encode_change_cursor(cursor: ChangeCursor) -> str:
+    raw = json.dumps([cursor.updated_at, cursor.order_id, cursor.tombstone], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_change_cursor(raw: Optional[str]) -> ChangeCursor:
+    if not raw:
+        return ChangeCursor()
+    try:
+        decoded = base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4))
+        updated_at, order_id, tombstone = json.loads(decoded)
+        if not isinstance(updated_at, str) or not isinstance(order_id, int) or not isinstance(tombstone, int):
+            raise ValueError(raw)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise web.HTTPBadRequest(text="invalid_cursor") from exc
+    return ChangeCursor(updated_at, order_id, tombstone)
+
+
+def order_delta(event: OrderEvent) -> Dict[str, Any]:
+    if event.kind == REMOVED:
+        return {"op": REMOVED, "id": event.order_id, "reason": event.changes.get("reason")}
+    if event.changes.get("status") in ARCHIVED_STATUSES:
+        return {"op": REMOVED, "id": event.order_id, "reason": "archived"}
+    changes: Dict[str, Any] = {}
+    for column, value in event.changes.items():
+        name = COLUMN_FIELDS.get(column)
+        if name is None:
+            continue
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        changes[name] = value
+    if "kycRequired" in changes and "withdrawRequired" in changes:
+        if changes["kycRequired"]:
+            changes["payoutOption"] = "kyc"
+        else:
+            changes["payoutOption"] = "withdraw" if changes["withdrawRequired"] else "none"
+    return {"op": event.kind, "id": event.order_id, "changes": changes}
+
+
+def serialize_order(
+    order: OrderRecord,
+    encryptor: CredentialEncryptor,
+    fields: Tuple[str, ...] = FULL_FIELDS,
+) -> Dict[str, Any]:
+    return compile_serializer(fields)(order, encryptor)
+
+
+def create_api_app(
+    repo: OrdersRepository,
+    encryptor: CredentialEncryptor,
+    config: Config,
+    *,
+    read_repo: Optional[OrdersRepository] = None,
+    lag_monitor: Optional[LoopLagMonitor] = None,
+) -> web.Application:
     app = web.Application()
+    app["readiness"] = Readiness()
+    reader = read_repo or repo
+    encoder = get_encoder(config.json_encoder)
+    app["json_encoder"] = encoder
+    app["event_streams"] = set()
+    if lag_monitor is None and config.loop_lag_threshold > 0:
+        # a standalone API worker owns its monitor; the bot process passes the one it already runs
+        own_monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+
+        async def start_lag_monitor(_: web.Application) -> None:
+            own_monitor.start()
+
+        async def stop_lag_monitor(_: web.Application) -> None:
+            await own_monitor.stop()
+
+        app.on_startup.append(start_lag_monitor)
+        app.on_cleanup.append(stop_lag_monitor)
+        lag_monitor = own_monitor
+    app["lag_monitor"] = lag_monitor
+    profiling = asyncio.Lock()
+    idempotency = IdempotencyStore(repo, ttl=config.idempotency_ttl)
+    app["idempotency"] = idempotency
+    concurrency = AdaptiveLimiter(max_limit=config.api_max_concurrency, latency_target=config.api_latency_target)
+    app["concurrency_limiter"] = concurrency
+    if config.api_max_concurrency > 0:
+        observed = {id(repo): repo, id(reader): reader}.values()
+
+        def observe_latency(_: str, elapsed: float, __: int) -> None:
+            concurrency.observe(elapsed)
+
+        for observed_repo in observed:
+            observed_repo.query_observers.append(observe_latency)
+
+        async def detach_latency_observers(_: web.Application) -> None:
+            for observed_repo in observed:
+                observed_repo.query_observers.remove(observe_latency)
+
+        app.on_cleanup.append(detach_latency_observers)
+    rate_limiter = RateLimiter()
+    app["rate_limiter"] = rate_limiter
+    REGISTRY.gauge("api_concurrency_limit", "Current adaptive concurrency limit", callback=lambda: concurrency.limit)
+    REGISTRY.gauge("api_inflight_requests", "Requests holding a concurrency slot", callback=lambda: concurrency.inflight)
+    REGISTRY.counter(
+        "api_shed_requests_total",
+        "Requests refused by the concurrency limiter",
+        ("priority",),
+        callback=lambda: {(priority,): count for priority, count in concurrency.shed.items()},
+    )
+    REGISTRY.counter(
+        "api_rate_limited_requests_total",
+        "Requests refused by the per-client rate limiter",
+        ("rule",),
+        callback=lambda: {(rule,): count for rule, count in rate_limiter.limited_by_rule.items()},
+    )
+    REGISTRY.gauge("api_event_subscribers", "Open order change streams", callback=lambda: repo.events.subscribers)
+    allocations = AllocationTracker()
+    register_size_probe("idempotency_cache", lambda: idempotency.cached)
+    register_size_probe("idempotency_inflight", lambda: idempotency.inflight)
+    register_size_probe("rate_limiter_buckets", lambda: rate_limiter.tracked_clients)
+    register_size_probe("event_streams", lambda: len(app["event_streams"]))
+    register_size_probe(
+        "serializer_cache",
+        lambda: compile_serializer.cache_info().currsize + compile_order_encoder.cache_info().currsize,
+    )
+    rate_rules: Dict[str, RateRule] = {}
+    if config.api_rate_limit > 0:
+        per_second = config.api_rate_limit / 60
+        payloads_rule = RateRule("payloads", per_second, config.api_rate_burst, config.api_route_rate)
+        draft_rule = RateRule("draft", per_second, config.api_rate_burst, config.api_route_rate)
+        # the web app polls this read endpoint, so it gets more room than the writes
+        active_rule = RateRule("active_for_user", per_second * 4, config.api_rate_burst * 4)
+        rate_rules = {
+            "/api/payloads": payloads_rule,
+            "/orders/draft": draft_rule,
+            "/api/orders/draft": draft_rule,
+            "/orders/active_for_user": active_rule,
+            "/api/orders/active_for_user": active_rule,
+        }
+
+    def respond(data: Any, *, status: int = 200) -> web.Response:
+        return json_response(data, encoder, status=status)
 
     def _clean_optional_text(value: Any) -> Optional[str]:
         if value is None:
@@ -109,22 +541,234 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
             raise web.HTTPBadRequest(text="invalid_payout")
         return payout_info
 
+    def conditional(handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+        async def conditional_handler(request: web.Request) -> web.StreamResponse:
+            # read the version before the handler runs: a write racing with it can only make the ETag stale,
+            # which costs a full response next time, never a wrong 304
+            digest = hashlib.blake2s(request.rel_url.path_qs.encode("utf-8"), digest_size=6).hexdigest()
+            etag = f'W/"{await reader.data_version()}-{digest}"'
+            cache_headers = PRIVATE_CACHE_HEADERS if wants_credentials(request.query) else SHARED_CACHE_HEADERS
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                return web.Response(status=304, headers={"ETag": etag, **cache_headers})
+            response = await handler(request)
+            if response.status == 200:
+                response.headers["ETag"] = etag
+                response.headers.update(cache_headers)
+            return response
+
+        return conditional_handler
+
+    def idempotent(handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+        async def idempotent_handler(request: web.Request) -> web.StreamResponse:
+            raw_key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip()
+            if not raw_key:
+                return await handler(request)
+            if len(raw_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise web.HTTPBadRequest(text="invalid_idempotency_key")
+            if wants_credentials(request.query):
+                # never persist decrypted credentials in the replay store
+                return await handler(request)
+            fingerprint = hashlib.sha256(await request.read()).hexdigest()
+            key = f"{request.method} {request.path} {raw_key}"
+            return await idempotency.run(key, fingerprint, lambda: handler(request))
+
+        return idempotent_handler
+
+    def admin_only(handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+        async def admin_handler(request: web.Request) -> web.StreamResponse:
+            # without a configured token the diagnostics endpoints do not exist at all
+            if not config.admin_api_token:
+                raise web.HTTPNotFound()
+            scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not secrets.compare_digest(supplied.strip(), config.admin_api_token):
+                raise web.HTTPUnauthorized(text="admin_token_required")
+            response = await handler(request)
+            response.headers.update(PRIVATE_CACHE_HEADERS)
+            return response
+
+        return admin_handler
+
+    def requested_fields(request: web.Request, *, detail: bool) -> Tuple[str, ...]:
+        return parse_fields(
+            request.query.get("fields"),
+            include=request.query.get("include"),
+            allow_credentials=detail,
+        )
+
     async def list_orders(request: web.Request) -> web.Response:
         limit = request.query.get("limit")
         try:
             limit_value = int(limit) if limit else 200
         except ValueError:
             limit_value = 200
-        orders = await repo.list_recent(limit=limit_value)
-        payload = [serialize_order(order, encryptor) for order in orders]
-        return web.json_response({"orders": payload})
+        fields = requested_fields(request, detail=False)
+        orders = await reader.list_recent(limit=limit_value, filters=parse_order_filter(request.query))
+        return raw_json_response(encode_orders(orders, encryptor, fields, encoder))
+
+    async def export_orders(request: web.Request) -> web.StreamResponse:
+        export_format = request.query.get("format", "ndjson").lower()
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise web.HTTPBadRequest(text="invalid_format")
+        fields = requested_fields(request, detail=False)
+        filters = parse_order_filter(request.query)
+        filename = "orders-{stamp}.{ext}".format(stamp=datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S"), ext=export_format)
+        response = web.StreamResponse(
+            headers={**CORS_HEADERS, "Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+        response.content_type = EXPORT_CONTENT_TYPES[export_format]
+        response.charset = "utf-8"
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        line = ndjson_line_encoder(fields, encoder) if export_format == "ndjson" else None
+        first = True
+        async with aclosing(reader.iter_orders(filters, chunk_size=EXPORT_CHUNK_SIZE)) as chunks:
+            async for orders in chunks:
+                if line is not None:
+                    body = b"".join([line(order, encryptor) for order in orders])
+                else:
+                    body = encode_csv_rows(orders, encryptor, fields, header=first)
+                first = False
+                # write() waits for the transport to drain, so a slow client slows the cursor down instead of buffering
+                await response.write(body)
+        if first and export_format == "csv":
+            await response.write(encode_csv_rows([], encryptor, fields, header=True))
+        await response.write_eof()
+        return response
+
+    async def order_changes(request: web.Request) -> web.Response:
+        if request.query.get("since") == "latest":
+            # lets a client that just loaded the list start syncing from here without downloading anything
+            latest = await reader.latest_change_cursor()
+            return respond({"orders": [], "tombstones": [], "cursor": encode_change_cursor(latest), "hasMore": False})
+        cursor = decode_change_cursor(request.query.get("since"))
+        try:
+            limit = int(request.query.get("limit") or CHANGES_DEFAULT_LIMIT)
+        except ValueError:
+            limit = CHANGES_DEFAULT_LIMIT
+        limit = max(1, min(limit, CHANGES_MAX_LIMIT))
+        serializer = compile_serializer(requested_fields(request, detail=False))
+        changes = await reader.changes_since(cursor, limit=limit)
+        return respond(
+            {
+                "orders": [serializer(order, encryptor) for order in changes.orders],
+                "tombstones": [
+                    {"id": tombstone.order_id, "reason": tombstone.reason, "at": tombstone.at}
+                    for tombstone in changes.tombstones
+                ],
+                "cursor": encode_change_cursor(changes.cursor),
+                "hasMore": changes.has_more,
+            }
+        )
+
+    async def search_orders(request: web.Request) -> web.Response:
+        text = (request.query.get("q") or "").strip()
+        if not text:
+            raise web.HTTPBadRequest(text="query_required")
+        if len(text) > SEARCH_MAX_QUERY_LENGTH:
+            raise web.HTTPBadRequest(text="query_too_long")
+        limit = _parse_limit(request.query.get("limit"), SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+        try:
+            offset = max(0, int(request.query.get("offset") or 0))
+        except ValueError:
+            offset = 0
+        serializer = compile_serializer(requested_fields(request, detail=False))
+        # one extra row tells whether another page exists without counting every match; pages end with the
+        # ranked window, so hasMore is false at its edge even if older orders match too
+        orders = await reader.search_orders(text, limit=limit + 1, offset=offset)
+        has_more = len(orders) > limit and offset + limit < SEARCH_WINDOW
+        return respond(
+            {
+                "query": text,
+                "orders": [serializer(order, encryptor) for order in orders[:limit]],
+                "offset": offset,
+                "limit": limit,
+                "window": SEARCH_WINDOW,
+                "hasMore": has_more,
+                "nextOffset": offset + limit if has_more else None,
+            }
+        )
+
+    def event_frame(event: OrderEvent, cursor: Optional[ChangeCursor]) -> bytes:
+        head = f"id: {encode_change_cursor(cursor)}\n" if cursor is not None else ""
+        return f"{head}event: order\ndata: ".encode("ascii") + encoder.dumps(order_delta(event)) + b"\n\n"
+
+    async def replay_changes(raw_cursor: str) -> Optional[List[bytes]]:
+        # ids are database change cursors, so whichever worker the client reconnects to can catch it up
+        try:
+            cursor = decode_change_cursor(raw_cursor)
+        except web.HTTPBadRequest:
+            return None
+        changes = await reader.changes_since(cursor, limit=STREAM_REPLAY_LIMIT)
+        if changes.has_more:
+            return None
+        events = [OrderEvent(0, UPDATED, order.order_id, asdict(order)) for order in changes.orders]
+        events.extend(
+            OrderEvent(0, REMOVED, tombstone.order_id, {"reason": tombstone.reason})
+            for tombstone in changes.tombstones
+        )
+        # only the last frame moves the client's cursor, so a drop halfway through replays the batch again
+        last = len(events) - 1
+        return [event_frame(event, changes.cursor if index == last else None) for index, event in enumerate(events)]
+
+    async def stream_orders(request: web.Request) -> web.StreamResponse:
+        hub = repo.events
+        raw_cursor = request.headers.get("Last-Event-ID") or request.query.get("cursor")
+        # subscribe before reading the database: a write in between arrives twice, which deltas tolerate
+        subscription = hub.subscribe()
+        app["event_streams"].add(subscription)
+        response = web.StreamResponse(
+            headers={**CORS_HEADERS, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.content_type = "text/event-stream"
+        response.charset = "utf-8"
+        try:
+            if hub.position is None:
+                # BOT_API_CHANGE_POLL=0: nothing advances the position, so ids stay at the head seen here
+                hub.position = await reader.latest_change_cursor()
+            start = hub.position
+            replay = await replay_changes(raw_cursor) if raw_cursor else []
+            await response.prepare(request)
+            preamble = f"retry: {STREAM_RETRY_MS}\n\n"
+            if replay is None:
+                # unreadable cursor or too far behind: the client reloads the list and resumes from here
+                preamble += f"id: {encode_change_cursor(start)}\nevent: reset\ndata: {{}}\n\n"
+            elif not raw_cursor:
+                # an id without data dispatches nothing but gives the browser a cursor before the first event
+                preamble += f"id: {encode_change_cursor(start)}\n\n"
+            await response.write(preamble.encode("utf-8"))
+            for frame in replay or []:
+                await response.write(frame)
+            while True:
+                event = await subscription.next(STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    if subscription.finished:
+                        break
+                    await response.write(b": ping\n\n")
+                    continue
+                if event.frame is None:
+                    # encoded once per event no matter how many dashboards are connected
+                    event.frame = event_frame(event, event.cursor)
+                await response.write(event.frame)
+        except ConnectionResetError:
+            pass
+        finally:
+            subscription.close()
+            app["event_streams"].discard(subscription)
+        return response
+
+    async def close_event_streams(_: web.Application) -> None:
+        for subscription in list(app["event_streams"]):
+            subscription.close()
+
+    async def close_version_connection(_: web.Application) -> None:
+        await reader.close()
 
     async def get_order(request: web.Request) -> web.Response:
         order_id = int(request.match_info["order_id"])
-        record = await repo.get_order(order_id)
+        record = await reader.get_order(order_id)
         if record is None:
             raise web.HTTPNotFound()
-        return web.json_response(serialize_order(record, encryptor))
+        return raw_json_response(encode_order(record, encryptor, requested_fields(request, detail=True), encoder))
 
     async def update_order(request: web.Request) -> web.Response:
         order_id = int(request.match_info["order_id"])
@@ -142,16 +786,54 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
         if payment_txid is not None:
             updates["payment_txid"] = payment_txid
         if not updates:
-            return web.json_response({"updated": False})
+            return respond({"updated": False})
         await repo.update_order(order_id, **updates)
         record = await repo.get_order(order_id)
         if record is None:
             raise web.HTTPNotFound()
-        return web.json_response(serialize_order(record, encryptor))
+        return raw_json_response(encode_order(record, encryptor, requested_fields(request, detail=True), encoder))
 
     async def stats(_: web.Request) -> web.Response:
-        counts = await repo.get_stats()
-        return web.json_response({"stats": counts})
+        counts = await reader.get_stats()
+        return respond({"stats": counts})
+
+    async def funnel_stats(request: web.Request) -> web.Response:
+        since = _parse_timestamp(request.query.get("since"), "invalid_since")
+        until = _parse_timestamp(request.query.get("until"), "invalid_until")
+        rows = await reader.get_funnel_stats(since, until)
+        return respond({"since": since, "until": until, "steps": summarize_funnel(rows)})
+
+    async def timeseries(request: web.Request) -> web.Response:
+        metric = request.query.get("metric", "orders")
+        if metric not in TIMESERIES_METRICS:
+            raise web.HTTPBadRequest(text="invalid_metric")
+        group = request.query.get("group") or None
+        if group is not None and group not in ROLLUP_DIMENSIONS:
+            raise web.HTTPBadRequest(text="invalid_group")
+        bucket = request.query.get("bucket", "day")
+        if bucket not in ROLLUP_BUCKETS:
+            raise web.HTTPBadRequest(text="invalid_bucket")
+        since = _parse_timestamp(request.query.get("from"), "invalid_from")
+        until = _parse_timestamp(request.query.get("to"), "invalid_to")
+        rows = await reader.order_timeseries(bucket, group, since, until)
+        column = TIMESERIES_METRICS[metric]
+        periods = sorted({row[0] for row in rows})
+        position = {period: index for index, period in enumerate(periods)}
+        series: Dict[str, List[int]] = {}
+        for row in rows:
+            series.setdefault(row[1], [0] * len(periods))[position[row[0]]] = row[column]
+        return respond(
+            {
+                "metric": metric,
+                "group": group,
+                "bucket": bucket,
+                "from": since,
+                "to": until,
+                "buckets": periods,
+                # orders with no geo yet are rolled up under an empty key
+                "series": [{"key": key or None, "values": values} for key, values in series.items()],
+            }
+        )
 
     async def create_payload(request: web.Request) -> web.Response:
         try:
@@ -173,7 +855,7 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
 
         await repo.save_payload_reference(token, payload)
         await repo.cleanup_payload_references(PAYLOAD_CLEANUP_HOURS)
-        return web.json_response({"token": token})
+        return respond({"token": token})
 
     async def create_draft_order(request: web.Request) -> web.Response:
         try:
@@ -256,14 +938,14 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
             match_email=email,
             match_tg_user_id=None,
         )
-        return web.json_response({"order_id": record.order_id, "start_token": record.start_token})
+        return respond({"order_id": record.order_id, "start_token": record.start_token})
 
     async def get_by_token(request: web.Request) -> web.Response:
         token = request.match_info["token"]
-        record = await repo.get_by_start_token(token)
+        record = await reader.get_by_start_token(token)
         if record is None or record.state == "cancelled":
             raise web.HTTPNotFound()
-        return web.json_response(serialize_order(record, encryptor))
+        return raw_json_response(encode_order(record, encryptor, requested_fields(request, detail=True), encoder))
 
     async def update_from_telegram(request: web.Request) -> web.Response:
         order_id = int(request.match_info["order_id"])
@@ -308,7 +990,7 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
         )
         if record is None:
             raise web.HTTPNotFound()
-        return web.json_response(serialize_order(record, encryptor))
+        return raw_json_response(encode_order(record, encryptor, requested_fields(request, detail=True), encoder))
 
     async def submit_order(request: web.Request) -> web.Response:
         order_id = int(request.match_info["order_id"])
@@ -325,7 +1007,7 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
         record = await repo.submit_order(order_id, price_eur=price_eur)
         if record is None:
             raise web.HTTPNotFound()
-        return web.json_response(serialize_order(record, encryptor))
+        return raw_json_response(encode_order(record, encryptor, requested_fields(request, detail=True), encoder))
 
     async def active_for_user(request: web.Request) -> web.Response:
         email = (request.query.get("email") or "").strip().lower()
@@ -338,12 +1020,92 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
                 raise web.HTTPBadRequest(text="invalid_tg_user_id")
         record: Optional[OrderRecord] = None
         if email:
-            record = await repo.find_active_for_email(email, ACTIVE_STATES + ("submitted",))
+            record = await reader.find_active_for_email(email, ACTIVE_STATES + ("submitted",))
         if record is None and tg_user_id is not None:
-            record = await repo.find_active_for_tg(tg_user_id, ACTIVE_STATES + ("submitted",))
+            record = await reader.find_active_for_tg(tg_user_id, ACTIVE_STATES + ("submitted",))
         if record is None:
-            return web.json_response({"order": None})
-        return web.json_response({"order": serialize_order(record, encryptor)})
+            return respond({"order": None})
+        body = encode_order(record, encryptor, requested_fields(request, detail=True), encoder)
+        return raw_json_response(b'{"order":' + body + b"}")
+
+    async def query_profile(request: web.Request) -> web.Response:
+        profiler = repo.profiler
+        if profiler is None:
+            return respond({"enabled": False, "queries": []})
+        limit = _parse_limit(request.query.get("limit"), 20, 200)
+        order_by = QUERY_PROFILE_ORDER.get(request.query.get("sort") or "total")
+        if order_by is None:
+            raise web.HTTPBadRequest(text="invalid_sort")
+        if request.query.get("reset") in ("1", "true"):
+            profiler.reset()
+        return respond(
+            {
+                "enabled": True,
+                "slowThresholdMs": profiler.slow_threshold * 1000,
+                "queries": profiler.top(limit, order_by=order_by),
+            }
+        )
+
+    async def debug_loop(_: web.Request) -> web.Response:
+        if lag_monitor is None:
+            return respond({"running": False})
+        return respond(lag_monitor.stats())
+
+    async def debug_profile(request: web.Request) -> web.Response:
+        try:
+            seconds = float(request.query.get("seconds") or PROFILE_DEFAULT_SECONDS)
+        except ValueError as exc:
+            raise web.HTTPBadRequest(text="invalid_seconds") from exc
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise web.HTTPBadRequest(text="invalid_seconds")
+        if profiling.locked():
+            raise web.HTTPConflict(text="profile_in_progress")
+        async with profiling:
+            # the sampler runs on a worker thread and looks at this (the event loop) thread from outside
+            stacks = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
+        return web.Response(text=collapse_stacks(stacks), content_type="text/plain")
+
+    async def debug_tasks(_: web.Request) -> web.Response:
+        tasks = dump_tasks()
+        return respond({"count": len(tasks), "tasks": tasks})
+
+    async def debug_memory(request: web.Request) -> web.Response:
+        data: Dict[str, Any] = {
+            "process": process_memory(),
+            "structures": structure_sizes(),
+            "tracemalloc": allocations.status(),
+        }
+        if request.query.get("types") in ("1", "true"):
+            data["types"] = top_object_types(_parse_limit(request.query.get("limit"), 25, 200))
+        return respond(data)
+
+    async def debug_allocations(request: web.Request) -> web.Response:
+        if request.method == "POST":
+            try:
+                frames = int(request.query.get("frames") or 16)
+            except ValueError as exc:
+                raise web.HTTPBadRequest(text="invalid_frames") from exc
+            return respond(allocations.start(max(1, min(frames, 64))))
+        if request.method == "DELETE":
+            return respond(allocations.stop())
+        if not allocations.tracing:
+            raise web.HTTPConflict(text="tracemalloc_not_started")
+        diff = allocations.diff(_parse_limit(request.query.get("limit"), 25, 500))
+        status = allocations.reset() if request.query.get("reset") in ("1", "true") else allocations.status()
+        return respond({**status, "diff": diff})
+
+    async def metrics(_: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def liveness(_: web.Request) -> web.Response:
+        return respond({"status": "ok"})
+
+    async def readiness(_: web.Request) -> web.Response:
+        if not app["readiness"].ready:
+            return respond({"status": "draining"}, status=503)
+        if not await reader.ping():
+            return respond({"status": "db_unavailable"}, status=503)
+        return respond({"status": "ready"})
 
     async def cors_middleware(app: web.Application, handler):  # type: ignore[override]
         async def middleware_handler(request: web.Request) -> web.Response:
@@ -351,38 +1113,145 @@ def create_api_app(repo: OrdersRepository, encryptor: CredentialEncryptor, confi
                 response = web.Response(status=204)
             else:
                 response = await handler(request)
-            response.headers.update(
-                {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "*",
-                    "Access-Control-Allow-Methods": "GET, POST, PATCH, OPTIONS",
-                }
-            )
+            if not response.prepared:
+                response.headers.update(CORS_HEADERS)
             return response
 
         return middleware_handler
 
+    @web.middleware
+    async def rate_limit_middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        resource = request.match_info.route.resource
+        rule = rate_rules.get(resource.canonical) if resource is not None else None
+        if rule is not None:
+            wait = rate_limiter.check(rule, client_address(request))
+            if wait > 0:
+                # rejected before the handler touches the database, so the writer stays free for real users
+                return web.Response(status=429, text="rate_limited", headers={"Retry-After": retry_after(wait)})
+        return await handler(request)
+
+    @web.middleware
+    async def trace_middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        trace_id = accept_trace_id(request.headers.get(TRACE_HEADER))
+        token = TRACE_ID.set(trace_id)
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        try:
+            with TRACER.start_trace(f"{request.method} {route}", trace_id) as span:
+                try:
+                    response = await handler(request)
+                except web.HTTPException as exc:
+                    span.set("status", exc.status)
+                    exc.headers[TRACE_HEADER] = trace_id
+                    raise
+                span.set("status", response.status)
+        finally:
+            TRACE_ID.reset(token)
+        if not response.prepared:
+            response.headers[TRACE_HEADER] = trace_id
+        return response
+
+    @web.middleware
+    async def metrics_middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        resource = request.match_info.route.resource
+        # the route template, not the path: one series per endpoint however many order ids are requested
+        route = resource.canonical if resource is not None else "unmatched"
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as exc:
+            status = exc.status
+            raise
+        finally:
+            API_REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method)
+            API_REQUESTS.inc(route, request.method, str(status))
+
+    def request_priority(request: web.Request) -> Optional[str]:
+        resource = request.match_info.route.resource
+        canonical = resource.canonical if resource is not None else ""
+        if canonical in UNLIMITED_ROUTES or request.method == "OPTIONS":
+            return None
+        if request.method in ("POST", "PATCH"):
+            return HIGH
+        if canonical in LOW_PRIORITY_ROUTES:
+            return LOW
+        return NORMAL
+
+    @web.middleware
+    async def concurrency_middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        priority = request_priority(request)
+        if priority is None:
+            return await handler(request)
+        if not concurrency.try_acquire(priority):
+            # refusing early keeps latency bounded; queued coroutines would only wait on the same SQLite writer
+            return web.Response(status=503, text="overloaded", headers={"Retry-After": SHED_RETRY_AFTER})
+        try:
+            return await handler(request)
+        finally:
+            concurrency.release()
+
+    app.middlewares.append(trace_middleware)
+    app.middlewares.append(metrics_middleware)
     app.middlewares.append(cors_middleware)  # type: ignore[arg-type]
-    app.router.add_get("/api/orders", list_orders)
-    app.router.add_get("/api/orders/{order_id}", get_order)
-    app.router.add_patch("/api/orders/{order_id}", update_order)
+    if rate_rules:
+        app.middlewares.append(rate_limit_middleware)
+    if config.api_max_concurrency > 0:
+        app.middlewares.append(concurrency_middleware)
+    if config.api_compress_min_size > 0:
+        app.middlewares.append(compression_middleware(min_size=config.api_compress_min_size))
+    app.on_shutdown.append(close_event_streams)
+    app.on_cleanup.append(close_version_connection)
+    app.router.add_get("/health/live", liveness)
+    app.router.add_get("/health/ready", readiness)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/api/admin/queries", admin_only(query_profile))
+    app.router.add_get("/debug/loop", admin_only(debug_loop))
+    app.router.add_get("/debug/profile", admin_only(debug_profile))
+    app.router.add_get("/debug/tasks", admin_only(debug_tasks))
+    app.router.add_get("/debug/memory", admin_only(debug_memory))
+    app.router.add_route("*", "/debug/memory/allocations", admin_only(debug_allocations))
+    app.router.add_get("/api/orders", conditional(list_orders))
+    app.router.add_get("/api/orders/export", export_orders)
+    app.router.add_get("/api/orders/stream", stream_orders)
+    app.router.add_get("/api/orders/changes", order_changes)
+    app.router.add_get("/api/orders/search", conditional(search_orders))
+    app.router.add_get(r"/api/orders/{order_id:\d+}", conditional(get_order))
+    app.router.add_patch(r"/api/orders/{order_id:\d+}", idempotent(update_order))
     app.router.add_post("/api/payloads", create_payload)
-    app.router.add_get("/api/stats", stats)
-    app.router.add_post("/orders/draft", create_draft_order)
-    app.router.add_post("/api/orders/draft", create_draft_order)
-    app.router.add_get("/orders/by_token/{token}", get_by_token)
-    app.router.add_get("/api/orders/by_token/{token}", get_by_token)
+    app.router.add_get("/api/stats", conditional(stats))
+    app.router.add_get("/api/stats/funnel", conditional(funnel_stats))
+    app.router.add_get("/api/stats/timeseries", conditional(timeseries))
+    app.router.add_post("/orders/draft", idempotent(create_draft_order))
+    app.router.add_post("/api/orders/draft", idempotent(create_draft_order))
+    app.router.add_get("/orders/by_token/{token}", conditional(get_by_token))
+    app.router.add_get("/api/orders/by_token/{token}", conditional(get_by_token))
     app.router.add_post(
-        "/orders/{order_id}/update_from_telegram", update_from_telegram
+        "/orders/{order_id}/update_from_telegram", idempotent(update_from_telegram)
     )
     app.router.add_post(
-        "/api/orders/{order_id}/update_from_telegram", update_from_telegram
+        "/api/orders/{order_id}/update_from_telegram", idempotent(update_from_telegram)
     )
-    app.router.add_post("/orders/{order_id}/submit", submit_order)
-    app.router.add_post("/api/orders/{order_id}/submit", submit_order)
-    app.router.add_get("/orders/active_for_user", active_for_user)
-    app.router.add_get("/api/orders/active_for_user", active_for_user)
-    app.router.add_options("/api/orders/{order_id}", lambda _: web.Response(status=204))
+    app.router.add_post("/orders/{order_id}/submit", idempotent(submit_order))
+    app.router.add_post("/api/orders/{order_id}/submit", idempotent(submit_order))
+    app.router.add_get("/orders/active_for_user", conditional(active_for_user))
+    app.router.add_get("/api/orders/active_for_user", conditional(active_for_user))
+    app.router.add_options(r"/api/orders/{order_id:\d+}", lambda _: web.Response(status=204))
+    app.router.add_options("/api/orders/export", lambda _: web.Response(status=204))
     app.router.add_options("/api/payloads", lambda _: web.Response(status=204))
     app.router.add_options("/orders/draft", lambda _: web.Response(status=204))
     app.router.add_options("/api/orders/draft", lambda _: web.Response(status=204))
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from aiohttp import web
+
+from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.config import Config, load_config
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.models.profiling import QueryProfiler
+from payment_qa_bot.services.change_feed import relay_changes
+from payment_qa_bot.services.logs import setup_logging
+from payment_qa_bot.services.security import CredentialEncryptor
+from payment_qa_bot.services.tracing import setup_tracing
+
+logger = logging.getLogger(__name__)
+
+READINESS_DRAIN_SECONDS = 2.0
+WORKER_BOOT_TIMEOUT = 30.0
+
+
+def build_repositories(config: Config) -> tuple[OrdersRepository, Optional[OrdersRepository]]:
+    profiler: Optional[QueryProfiler] = None
+    if config.slow_query_ms > 0:
+        profiler = QueryProfiler(slow_threshold=config.slow_query_ms / 1000)
+    repo = OrdersRepository(config.db_path, profiler=profiler)
+    read_repo: Optional[OrdersRepository] = None
+    if config.api_read_only_get:
+        read_repo = OrdersRepository(config.api_read_db_path or config.db_path, read_only=True, profiler=profiler)
+    return repo, read_repo
+
+
+def build_encryptor(config: Config) -> tuple[CredentialEncryptor, Optional[Executor]]:
+    executor: Optional[Executor] = None
+    if config.encryption_pool == "process":
+        executor = ProcessPoolExecutor()
+    encryptor = CredentialEncryptor(
+        config.encryption_key,
+        batch_threshold=config.encryption_batch_threshold,
+        executor=executor,
+    )
+    return encryptor, executor
+
+
+async def start_api_site(
+    app: web.Application,
+    config: Config,
+    *,
+    reuse_port: bool = False,
+) -> web.AppRunner:
+    runner = web.AppRunner(app, shutdown_timeout=config.api_shutdown_timeout)
+    await runner.setup()
+    site = web.TCPSite(
+        runner,
+        host=config.api_host,
+        port=config.api_port,
+        reuse_port=reuse_port or None,
+        shutdown_timeout=config.api_shutdown_timeout,
+    )
+    await site.start()
+    return runner
+
+
+async def serve(
+    config: Config,
+    *,
+    reuse_port: bool = False,
+    on_ready: Optional[Callable[[], None]] = None,
+) -> None:
+    repo, read_repo = build_repositories(config)
+    await repo.init()
+    encryptor, executor = build_encryptor(config)
+    app = create_api_app(repo, encryptor, config, read_repo=read_repo)
+    runner = await start_api_site(app, config, reuse_port=reuse_port)
+    relay: Optional[asyncio.Task] = None
+    if config.api_change_poll > 0:
+        relay = asyncio.create_task(relay_changes(repo, interval=config.api_change_poll))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    logger.info("API worker listening on %s:%s", config.api_host, config.api_port)
+    if on_ready is not None:
+        on_ready()
+    try:
+        await stop.wait()
+    finally:
+        # fail readiness first so the proxy stops routing here, then let in-flight requests finish
+        app["readiness"].ready = False
+        await asyncio.sleep(min(READINESS_DRAIN_SECONDS, config.api_shutdown_timeout))
+        if relay is not None:
+            relay.cancel()
+        await runner.cleanup()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("API worker stopped")
+
+
+def _run_worker(ready: Optional[Any] = None) -> None:
+    config = load_config(require_token=False)
+    setup_logging(config.log_level, json_output=config.log_json, debug_sample=config.log_debug_sample)
+    setup_tracing(config.trace_sample, config.trace_export)
+    asyncio.run(serve(config, reuse_port=True, on_ready=ready.set if ready is not None else None))
+
+
+class WorkerSupervisor:
+    def __init__(self, workers: int, shutdown_timeout: float) -> None:
+        self._workers = workers
+        self._shutdown_timeout = shutdown_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+        self._stopping = False
+        self._reload_requested = False
+
+    def _spawn(self, ready: Optional[Any] = None) -> multiprocessing.process.BaseProcess:
+        process = self._context.Process(target=_run_worker, args=(ready,), daemon=False)
+        process.start()
+        return process
+
+    def _wait_ready(self, process: multiprocessing.process.BaseProcess, ready: Any) -> bool:
+        # the workers share one port, so polling /health/ready could be answered by any of them;
+        # the event is set by this worker only, once its site is listening
+        deadline = time.monotonic() + WORKER_BOOT_TIMEOUT
+        while not ready.wait(0.1):
+            if not process.is_alive() or self._stopping or time.monotonic() >= deadline:
+                return False
+        return True
+
+    def _stop_process(self, process: multiprocessing.process.BaseProcess) -> None:
+        if process.is_alive():
+            process.terminate()
+        process.join(self._shutdown_timeout + READINESS_DRAIN_SECONDS + 1)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _reload(self) -> None:
+        # rolling restart: bring a fresh worker up before retiring each old one so the port never goes dark
+        logger.info("Reloading %s API workers", len(self._processes))
+        for index, old in enumerate(list(self._processes)):
+            ready = self._context.Event()
+            fresh = self._spawn(ready)
+            if not self._wait_ready(fresh, ready):
+                logger.error("New API worker pid=%s did not become ready, aborting reload", fresh.pid)
+                self._stop_process(fresh)
+                return
+            self._processes[index] = fresh
+            self._stop_process(old)
+
+    def _handle_stop(self, *_: object) -> None:
+        self._stopping = True
+
+    def _handle_reload(self, *_: object) -> None:
+        self._reload_requested = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        self._processes = [self._spawn() for _ in range(self._workers)]
+        logger.info("Started %s API workers", self._workers)
+        try:
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self._reload()
+                for index, process in enumerate(self._processes):
+                    if not process.is_alive() and not self._stopping:
+                        logger.warning("API worker pid=%s exited with %s, restarting", process.pid, process.exitcode)
+                        self._processes[index] = self._spawn()
+                time.sleep(0.5)
+        finally:
+            for process in self._processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in self._processes:
+                self._stop_process(process)
+
+
+def main() -> None:
+    config = load_config(require_token=False)
+    setup_logging(config.log_level, json_output=config.log_json, debug_sample=config.log_debug_sample)
+    WorkerSupervisor(config.api_workers, config.api_shutdown_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
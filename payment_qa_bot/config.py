@@ -25,6 +25,26 @@ def _parse_geo_list(raw: str) -> List[str]:
     return items
 
 
+def _parse_bool(raw: Optional[str], default: bool) -> bool:
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _parse_int(raw: Optional[str], default: int) -> int:
+    try:
+        return int(raw) if raw is not None else default
+    except ValueError:
+        return default
+
+
+def _parse_float(raw: Optional[str], default: float) -> float:
+    try:
+        return float(raw) if raw is not None else default
+    except ValueError:
+        return default
+
+
 @dataclass(slots=True)
 class Config:
     bot_token: str
@@ -38,11 +58,48 @@ class Config:
     geo_whitelist: List[str]
     api_host: str
     api_port: int
-
-
-def load_config() -> Config:
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
+    api_embedded: bool = True
+    api_workers: int = 1
+    api_read_only_get: bool = False
+    api_read_db_path: Optional[str] = None
+    api_shutdown_timeout: float = 15.0
+    json_encoder: str = "auto"
+    api_change_poll: float = 2.0
+    api_compress_min_size: int = 1024
+    idempotency_ttl: float = 86400.0
+    api_rate_limit: float = 30.0
+    api_rate_burst: float = 10.0
+    api_route_rate: float = 20.0
+    api_max_concurrency: int = 64
+    api_latency_target: float = 0.1
+    slow_query_ms: float = 200.0
+    admin_api_token: Optional[str] = None
+    loop_lag_threshold: float = 0.5
+    log_level: str = "INFO"
+    log_json: bool = False
+    log_debug_sample: float = 0.1
+    trace_sample: float = 0.0
+    trace_export: str = "traces.jsonl"
+    funnel_flush_interval: float = 60.0
+    funnel_idle_timeout: float = 1800.0
+    rollup_hourly_days: int = 14
+    tg_global_rate: float = 30.0
+    tg_chat_rate: float = 1.0
+    tg_group_rate: float = 20 / 60
+    outbound_workers: int = 8
+    admin_digest_threshold: int = 5
+    admin_digest_window: float = 60.0
+    group_redirect_cooldown: float = 600.0
+    group_leave_threshold: int = 0
+    group_leave_window: float = 600.0
+    encryption_pool: str = "thread"
+    encryption_batch_threshold: int = 64
+    encryption_reencrypt_on_start: bool = False
+
+
+def load_config(*, require_token: bool = True) -> Config:
+    token = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    if not token and require_token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN environment variable is not set")
 
     db_path = os.getenv("DB_URL") or os.getenv("BOT_DB_PATH", "sqlite+aiosqlite:///./bot.db")
@@ -75,6 +132,19 @@ def load_config() -> Config:
     except ValueError:
         api_port = 8081
 
+    read_db_path = os.getenv("BOT_API_READ_DB_PATH") or None
+    if read_db_path and read_db_path.startswith("sqlite+"):
+        read_db_path = read_db_path.split("sqlite+", maxsplit=1)[-1]
+
+    log_level = (os.getenv("BOT_LOG_LEVEL") or "INFO").strip().upper()
+    if log_level not in {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}:
+        log_level = "INFO"
+
+    json_encoder = (os.getenv("BOT_JSON_ENCODER") or "auto").strip().lower()
+    if json_encoder not in {"auto", "orjson", "stdlib"}:
+        # a typo here would otherwise quietly serve every response with a different encoder
+        raise RuntimeError(f"BOT_JSON_ENCODER must be auto, orjson or stdlib, got {json_encoder!r}")
+
     return Config(
         bot_token=token,
         db_path=db_path,
@@ -87,4 +157,41 @@ def load_config() -> Config:
         geo_whitelist=geo_whitelist,
         api_host=api_host,
         api_port=api_port,
+        api_embedded=_parse_bool(os.getenv("BOT_API_EMBEDDED"), True),
+        api_workers=max(1, _parse_int(os.getenv("BOT_API_WORKERS"), 1)),
+        api_read_only_get=_parse_bool(os.getenv("BOT_API_READONLY_GET"), False),
+        api_read_db_path=read_db_path,
+        api_shutdown_timeout=max(0.0, _parse_float(os.getenv("BOT_API_SHUTDOWN_TIMEOUT"), 15.0)),
+        json_encoder=json_encoder,
+        api_change_poll=max(0.0, _parse_float(os.getenv("BOT_API_CHANGE_POLL"), 2.0)),
+        api_compress_min_size=_parse_int(os.getenv("BOT_API_COMPRESS_MIN_SIZE"), 1024),
+        idempotency_ttl=max(1.0, _parse_float(os.getenv("BOT_IDEMPOTENCY_TTL"), 86400.0)),
+        api_rate_limit=max(0.0, _parse_float(os.getenv("BOT_API_RATE_LIMIT"), 30.0)),
+        api_rate_burst=max(1.0, _parse_float(os.getenv("BOT_API_RATE_BURST"), 10.0)),
+        api_route_rate=max(0.0, _parse_float(os.getenv("BOT_API_ROUTE_RATE"), 20.0)),
+        api_max_concurrency=max(0, _parse_int(os.getenv("BOT_API_MAX_CONCURRENCY"), 64)),
+        api_latency_target=max(0.001, _parse_float(os.getenv("BOT_API_LATENCY_TARGET_MS"), 100.0) / 1000),
+        slow_query_ms=max(0.0, _parse_float(os.getenv("BOT_SLOW_QUERY_MS"), 200.0)),
+        admin_api_token=(os.getenv("BOT_ADMIN_API_TOKEN") or "").strip() or None,
+        loop_lag_threshold=max(0.0, _parse_float(os.getenv("BOT_LOOP_LAG_THRESHOLD_MS"), 500.0) / 1000),
+        log_level=log_level,
+        log_json=(os.getenv("BOT_LOG_FORMAT") or "text").strip().lower() == "json",
+        log_debug_sample=min(1.0, max(0.0, _parse_float(os.getenv("BOT_LOG_DEBUG_SAMPLE"), 0.1))),
+        trace_sample=min(1.0, max(0.0, _parse_float(os.getenv("BOT_TRACE_SAMPLE"), 0.0))),
+        trace_export=(os.getenv("BOT_TRACE_EXPORT") or "traces.jsonl").strip(),
+        funnel_flush_interval=max(0.0, _parse_float(os.getenv("BOT_FUNNEL_FLUSH_INTERVAL"), 60.0)),
+        funnel_idle_timeout=max(60.0, _parse_float(os.getenv("BOT_FUNNEL_IDLE_TIMEOUT"), 1800.0)),
+        rollup_hourly_days=max(1, _parse_int(os.getenv("BOT_ROLLUP_HOURLY_DAYS"), 14)),
+        tg_global_rate=max(1.0, _parse_float(os.getenv("BOT_TG_GLOBAL_RATE"), 30.0)),
+        tg_chat_rate=max(0.01, _parse_float(os.getenv("BOT_TG_CHAT_RATE"), 1.0)),
+        tg_group_rate=max(0.01, _parse_float(os.getenv("BOT_TG_GROUP_RATE"), 20 / 60)),
+        outbound_workers=max(1, _parse_int(os.getenv("BOT_OUTBOUND_WORKERS"), 8)),
+        admin_digest_threshold=_parse_int(os.getenv("BOT_ADMIN_DIGEST_THRESHOLD"), 5),
+        admin_digest_window=max(1.0, _parse_float(os.getenv("BOT_ADMIN_DIGEST_WINDOW"), 60.0)),
+        group_redirect_cooldown=max(0.0, _parse_float(os.getenv("BOT_GROUP_REDIRECT_COOLDOWN"), 600.0)),
+        group_leave_threshold=max(0, _parse_int(os.getenv("BOT_GROUP_LEAVE_THRESHOLD"), 0)),
+        group_leave_window=max(1.0, _parse_float(os.getenv("BOT_GROUP_LEAVE_WINDOW"), 600.0)),
+        encryption_pool="process" if os.getenv("ENCRYPTION_POOL", "").lower() == "process" else "thread",
+        encryption_batch_threshold=max(1, _parse_int(os.getenv("ENCRYPTION_BATCH_THRESHOLD"), 64)),
+        encryption_reencrypt_on_start=_parse_bool(os.getenv("ENCRYPTION_REENCRYPT"), False),
     )
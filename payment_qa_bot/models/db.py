@@ -1,14 +1,77 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import secrets
+import time
+from contextlib import asynccontextmanager
 from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
 
 import aiosqlite
 
+from payment_qa_bot.models.profiling import CallStats, ProfiledConnection, QueryProfiler, StepCountingConnection
+from payment_qa_bot.services.events import CREATED, UPDATED, OrderEventHub
+from payment_qa_bot.services.metrics import observe_query
+from payment_qa_bot.services.tracing import TRACER
+
+# (repository method, seconds including lock waits, rows read or written)
+QueryObserver = Callable[[str, float, int], None]
+
+ROLLUP_DIMENSIONS = ("geo", "status", "source")
+# in_progress is set before payment is confirmed, so it does not count; the dashboard fallback uses the same rule
+REVENUE_STATUSES = ("paid", "completed")
+ROLLUP_BUCKETS = {
+    "hour": "bucket",
+    "day": "substr(bucket, 1, 10) || 'T00:00:00'",
+    # 'weekday 0' moves to the coming Sunday (or stays on one), six days back is that week's Monday
+    "week": "date(bucket, 'weekday 0', '-6 days') || 'T00:00:00'",
+}
+# column weights for bm25: exact identifiers (txid, email, username) outrank free text
+SEARCH_COLUMNS = {
+    "username": 4.0,
+    "email": 4.0,
+    "method_user_text": 1.0,
+    "comments": 1.0,
+    "site_url": 2.0,
+    "payment_txid": 8.0,
+}
+SEARCH_MAX_TERMS = 8
+# only the newest matches are ranked, so a term found in half the table still costs a bounded amount of work
+SEARCH_WINDOW = 1000
+
+
+def build_search_query(text: str) -> Optional[str]:
+    # user input never reaches FTS5 syntax: every word becomes a quoted phrase and words are ANDed; single
+    # characters match whole tokens only, as a one-letter prefix would expand to most of the vocabulary
+    terms = [term for term in text.split() if any(char.isalnum() for char in term)][:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join('"{}"{}'.format(term.replace('"', '""'), "*" if len(term) > 1 else "") for term in terms)
+
+
+def _rollup_statements(row: str, sign: str) -> str:
+    # each order lands in the hourly table unless its hour was already compacted into days
+    statuses = ", ".join(f"'{status}'" for status in REVENUE_STATUSES)
+    revenue = f"CASE WHEN {row}.status IN ({statuses}) THEN COALESCE({row}.price_eur, 0) ELSE 0 END"
+    hour = f"substr({row}.created_at, 1, 13) || ':00:00'"
+    day = f"substr({row}.created_at, 1, 10) || 'T00:00:00'"
+    statements = []
+    for dimension in ROLLUP_DIMENSIONS:
+        for table, bucket, compare in (("order_rollup_hourly", hour, ">="), ("order_rollup_daily", day, "<")):
+            statements.append(
+                f"""
+                    INSERT INTO {table}(bucket, dimension, value, orders, revenue)
+                    SELECT {bucket}, '{dimension}', COALESCE({row}.{dimension}, ''), {sign}1, {sign}({revenue})
+                    WHERE {hour} {compare} (SELECT compacted_before FROM order_rollup_state WHERE id = 1)
+                    ON CONFLICT(bucket, dimension, value) DO UPDATE SET
+                        orders = orders + excluded.orders, revenue = revenue + excluded.revenue;"""
+            )
+    return "".join(statements)
+
 
 @dataclass(slots=True)
 class OrderRecord:
@@ -72,21 +135,165 @@ class OrderCreate:
     email: Optional[str]
 
 
+@dataclass(slots=True)
+class OrderFilter:
+    status: Optional[str] = None
+    state: Optional[str] = None
+    geo: Optional[str] = None
+    source: Optional[str] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+
+    def where(self) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column in ("status", "state", "geo", "source"):
+            value = getattr(self, column)
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if self.since is not None:
+            clauses.append("created_at >= ?")
+            params.append(self.since)
+        if self.until is not None:
+            clauses.append("created_at < ?")
+            params.append(self.until)
+        if not clauses:
+            return "", params
+        return "WHERE " + " AND ".join(clauses), params
+
+
+@dataclass(slots=True)
+class ChangeCursor:
+    updated_at: str = ""
+    order_id: int = 0
+    tombstone: int = 0
+
+
+@dataclass(slots=True)
+class Tombstone:
+    order_id: int
+    reason: str
+    at: str
+
+
+@dataclass(slots=True)
+class ChangeSet:
+    orders: List[OrderRecord]
+    tombstones: List[Tombstone]
+    cursor: ChangeCursor
+    has_more: bool
+
+
 @dataclass(slots=True)
 class UserSettings:
     user_id: int
     language: str
 
 
+ARCHIVED_STATUSES = ("archived",)
+# updated_at has one-second resolution, so a write landing in the current second may still sort before
+# the newest row; cursors never move past this horizon and those rows are simply returned again
+CHANGES_SETTLE_SECONDS = 2
+
+
 class OrdersRepository:
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        read_only: bool = False,
+        events: Optional[OrderEventHub] = None,
+        profiler: Optional[QueryProfiler] = None,
+    ) -> None:
         self._db_path = db_path
+        self._read_only = read_only
+        self.events = events if events is not None else OrderEventHub()
+        self.query_observers: List[QueryObserver] = [observe_query]
+        self.profiler = profiler
+        self._version_db: Optional[aiosqlite.Connection] = None
         directory = os.path.dirname(os.path.abspath(db_path))
-        if directory and not os.path.exists(directory):
+        if not read_only and directory and not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
 
+    @property
+    def read_only(self) -> bool:
+        return self._read_only
+
+    async def data_version(self) -> str:
+        # a WAL restarted after a checkpoint is overwritten in place at the same size, leaving only the mtime,
+        # which may not tick between two commits; the trigger-maintained counter settles those cases for orders.
+        # It is read first because the first read over a connection creates the -wal file stat()ed below
+        db = self._version_db or await self._open_version_connection()
+        try:
+            rows = await db.execute_fetchall("SELECT version FROM orders_version WHERE id = 1")
+        except Exception:  # noqa: BLE001
+            await self.close()
+            raise
+        # every commit touches the -wal file (or the main file outside WAL mode), so a stat of both changes
+        # whenever any process writes and all API workers agree on the value
+        parts = [str(rows[0][0] if rows else 0)]
+        for path in (self._db_path, f"{self._db_path}-wal"):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                parts.append("0")
+                continue
+            parts.append(f"{stat.st_mtime_ns:x}.{stat.st_size:x}")
+        return hashlib.blake2s("/".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+    async def _open_version_connection(self) -> aiosqlite.Connection:
+        # every conditional GET reads the counter, so it goes over one long-lived read-only connection instead of
+        # opening the database per request; an autocommit SELECT still sees the latest commit of any process
+        uri = "file:{path}?mode=ro".format(path=quote(os.path.abspath(self._db_path)))
+        db = await aiosqlite.connect(uri, uri=True)
+        if self._version_db is not None:
+            # a concurrent request opened one first
+            await db.close()
+            return self._version_db
+        self._version_db = db
+        return db
+
+    async def close(self) -> None:
+        db, self._version_db = self._version_db, None
+        if db is not None:
+            await db.close()
+
+    def _open(self) -> aiosqlite.Connection:
+        options: Dict[str, Any] = {}
+        if self.profiler is not None:
+            options["factory"] = StepCountingConnection
+        if self._read_only:
+            # mode=ro refuses writes at the SQLite level, so GET-only API workers cannot take the writer lock
+            uri = "file:{path}?mode=ro".format(path=quote(os.path.abspath(self._db_path)))
+            return aiosqlite.connect(uri, uri=True, **options)
+        return aiosqlite.connect(self._db_path, **options)
+
+    @asynccontextmanager
+    async def _connect(self, method: str) -> AsyncIterator[Any]:
+        # method names the measurement in metrics, traces and the query profile
+        if not self.query_observers and self.profiler is None:
+            async with self._open() as db:
+                yield db
+            return
+        # the time spent here includes waiting for the writer lock, which is what callers care about
+        stats = CallStats(method)
+        started = time.perf_counter()
+        with TRACER.span("db." + method) as span:
+            try:
+                async with self._open() as db:
+                    yield ProfiledConnection(db, stats, self.profiler)
+            finally:
+                elapsed = time.perf_counter() - started
+                span.set("rows", stats.rows)
+                for observer in self.query_observers:
+                    observer(method, elapsed, stats.rows)
+
     async def init(self) -> None:
-        async with aiosqlite.connect(self._db_path) as db:
+        if self._read_only:
+            return
+        async with self._connect("init") as db:
+            await db.execute("PRAGMA journal_mode=WAL")
             await db.execute(
                 """
                 CREATE TABLE IF NOT EXISTS orders (
@@ -140,10 +347,85 @@ class OrdersRepository:
                 )
                 """
             )
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS maintenance_jobs (
+                    name TEXT PRIMARY KEY,
+                    cursor INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS order_tombstones (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER NOT NULL,
+                    reason TEXT NOT NULL,
+                    deleted_at TEXT NOT NULL
+                )
+                """
+            )
+            await db.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_orders_tombstone AFTER DELETE ON orders
+                BEGIN
+                    INSERT INTO order_tombstones(order_id, reason, deleted_at)
+                    VALUES (OLD.order_id, 'deleted', strftime('%Y-%m-%dT%H:%M:%S', 'now'));
+                END
+                """
+            )
+            # bumped by every write to orders, so ETags change even within one second and one WAL size
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS orders_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+            await db.execute("INSERT OR IGNORE INTO orders_version(id, version) VALUES (1, 0)")
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                await db.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_orders_version_{event.lower()} AFTER {event} ON orders
+                    BEGIN
+                        UPDATE orders_version SET version = version + 1 WHERE id = 1;
+                    END
+                    """
+                )
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    status INTEGER,
+                    content_type TEXT,
+                    body BLOB,
+                    created_at TEXT NOT NULL
+                )
+                """
+            )
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS funnel_stats (
+                    period_start TEXT NOT NULL,
+                    step TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (period_start, step, metric)
+                ) WITHOUT ROWID
+                """
+            )
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency_keys(created_at)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders(updated_at, order_id)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_payload_cache_created_at ON payload_cache(created_at)")
             await self._ensure_columns(db)
+            await self._ensure_rollups(db)
+            await self._ensure_search(db)
             await db.commit()
 
     async def _ensure_columns(self, db: aiosqlite.Connection) -> None:
@@ -169,6 +451,126 @@ class OrdersRepository:
         await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_email ON orders(email)")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_tg_user ON orders(tg_user_id)")
 
+    async def _ensure_rollups(self, db: aiosqlite.Connection) -> None:
+        for table in ("order_rollup_hourly", "order_rollup_daily"):
+            await db.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    orders INTEGER NOT NULL DEFAULT 0,
+                    revenue INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dimension, bucket, value)
+                ) WITHOUT ROWID
+                """
+            )
+        # hours before compacted_before only exist as days; '' means nothing has been compacted yet
+        await db.execute(
+            "CREATE TABLE IF NOT EXISTS order_rollup_state ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), compacted_before TEXT NOT NULL)"
+        )
+        cursor = await db.execute("PRAGMA table_info(order_rollup_state)")
+        if "revenue_statuses" not in {row[1] for row in await cursor.fetchall()}:
+            await db.execute("ALTER TABLE order_rollup_state ADD COLUMN revenue_statuses TEXT NOT NULL DEFAULT ''")
+        definition = ",".join(REVENUE_STATUSES)
+        cursor = await db.execute(
+            "INSERT OR IGNORE INTO order_rollup_state(id, compacted_before, revenue_statuses) VALUES (1, '', ?)",
+            (definition,),
+        )
+        seed = bool(cursor.rowcount)
+        if not seed:
+            cursor = await db.execute("SELECT revenue_statuses FROM order_rollup_state WHERE id = 1")
+            if (await cursor.fetchone())[0] != definition:
+                # revenue is counted differently now: the triggers carry the old status list and the stored
+                # sums were built with it, so both are rebuilt from the orders
+                for name in ("insert", "delete", "update"):
+                    await db.execute(f"DROP TRIGGER IF EXISTS trg_orders_rollup_{name}")
+                await db.execute("DELETE FROM order_rollup_hourly")
+                await db.execute("DELETE FROM order_rollup_daily")
+                await db.execute(
+                    "UPDATE order_rollup_state SET compacted_before = '', revenue_statuses = ? WHERE id = 1",
+                    (definition,),
+                )
+                seed = True
+        if seed:
+            # first start on an existing database (or a new revenue rule): seed the rollups from the orders
+            statuses = ", ".join(f"'{status}'" for status in REVENUE_STATUSES)
+            for dimension in ROLLUP_DIMENSIONS:
+                await db.execute(
+                    f"""
+                    INSERT INTO order_rollup_hourly(bucket, dimension, value, orders, revenue)
+                    SELECT substr(created_at, 1, 13) || ':00:00', '{dimension}', COALESCE({dimension}, ''), COUNT(*),
+                           SUM(CASE WHEN status IN ({statuses}) THEN COALESCE(price_eur, 0) ELSE 0 END)
+                    FROM orders GROUP BY 1, 3
+                    """
+                )
+        await db.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_insert AFTER INSERT ON orders BEGIN "
+            f"{_rollup_statements('NEW', '+')} END"
+        )
+        await db.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_delete AFTER DELETE ON orders BEGIN "
+            f"{_rollup_statements('OLD', '-')} END"
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_update
+            AFTER UPDATE OF geo, status, source, price_eur, created_at ON orders
+            WHEN OLD.geo IS NOT NEW.geo OR OLD.status IS NOT NEW.status OR OLD.source IS NOT NEW.source
+                OR OLD.price_eur IS NOT NEW.price_eur OR OLD.created_at IS NOT NEW.created_at
+            BEGIN {_rollup_statements('OLD', '-')} {_rollup_statements('NEW', '+')} END
+            """
+        )
+
+    async def _ensure_search(self, db: aiosqlite.Connection) -> None:
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'")
+        exists = await cursor.fetchone() is not None
+        columns = ", ".join(SEARCH_COLUMNS)
+        # external content: the index stores only tokens and reads the text back from orders by rowid
+        await db.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+                {columns}, content='orders', content_rowid='order_id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            """
+        )
+        if not exists:
+            weights = ", ".join(f"{weight:g}" for weight in SEARCH_COLUMNS.values())
+            await db.execute("INSERT INTO orders_fts(orders_fts, rank) VALUES('rank', ?)", (f"bm25({weights})",))
+            await db.execute("INSERT INTO orders_fts(orders_fts) VALUES('rebuild')")
+        new_values = ", ".join(f"NEW.{column}" for column in SEARCH_COLUMNS)
+        old_values = ", ".join(f"OLD.{column}" for column in SEARCH_COLUMNS)
+        changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in SEARCH_COLUMNS)
+        insert = f"INSERT INTO orders_fts(rowid, {columns}) VALUES (NEW.order_id, {new_values});"
+        # a delete must repeat the exact indexed values, which only the old row still has
+        delete = (
+            f"INSERT INTO orders_fts(orders_fts, rowid, {columns}) VALUES ('delete', OLD.order_id, {old_values});"
+        )
+        await db.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_orders_search_insert AFTER INSERT ON orders BEGIN {insert} END"
+        )
+        await db.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_orders_search_delete AFTER DELETE ON orders BEGIN {delete} END"
+        )
+        await db.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_orders_search_update AFTER UPDATE OF {columns} ON orders
+            WHEN {changed}
+            BEGIN {delete} {insert} END
+            """
+        )
+
+    async def ping(self) -> bool:
+        try:
+            async with self._connect("ping") as db:
+                cursor = await db.execute("SELECT 1")
+                await cursor.fetchone()
+        except Exception:  # noqa: BLE001 - readiness probes only need a yes/no answer
+            return False
+        return True
+
     def generate_start_token(self) -> str:
         return secrets.token_urlsafe(8)
 
@@ -188,13 +590,15 @@ class OrdersRepository:
         columns = ", ".join(fields.keys())
         placeholders = ", ".join(["?"] * len(fields))
         values = list(fields.values())
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("create_order") as db:
             cursor = await db.execute(
                 f"INSERT INTO orders ({columns}) VALUES ({placeholders})",
                 values,
             )
             await db.commit()
-            return cursor.lastrowid
+        order_id = cursor.lastrowid
+        self.events.publish(CREATED, order_id, {"order_id": order_id, **fields})
+        return order_id
 
     async def update_order(self, order_id: int, **fields: Any) -> None:
         if not fields:
@@ -203,12 +607,14 @@ class OrdersRepository:
         assignments = ", ".join(f"{column} = ?" for column in fields.keys())
         values = list(fields.values())
         values.append(order_id)
-        async with aiosqlite.connect(self._db_path) as db:
-            await db.execute(
+        async with self._connect("update_order") as db:
+            cursor = await db.execute(
                 f"UPDATE orders SET {assignments} WHERE order_id = ?",
                 values,
             )
             await db.commit()
+        if cursor.rowcount:
+            self.events.publish(UPDATED, order_id, fields)
 
     async def get_last_order(self, user_id: int) -> Optional[OrderRecord]:
         query = """
@@ -217,7 +623,7 @@ class OrdersRepository:
             ORDER BY created_at DESC
             LIMIT 1
         """
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_last_order") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(query, (user_id,))
             row = await cursor.fetchone()
@@ -226,7 +632,7 @@ class OrdersRepository:
         return self._row_to_order(row)
 
     async def get_order(self, order_id: int) -> Optional[OrderRecord]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_order") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM orders WHERE order_id = ? LIMIT 1",
@@ -238,7 +644,7 @@ class OrdersRepository:
         return self._row_to_order(row)
 
     async def list_by_status(self, status: str) -> List[OrderRecord]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("list_by_status") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM orders WHERE status = ? ORDER BY created_at DESC",
@@ -247,18 +653,100 @@ class OrdersRepository:
             rows = await cursor.fetchall()
         return [self._row_to_order(row) for row in rows]
 
-    async def list_recent(self, limit: int = 200) -> List[OrderRecord]:
-        async with aiosqlite.connect(self._db_path) as db:
+    async def list_recent(self, limit: int = 200, filters: Optional[OrderFilter] = None) -> List[OrderRecord]:
+        where, params = (filters or OrderFilter()).where()
+        async with self._connect("list_recent") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
-                "SELECT * FROM orders ORDER BY created_at DESC LIMIT ?",
-                (limit,),
+                f"SELECT * FROM orders {where} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit),
             )
             rows = await cursor.fetchall()
         return [self._row_to_order(row) for row in rows]
 
+    async def iter_orders(
+        self,
+        filters: Optional[OrderFilter] = None,
+        *,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[List[OrderRecord]]:
+        # one cursor, one snapshot: rows are pulled chunk by chunk only as fast as the consumer asks for them
+        where, params = (filters or OrderFilter()).where()
+        # untimed: the connection stays open while the consumer streams, which is not query latency
+        async with self._open() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(f"SELECT * FROM orders {where} ORDER BY order_id", params)
+            try:
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield [self._row_to_order(row) for row in rows]
+            finally:
+                await cursor.close()
+
+    async def changes_since(self, cursor: ChangeCursor, *, limit: int = 500) -> ChangeSet:
+        async with self._connect("changes_since") as db:
+            db.row_factory = aiosqlite.Row
+            rows = await db.execute_fetchall(
+                """
+                SELECT * FROM orders
+                WHERE (updated_at, order_id) > (?, ?)
+                ORDER BY updated_at, order_id
+                LIMIT ?
+                """,
+                (cursor.updated_at, cursor.order_id, limit + 1),
+            )
+            removed = await db.execute_fetchall(
+                "SELECT seq, order_id, reason, deleted_at FROM order_tombstones WHERE seq > ? ORDER BY seq LIMIT ?",
+                (cursor.tombstone, limit + 1),
+            )
+        rows = list(rows)
+        removed = list(removed)
+        rows_truncated = len(rows) > limit
+        has_more = rows_truncated or len(removed) > limit
+        rows = rows[:limit]
+        removed = removed[:limit]
+        orders: List[OrderRecord] = []
+        tombstones = [Tombstone(row["order_id"], row["reason"], row["deleted_at"]) for row in removed]
+        next_cursor = ChangeCursor(cursor.updated_at, cursor.order_id, cursor.tombstone)
+        if removed:
+            next_cursor.tombstone = removed[-1]["seq"]
+        horizon = (datetime.utcnow() - timedelta(seconds=CHANGES_SETTLE_SECONDS)).isoformat(timespec="seconds")
+        for row in rows:
+            record = self._row_to_order(row)
+            if record.status in ARCHIVED_STATUSES:
+                tombstones.append(Tombstone(record.order_id, "archived", record.updated_at))
+            else:
+                orders.append(record)
+            # a full page must advance or the client would fetch it forever
+            if record.updated_at < horizon or rows_truncated:
+                next_cursor.updated_at = record.updated_at
+                next_cursor.order_id = record.order_id
+        return ChangeSet(orders, tombstones, next_cursor, has_more)
+
+    async def latest_change_cursor(self) -> ChangeCursor:
+        # the newest settled row, like changes_since(): writes in the last seconds are replayed, never skipped
+        horizon = (datetime.utcnow() - timedelta(seconds=CHANGES_SETTLE_SECONDS)).isoformat(timespec="seconds")
+        async with self._connect("latest_change_cursor") as db:
+            cursor = await db.execute(
+                """
+                SELECT updated_at, order_id FROM orders
+                WHERE updated_at < ?
+                ORDER BY updated_at DESC, order_id DESC
+                LIMIT 1
+                """,
+                (horizon,),
+            )
+            row = await cursor.fetchone()
+            cursor = await db.execute("SELECT COALESCE(MAX(seq), 0) FROM order_tombstones")
+            tombstone = (await cursor.fetchone())[0]
+        if row is None:
+            return ChangeCursor(tombstone=tombstone)
+        return ChangeCursor(row[0], row[1], tombstone)
+
     async def get_stats(self) -> Dict[str, int]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_stats") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT status, COUNT(*) AS cnt FROM orders GROUP BY status"
@@ -276,7 +764,7 @@ class OrdersRepository:
             LIMIT 1
         """.format(states=",".join(["?"] * len(states)))
         params: List[Any] = [email, *states]
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("find_active_for_email") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(query, params)
             row = await cursor.fetchone()
@@ -292,7 +780,7 @@ class OrdersRepository:
             LIMIT 1
         """.format(states=",".join(["?"] * len(states)))
         params: List[Any] = [tg_user_id, *states]
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("find_active_for_tg") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(query, params)
             row = await cursor.fetchone()
@@ -301,7 +789,7 @@ class OrdersRepository:
         return self._row_to_order(row)
 
     async def get_by_start_token(self, token: str) -> Optional[OrderRecord]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_by_start_token") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM orders WHERE start_token = ? LIMIT 1",
@@ -364,7 +852,7 @@ class OrdersRepository:
 
     async def save_payload_reference(self, token: str, payload: str) -> None:
         now = datetime.utcnow().isoformat(timespec="seconds")
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("save_payload_reference") as db:
             await db.execute(
                 """
                 INSERT INTO payload_cache(token, payload, created_at)
@@ -376,7 +864,7 @@ class OrdersRepository:
             await db.commit()
 
     async def get_payload_reference(self, token: str) -> Optional[str]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_payload_reference") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT payload FROM payload_cache WHERE token = ? LIMIT 1",
@@ -388,7 +876,7 @@ class OrdersRepository:
         return row["payload"]
 
     async def delete_payload_reference(self, token: str) -> None:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("delete_payload_reference") as db:
             await db.execute(
                 "DELETE FROM payload_cache WHERE token = ?",
                 (token,),
@@ -397,7 +885,7 @@ class OrdersRepository:
 
     async def cleanup_payload_references(self, max_age_hours: int = 72) -> int:
         cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("cleanup_payload_references") as db:
             cursor = await db.execute(
                 "DELETE FROM payload_cache WHERE created_at < ?",
                 (cutoff.isoformat(timespec="seconds"),),
@@ -405,8 +893,178 @@ class OrdersRepository:
             await db.commit()
             return cursor.rowcount
 
+    async def claim_idempotency_key(self, key: str, fingerprint: str) -> Optional[tuple]:
+        # returns None when this caller now owns the key, otherwise the existing
+        # (fingerprint, status, content_type, body, created_at) row; status is NULL while the owner is still running
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        async with self._connect("claim_idempotency_key") as db:
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO idempotency_keys(key, fingerprint, created_at) VALUES(?, ?, ?)",
+                (key, fingerprint, now),
+            )
+            await db.commit()
+            if cursor.rowcount:
+                return None
+            cursor = await db.execute(
+                "SELECT fingerprint, status, content_type, body, created_at FROM idempotency_keys WHERE key = ?",
+                (key,),
+            )
+            row = await cursor.fetchone()
+        return tuple(row) if row is not None else None
+
+    async def complete_idempotency_key(self, key: str, status: int, content_type: str, body: bytes) -> None:
+        async with self._connect("complete_idempotency_key") as db:
+            await db.execute(
+                "UPDATE idempotency_keys SET status = ?, content_type = ?, body = ? WHERE key = ?",
+                (status, content_type, body, key),
+            )
+            await db.commit()
+
+    async def release_idempotency_key(
+        self,
+        key: str,
+        *,
+        pending_only: bool = True,
+        created_at: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+    ) -> bool:
+        # created_at and fingerprint pin the delete to the row the caller looked at: when two workers take over
+        # the same stale key, the slower one must not delete the claim the faster one has just made
+        query = "DELETE FROM idempotency_keys WHERE key = ?"
+        params: List[Any] = [key]
+        if pending_only:
+            query += " AND status IS NULL"
+        if created_at is not None:
+            query += " AND created_at = ?"
+            params.append(created_at)
+        if fingerprint is not None:
+            query += " AND fingerprint = ?"
+            params.append(fingerprint)
+        async with self._connect("release_idempotency_key") as db:
+            cursor = await db.execute(query, params)
+            await db.commit()
+        return cursor.rowcount > 0
+
+    async def cleanup_idempotency_keys(self, max_age_seconds: float) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+        async with self._connect("cleanup_idempotency_keys") as db:
+            cursor = await db.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < ?",
+                (cutoff.isoformat(timespec="seconds"),),
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    async def add_funnel_stats(self, rows: Sequence[Tuple[str, str, str, float]]) -> None:
+        # one statement per flush: counters for the same hour and step are summed in place
+        async with self._connect("add_funnel_stats") as db:
+            await db.executemany(
+                """
+                INSERT INTO funnel_stats(period_start, step, metric, value) VALUES(?, ?, ?, ?)
+                ON CONFLICT(period_start, step, metric) DO UPDATE SET value = value + excluded.value
+                """,
+                rows,
+            )
+            await db.commit()
+
+    async def get_funnel_stats(self, since: Optional[str] = None, until: Optional[str] = None) -> List[tuple]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if since is not None:
+            clauses.append("period_start >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("period_start < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        async with self._connect("get_funnel_stats") as db:
+            cursor = await db.execute(
+                f"SELECT step, metric, SUM(value) FROM funnel_stats {where} GROUP BY step, metric",
+                params,
+            )
+            return list(await cursor.fetchall())
+
+    async def compact_rollups(self, before: str) -> int:
+        # folds hourly buckets older than `before` (a day boundary) into daily ones; the triggers read the new
+        # watermark in the same transaction, so late updates to old orders go straight to the daily table
+        async with self._connect("compact_rollups") as db:
+            await db.execute(
+                """
+                INSERT INTO order_rollup_daily(bucket, dimension, value, orders, revenue)
+                SELECT substr(bucket, 1, 10) || 'T00:00:00', dimension, value, SUM(orders), SUM(revenue)
+                FROM order_rollup_hourly WHERE bucket < ? GROUP BY 1, 2, 3
+                ON CONFLICT(dimension, bucket, value) DO UPDATE SET
+                    orders = orders + excluded.orders, revenue = revenue + excluded.revenue
+                """,
+                (before,),
+            )
+            cursor = await db.execute("DELETE FROM order_rollup_hourly WHERE bucket < ?", (before,))
+            await db.execute(
+                "UPDATE order_rollup_state SET compacted_before = MAX(compacted_before, ?) WHERE id = 1", (before,)
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    async def order_timeseries(
+        self,
+        bucket: str,
+        dimension: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[tuple]:
+        # without a dimension every order is still counted once, through its status
+        period = ROLLUP_BUCKETS[bucket]
+        clauses = ["dimension = ?"]
+        params: List[Any] = [dimension or "status"]
+        if since is not None:
+            clauses.append("bucket >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("bucket < ?")
+            params.append(until)
+        where = " AND ".join(clauses)
+        value = "value" if dimension else "''"
+        async with self._connect("order_timeseries") as db:
+            cursor = await db.execute(
+                f"""
+                SELECT {period} AS period, {value} AS value, SUM(orders), SUM(revenue) FROM (
+                    SELECT bucket, value, orders, revenue FROM order_rollup_hourly WHERE {where}
+                    UNION ALL
+                    SELECT bucket, value, orders, revenue FROM order_rollup_daily WHERE {where}
+                )
+                GROUP BY 1, 2
+                HAVING SUM(orders) != 0 OR SUM(revenue) != 0
+                ORDER BY 1, 2
+                """,
+                params * 2,
+            )
+            return list(await cursor.fetchall())
+
+    async def search_orders(self, text: str, *, limit: int = 20, offset: int = 0) -> List[OrderRecord]:
+        query = build_search_query(text)
+        if query is None:
+            return []
+        # rank and paginate inside the index first, then read only the page of rows that is returned
+        async with self._connect("search_orders") as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                """
+                SELECT orders.* FROM (
+                    SELECT rowid, rank FROM (
+                        SELECT rowid, rank FROM orders_fts WHERE orders_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+                    )
+                    ORDER BY rank LIMIT ? OFFSET ?
+                ) AS hits
+                JOIN orders ON orders.order_id = hits.rowid
+                ORDER BY hits.rank
+                """,
+                (query, SEARCH_WINDOW, limit, offset),
+            )
+            rows = await cursor.fetchall()
+        return [self._row_to_order(row) for row in rows]
+
     async def find_by_payload_hash(self, user_id: int, payload_hash: str) -> Optional[OrderRecord]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("find_by_payload_hash") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM orders WHERE user_id = ? AND payload_hash = ? ORDER BY created_at DESC LIMIT 1",
@@ -418,7 +1076,7 @@ class OrdersRepository:
         return self._row_to_order(row)
 
     async def set_language(self, user_id: int, language: str) -> None:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("set_language") as db:
             await db.execute(
                 "INSERT INTO user_settings(user_id, language) VALUES (?, ?) "
                 "ON CONFLICT(user_id) DO UPDATE SET language = excluded.language",
@@ -427,7 +1085,7 @@ class OrdersRepository:
             await db.commit()
 
     async def get_language(self, user_id: int) -> Optional[str]:
-        async with aiosqlite.connect(self._db_path) as db:
+        async with self._connect("get_language") as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT language FROM user_settings WHERE user_id = ? LIMIT 1",
@@ -438,6 +1096,62 @@ class OrdersRepository:
             return None
         return row["language"]
 
+    async def get_job_cursor(self, name: str) -> int:
+        async with self._connect("get_job_cursor") as db:
+            cursor = await db.execute(
+                "SELECT cursor FROM maintenance_jobs WHERE name = ? LIMIT 1",
+                (name,),
+            )
+            row = await cursor.fetchone()
+        return int(row[0]) if row else 0
+
+    async def fetch_credentials_after(self, last_order_id: int, limit: int) -> List[tuple]:
+        async with self._connect("fetch_credentials_after") as db:
+            cursor = await db.execute(
+                """
+                SELECT order_id, login, password_enc FROM orders
+                WHERE order_id > ? AND (login IS NOT NULL OR password_enc IS NOT NULL)
+                ORDER BY order_id
+                LIMIT ?
+                """,
+                (last_order_id, limit),
+            )
+            return list(await cursor.fetchall())
+
+    async def update_credentials_batch(
+        self,
+        rows: Sequence[tuple],
+        *,
+        job_name: str,
+        job_cursor: int,
+    ) -> int:
+        # rows are (order_id, login, password_enc, expected_login, expected_password_enc); a row whose credentials
+        # changed since they were read is left alone, so a concurrent edit is never overwritten with stale values.
+        # Credentials and the job cursor commit together, so an interrupted job resumes exactly where it stopped
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        async with self._connect("update_credentials_batch") as db:
+            cursor = await db.executemany(
+                "UPDATE orders SET login = ?, password_enc = ? WHERE order_id = ? AND login IS ? AND password_enc IS ?",
+                [
+                    (login, password_enc, order_id, expected_login, expected_password)
+                    for order_id, login, password_enc, expected_login, expected_password in rows
+                ],
+            )
+            updated = max(cursor.rowcount, 0)
+            await db.execute(
+                """
+                INSERT INTO maintenance_jobs(name, cursor, processed, updated_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    cursor = excluded.cursor,
+                    processed = maintenance_jobs.processed + excluded.processed,
+                    updated_at = excluded.updated_at
+                """,
+                (job_name, job_cursor, updated, now),
+            )
+            await db.commit()
+        return updated
+
     def _row_to_order(self, row: aiosqlite.Row) -> OrderRecord:
         return OrderRecord(
             order_id=row["order_id"],
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import aiosqlite
+
+slow_query_logger = logging.getLogger("payment_qa_bot.slow_query")
+
+# the progress handler fires every PROGRESS_STEP virtual machine instructions; a slow statement that barely
+# ran any instructions spent its time in SQLite's busy handler, i.e. waiting for another writer's lock
+PROGRESS_STEP = 1000
+EXPLAIN_INTERVAL = 300.0
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w?])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint_sql(sql: str) -> str:
+    normalized = _WHITESPACE.sub(" ", sql).strip()
+    normalized = _STRING_LITERAL.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    # IN lists built from a variable number of placeholders collapse into one fingerprint
+    return _IN_LIST.sub("(?+)", normalized)
+
+
+class StepCountingConnection(sqlite3.Connection):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.vm_steps = 0
+        self.set_progress_handler(self._step, PROGRESS_STEP)
+
+    def _step(self) -> int:
+        self.vm_steps += 1
+        return 0
+
+
+def _vm_steps(db: aiosqlite.Connection) -> int:
+    return getattr(getattr(db, "_conn", None), "vm_steps", 0)
+
+
+@dataclass(slots=True)
+class QueryStats:
+    fingerprint: str
+    query_id: str
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    lock_waits: int = 0
+    slow_calls: int = 0
+    params: int = 0
+    methods: Dict[str, int] = field(default_factory=dict)
+    plan: Optional[List[str]] = None
+    explained_at: float = float("-inf")
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("explained_at")
+        data["total_ms"] = round(data.pop("total_seconds") * 1000, 3)
+        data["max_ms"] = round(data.pop("max_seconds") * 1000, 3)
+        data["avg_ms"] = round(data["total_ms"] / self.calls, 3) if self.calls else 0.0
+        return data
+
+
+class QueryProfiler:
+    def __init__(self, *, slow_threshold: float = 0.2, max_fingerprints: int = 512) -> None:
+        self.slow_threshold = slow_threshold
+        self._max_fingerprints = max_fingerprints
+        self._stats: Dict[str, QueryStats] = {}
+        self._fingerprints: Dict[str, str] = {}
+
+    def _entry(self, sql: str) -> QueryStats:
+        fingerprint = self._fingerprints.get(sql)
+        if fingerprint is None:
+            # the repository only ever sends a few dozen distinct strings, so normalizing once per string is enough
+            fingerprint = fingerprint_sql(sql)
+            if len(self._fingerprints) < self._max_fingerprints * 4:
+                self._fingerprints[sql] = fingerprint
+        entry = self._stats.get(fingerprint)
+        if entry is None:
+            if len(self._stats) >= self._max_fingerprints:
+                fingerprint = "(other)"
+                entry = self._stats.get(fingerprint)
+            if entry is None:
+                query_id = hashlib.blake2s(fingerprint.encode("utf-8"), digest_size=4).hexdigest()
+                entry = self._stats[fingerprint] = QueryStats(fingerprint, query_id)
+        return entry
+
+    def record(
+        self,
+        method: str,
+        sql: str,
+        params: int,
+        duration: float,
+        rows: int,
+        waited: bool,
+    ) -> Optional[QueryStats]:
+        entry = self._entry(sql)
+        entry.calls += 1
+        entry.total_seconds += duration
+        entry.max_seconds = max(entry.max_seconds, duration)
+        entry.rows += rows
+        entry.params = params
+        entry.methods[method] = entry.methods.get(method, 0) + 1
+        if waited:
+            entry.lock_waits += 1
+        if self.slow_threshold <= 0 or duration < self.slow_threshold:
+            return None
+        entry.slow_calls += 1
+        return entry
+
+    def add_rows(self, sql: str, rows: int, duration: float) -> None:
+        entry = self._entry(sql)
+        entry.rows += rows
+        entry.total_seconds += duration
+
+    def log_slow(self, entry: QueryStats, method: str, duration: float, rows: int, params: int, waited: bool) -> None:
+        event = {
+            "query_id": entry.query_id,
+            "method": method,
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "params": params,
+            "lock_wait": waited,
+            "fingerprint": entry.fingerprint,
+            "plan": entry.plan,
+        }
+        slow_query_logger.warning(
+            "slow query %s in %s: %.1f ms%s",
+            entry.query_id,
+            method,
+            duration * 1000,
+            " (waited on lock)" if waited else "",
+            extra={"slow_query": event},
+        )
+
+    def needs_plan(self, entry: QueryStats) -> bool:
+        now = time.monotonic()
+        if now - entry.explained_at < EXPLAIN_INTERVAL:
+            return False
+        entry.explained_at = now
+        return entry.fingerprint.lstrip("( ").upper().startswith(EXPLAINABLE)
+
+    def top(self, limit: int = 20, *, order_by: str = "total_seconds") -> List[Dict[str, Any]]:
+        entries = sorted(self._stats.values(), key=lambda entry: getattr(entry, order_by), reverse=True)
+        return [entry.as_dict() for entry in entries[:limit]]
+
+    def reset(self) -> None:
+        self._stats.clear()
+
+
+class CallStats:
+    __slots__ = ("method", "rows")
+
+    def __init__(self, method: str) -> None:
+        self.method = method
+        self.rows = 0
+
+
+class ProfiledCursor:
+    __slots__ = ("_cursor", "_stats", "_profiler", "_sql")
+
+    def __init__(
+        self,
+        cursor: aiosqlite.Cursor,
+        stats: CallStats,
+        profiler: Optional[QueryProfiler] = None,
+        sql: str = "",
+    ) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._profiler = profiler
+        self._sql = sql
+
+    def _fetched(self, rows: int, started: float) -> None:
+        self._stats.rows += rows
+        if self._profiler is not None:
+            # rows of a SELECT arrive here, after execute() was already recorded
+            self._profiler.add_rows(self._sql, rows, time.perf_counter() - started)
+
+    async def fetchone(self) -> Optional[Any]:
+        started = time.perf_counter()
+        row = await self._cursor.fetchone()
+        self._fetched(0 if row is None else 1, started)
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None) -> Iterable[Any]:
+        started = time.perf_counter()
+        rows = await self._cursor.fetchmany(size)
+        self._fetched(len(rows), started)
+        return rows
+
+    async def fetchall(self) -> Iterable[Any]:
+        started = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        self._fetched(len(rows), started)
+        return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection:
+    # a thin proxy: only the calls the repository makes are wrapped, everything else goes straight through
+    __slots__ = ("_db", "_stats", "_profiler")
+
+    def __init__(self, db: aiosqlite.Connection, stats: CallStats, profiler: Optional[QueryProfiler] = None) -> None:
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_stats", stats)
+        object.__setattr__(self, "_profiler", profiler)
+
+    async def _profiled(self, sql: str, parameters: Sequence[Any], run: Any, rows_of: Any) -> Any:
+        profiler = self._profiler
+        if profiler is None:
+            result = await run()
+            self._stats.rows += rows_of(result)
+            return result
+        steps = _vm_steps(self._db)
+        started = time.perf_counter()
+        result = await run()
+        duration = time.perf_counter() - started
+        rows = rows_of(result)
+        self._stats.rows += rows
+        params = len(parameters) if isinstance(parameters, (list, tuple, dict)) else 0
+        waited = duration >= profiler.slow_threshold > 0 and _vm_steps(self._db) == steps
+        slow = profiler.record(self._stats.method, sql, params, duration, rows, waited)
+        if slow is not None:
+            if profiler.needs_plan(slow):
+                slow.plan = await self._explain(sql, parameters)
+            profiler.log_slow(slow, self._stats.method, duration, rows, params, waited)
+        return result
+
+    async def _explain(self, sql: str, parameters: Sequence[Any]) -> Optional[List[str]]:
+        try:
+            plan = await self._db.execute_fetchall(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        except Exception:  # noqa: BLE001 - a plan is a nice-to-have, the query itself already succeeded
+            return None
+        return [str(row[-1]) for row in plan]
+
+    async def execute(self, sql: str, parameters: Sequence[Any] = ()) -> ProfiledCursor:
+        cursor = await self._profiled(
+            sql, parameters, lambda: self._db.execute(sql, parameters), lambda cursor: max(cursor.rowcount, 0)
+        )
+        return ProfiledCursor(cursor, self._stats, self._profiler, sql)
+
+    async def executemany(self, sql: str, parameters: Iterable[Sequence[Any]]) -> ProfiledCursor:
+        batch = list(parameters)
+        # the first row stands in for the batch, so params counts placeholders and EXPLAIN gets real values
+        cursor = await self._profiled(
+            sql,
+            batch[0] if batch else (),
+            lambda: self._db.executemany(sql, batch),
+            lambda cursor: max(cursor.rowcount, 0),
+        )
+        return ProfiledCursor(cursor, self._stats, self._profiler, sql)
+
+    async def execute_fetchall(self, sql: str, parameters: Sequence[Any] = ()) -> List[Any]:
+        return await self._profiled(
+            sql, parameters, lambda: self._list(self._db.execute_fetchall(sql, parameters)), len
+        )
+
+    @staticmethod
+    async def _list(rows: Any) -> List[Any]:
+        return list(await rows)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._db, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # row_factory is assigned per call
+        setattr(self._db, name, value)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
 from payment_qa_bot.config import Config
@@ -9,6 +9,8 @@ from payment_qa_bot.models.db import OrdersRepository
 from payment_qa_bot.services.geo import format_country
 from payment_qa_bot.texts.catalog import TEXTS
 
+FIND_LIMIT = 10
+
 
 def get_admin_router(config: Config, repo: OrdersRepository) -> Router:
     router = Router()
@@ -69,4 +71,22 @@ def get_admin_router(config: Config, repo: OrdersRepository) -> Router:
             return
         await message.answer("\n\n".join(render_order_line(order) for order in orders))
 
+    @router.message(Command("find"))
+    async def find(message: Message, command: CommandObject) -> None:
+        if not is_admin(message.from_user.id):
+            await message.answer("Access denied")
+            return
+        text = (command.args or "").strip()
+        if not text:
+            await message.answer(TEXTS.get("admin.find.usage", "en"))
+            return
+        orders = await repo.search_orders(text, limit=FIND_LIMIT + 1)
+        if not orders:
+            await message.answer(TEXTS.get("admin.no.orders", "en"))
+            return
+        lines = [render_order_line(order) for order in orders[:FIND_LIMIT]]
+        if len(orders) > FIND_LIMIT:
+            lines.append(TEXTS.get("admin.find.more", "en", limit=FIND_LIMIT))
+        await message.answer("\n\n".join(lines))
+
     return router
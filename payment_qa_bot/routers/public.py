@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import hashlib
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from aiogram import Bot, F, Router
 from aiogram.filters import Command, CommandStart
@@ -20,11 +21,17 @@ from payment_qa_bot.keyboards.geo import geo_keyboard
 from payment_qa_bot.keyboards.options import methods_keyboard, payout_keyboard
 from payment_qa_bot.keyboards.tests import tests_keyboard
 from payment_qa_bot.models.db import OrderCreate, OrdersRepository
+from payment_qa_bot.services.diagnostics import register_size_probe
+from payment_qa_bot.services.funnel import FunnelTracker
 from payment_qa_bot.services.geo import format_country
+from payment_qa_bot.services.group_guard import IGNORE, LEAVE, GroupFloodGuard
+from payment_qa_bot.services.metrics import BOT_HANDLER_SECONDS
+from payment_qa_bot.services.notifications import AdminNotifier
 from payment_qa_bot.services.payment_methods import get_methods_for_geo
 from payment_qa_bot.services.payload import PayloadData, PayloadParseResult, SignatureMismatchError, parse_payload
 from payment_qa_bot.services.pricing import calculate_price
 from payment_qa_bot.services.security import CredentialEncryptor, mask_secret
+from payment_qa_bot.services.tracing import TRACER
 from payment_qa_bot.states.order import OrderStates
 from payment_qa_bot.texts.catalog import TEXTS
 
@@ -55,8 +62,18 @@ def get_public_router(
     config: Config,
     repo: OrdersRepository,
     encryptor: CredentialEncryptor,
+    notifier: AdminNotifier,
+    group_guard: Optional[GroupFloodGuard] = None,
+    funnel: Optional[FunnelTracker] = None,
 ) -> Router:
     router = Router()
+    if group_guard is None:
+        group_guard = GroupFloodGuard(
+            config.group_redirect_cooldown,
+            leave_threshold=config.group_leave_threshold,
+            leave_window=config.group_leave_window,
+        )
+    register_size_probe("group_guard_chats", lambda: group_guard.tracked_chats)
     group_router = Router(name="public-groups")
     group_router.message.filter(F.chat.type != "private")
     private_router = Router(name="public-private")
@@ -64,6 +81,37 @@ def get_public_router(
     router.include_router(group_router)
     router.include_router(private_router)
 
+    @private_router.message.middleware()
+    async def handler_timing(
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        # raw_state is the state the update arrived in, e.g. "OrderStates:GEO"
+        state_label = data.get("raw_state") or "none"
+        started = time.perf_counter()
+        try:
+            with TRACER.span("handler", state=state_label):
+                return await handler(event, data)
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, state_label)
+
+    if funnel is not None:
+
+        @private_router.message.middleware()
+        async def funnel_tracking(
+            handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+            event: Message,
+            data: Dict[str, Any],
+        ) -> Any:
+            try:
+                return await handler(event, data)
+            finally:
+                fsm: Optional[FSMContext] = data.get("state")
+                if fsm is not None and event.from_user is not None:
+                    # the state the handler left behind; an in-memory read, the counters are flushed separately
+                    funnel.observe(event.from_user.id, await fsm.get_state())
+
     async def get_language(state: FSMContext, user_id: int) -> str:
         data = await state.get_data()
         lang = data.get("lang")
@@ -347,7 +395,8 @@ def get_public_router(
         }
 
     async def build_private_message(bot: Bot) -> str:
-        me = await bot.get_me()
+        # Bot.me() caches getMe after the first call (warmed up at startup in app.py)
+        me = await bot.me()
         username = me.username or ""
         if username:
             return f"{GROUP_REDIRECT_TEXT} https://t.me/{username}"
@@ -360,10 +409,20 @@ def get_public_router(
         if not (event.new_chat_member.is_member() or event.new_chat_member.is_administrator()):
             return
         text = await build_private_message(event.bot)
+        group_guard.mark_redirected(event.chat.id)
         await event.bot.send_message(event.chat.id, text, disable_web_page_preview=True)
 
     @group_router.message()
     async def ignore_groups(message: Message) -> None:
+        verdict = group_guard.on_message(message.chat.id)
+        if verdict == IGNORE:
+            return
+        if verdict == LEAVE:
+            try:
+                await message.bot.leave_chat(message.chat.id)
+            except Exception:  # noqa: BLE001 - already removed or lacking rights, nothing else to do
+                pass
+            return
         text = await build_private_message(message.bot)
         await message.answer(text, disable_web_page_preview=True)
 
@@ -402,7 +461,8 @@ def get_public_router(
         if payload_value:
             reference_token = None
             try:
-                parsed: PayloadParseResult = parse_payload(payload_value, config.payload_secret)
+                with TRACER.span("payload.parse", length=len(payload_value)):
+                    parsed: PayloadParseResult = parse_payload(payload_value, config.payload_secret)
             except SignatureMismatchError:
                 parsed = PayloadParseResult(ok=False, data=PayloadData(source="tg"), error="invalid_signature")
             if not parsed.ok and parsed.data.reference_token:
@@ -775,16 +835,22 @@ def get_public_router(
             **updates,
         )
         await state.update_data(order_id=order_id)
-        await notify_admins(
-            message.bot,
+        username = message.from_user.username or message.from_user.id
+        geo_label = format_country(draft.get("geo", ""))
+        notifier.order_created(
+            order_id,
+            username,
+            geo_label,
+            total,
             TEXTS.get(
                 "admin.notify.new",
                 lang,
                 order_id=order_id,
-                username=message.from_user.username or message.from_user.id,
-                geo=format_country(draft.get("geo", "")),
+                username=username,
+                geo=geo_label,
                 total=total,
             ),
+            language=lang,
         )
         await message.answer(
             TEXTS.get("order.accepted", lang, order_id=order_id, total=total),
@@ -792,15 +858,6 @@ def get_public_router(
         )
         await show_payment(message, state, lang)
 
-    async def notify_admins(bot: Bot, text: str) -> None:
-        if not config.admin_ids:
-            return
-        for admin_id in config.admin_ids:
-            try:
-                await bot.send_message(admin_id, text)
-            except Exception:  # noqa: BLE001 - notification errors should not break user flow
-                continue
-
     @private_router.message(OrderStates.PAYMENT)
     async def payment_step(message: Message, state: FSMContext) -> None:
         lang = await get_language(state, message.from_user.id)
@@ -861,8 +918,12 @@ def get_public_router(
         if txid:
             update_fields["payment_txid"] = txid
         await repo.update_order(order_id, **update_fields)
-        await notify_admins(message.bot, TEXTS.get("admin.notify.payment", lang, order_id=order_id))
+        notifier.payment_received(
+            order_id, TEXTS.get("admin.notify.payment", lang, order_id=order_id), language=lang
+        )
         await message.answer(TEXTS.get("payment.thanks", lang), reply_markup=ReplyKeyboardRemove())
+        if funnel is not None:
+            funnel.complete(message.from_user.id)
         await state.clear()
 
     return router
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import asdict
+
+from payment_qa_bot.models.db import OrderRecord, OrdersRepository
+from payment_qa_bot.services.events import REMOVED, UPDATED
+
+logger = logging.getLogger(__name__)
+
+
+async def relay_changes(
+    repo: OrdersRepository,
+    *,
+    interval: float,
+    limit: int = 500,
+    remember: int = 4096,
+) -> None:
+    # the bot and the API may live in different processes; this tails the change cursor so the API's
+    # event hub also sees writes it did not make itself. Writes made here are echoed once more, which
+    # clients absorb since deltas are idempotent; updated_at is too coarse to tell them apart safely.
+    hub = repo.events
+    cursor = await repo.latest_change_cursor()
+    hub.position = cursor
+    relayed: "OrderedDict[int, OrderRecord]" = OrderedDict()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            changes = await repo.changes_since(cursor, limit=limit)
+        except Exception:  # noqa: BLE001 - keep tailing after transient database errors
+            logger.exception("Failed to poll order changes")
+            continue
+        for order in changes.orders:
+            # rows inside the settle window come back on the next poll; only publish real differences
+            if relayed.get(order.order_id) == order:
+                continue
+            relayed[order.order_id] = order
+            relayed.move_to_end(order.order_id)
+            if len(relayed) > remember:
+                relayed.popitem(last=False)
+            hub.publish(UPDATED, order.order_id, asdict(order))
+        for tombstone in changes.tombstones:
+            relayed.pop(tombstone.order_id, None)
+            hub.publish(REMOVED, tombstone.order_id, {"reason": tombstone.reason})
+        cursor = changes.cursor
+        # events above carry the previous position, so resuming from any of them replays this whole batch
+        hub.position = cursor
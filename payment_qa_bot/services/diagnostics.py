@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, deque
+from types import FrameType
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from payment_qa_bot.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LAG_WINDOW = 2048
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Extra delay before a scheduled event loop callback ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    # keep the package-relative part of the path: payment_qa_bot/routers/public.py rather than the full path
+    parts = path.replace(os.sep, "/").split("/")
+    short = "/".join(parts[-3:]) if "payment_qa_bot" in parts else "/".join(parts[-2:])
+    return f"{short}:{code.co_name}"
+
+
+def _stack_labels(frame: Optional[FrameType]) -> List[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 6)
+
+
+class LoopLagMonitor:
+    def __init__(self, *, interval: float = 0.1, threshold: float = 0.5, stack_limit: int = 30) -> None:
+        self._interval = interval
+        self._threshold = threshold
+        self._stack_limit = stack_limit
+        self._lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._task: Optional[asyncio.Task[None]] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def loop_thread_id(self) -> Optional[int]:
+        return self._loop_thread_id
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop-lag-monitor")
+        # the loop cannot report on itself while it is blocked, so a thread looks at its stack instead
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(self._interval * 2)
+            self._watchdog = None
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, loop.time() - scheduled - self._interval)
+            self._last_beat = time.monotonic()
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self._interval):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat
+            if blocked < self._threshold or beat == reported_beat:
+                continue
+            # one report per stall: the beat does not move until the loop gets control back
+            reported_beat = beat
+            self._report_stall(blocked)
+
+    def _report_stall(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id) if self._loop_thread_id else None
+        stack = traceback.format_stack(frame, limit=self._stack_limit) if frame is not None else []
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        self.stalls += 1
+        self.last_stall = {
+            "blocked_seconds": round(blocked, 3),
+            "task": task.get_name() if task is not None else None,
+            "at": time.time(),
+            "stack": [line.rstrip() for line in stack],
+        }
+        logger.warning(
+            "Event loop blocked for %.0f ms in task %s:\n%s",
+            blocked * 1000,
+            self.last_stall["task"],
+            "".join(stack),
+            extra={"loop_stall": self.last_stall},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._lags)
+        return {
+            "running": self.running,
+            "interval_ms": self._interval * 1000,
+            "threshold_ms": self._threshold * 1000,
+            "samples": len(ordered),
+            "lag_p50": _percentile(ordered, 0.5),
+            "lag_p95": _percentile(ordered, 0.95),
+            "lag_p99": _percentile(ordered, 0.99),
+            "lag_max": round(self.max_lag, 6),
+            "stalls": self.stalls,
+            "last_stall": self.last_stall,
+        }
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    # runs on a worker thread: sys._current_frames() is a cheap snapshot, the profiled thread is never paused
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    own = threading.get_ident()
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None and thread_id != own:
+            stacks[";".join(_stack_labels(frame))] += 1
+        time.sleep(interval)
+    return dict(stacks)
+
+
+def collapse_stacks(stacks: Dict[str, int]) -> str:
+    # Brendan Gregg's collapsed format: "frame;frame;frame count", one stack per line
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+def dump_tasks(*, stack_limit: int = 8) -> List[Dict[str, Any]]:
+    current = asyncio.current_task()
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        frames = task.get_stack(limit=stack_limit)
+        tasks.append(
+            {
+                "name": task.get_name(),
+                "coro": getattr(coro, "__qualname__", repr(coro)),
+                "current": task is current,
+                "done": task.done(),
+                "stack": [f"{_frame_label(frame)}:{frame.f_lineno}" for frame in frames],
+            }
+        )
+    tasks.sort(key=lambda item: item["name"])
+    return tasks
+
+
+SIZE_PROBES: Dict[str, Callable[[], int]] = {}
+STRUCTURE_SIZES = REGISTRY.gauge(
+    "process_structure_entries",
+    "Entries held by long-lived in-process structures",
+    ("structure",),
+    callback=lambda: {(name,): float(size) for name, size in structure_sizes().items()},
+)
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTSIDE_PACKAGE = "(outside payment_qa_bot)"
+
+
+def register_size_probe(name: str, probe: Callable[[], int]) -> None:
+    # the latest registration wins, like metric callbacks
+    SIZE_PROBES[name] = probe
+
+
+def structure_sizes() -> Dict[str, int]:
+    sizes = {}
+    for name, probe in SIZE_PROBES.items():
+        try:
+            sizes[name] = int(probe())
+        except Exception:  # noqa: BLE001 - a probe on a torn-down object must not break the report
+            continue
+    return sizes
+
+
+def _proc_status() -> Dict[str, int]:
+    values = {}
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "VmSize"):
+                    values[key] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+def process_memory() -> Dict[str, Any]:
+    status = _proc_status()
+    rss = status.get("VmRSS")
+    peak = status.get("VmHWM")
+    if peak is None:
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS; this branch only runs where /proc is missing
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024
+    return {
+        "rss_bytes": rss,
+        "peak_rss_bytes": peak,
+        "virtual_bytes": status.get("VmSize"),
+        "gc_counts": list(gc.get_count()),
+        "gc_thresholds": list(gc.get_threshold()),
+        "gc_generations": gc.get_stats(),
+        "gc_tracked_objects": len(gc.get_objects()),
+    }
+
+
+def top_object_types(limit: int = 25) -> List[Dict[str, Any]]:
+    counts: Counter[str] = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+    return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+def _package_line(trace: tracemalloc.Traceback) -> Optional[str]:
+    # tracebacks are stored most recent call first; the first package frame is the code that asked for memory,
+    # even when the allocation itself happened inside aiogram or the stdlib
+    for frame in trace:
+        if frame.filename.startswith(PACKAGE_DIR):
+            return f"{os.path.relpath(frame.filename, os.path.dirname(PACKAGE_DIR))}:{frame.lineno}"
+    return None
+
+
+def _group_by_package_line(snapshot: tracemalloc.Snapshot) -> Dict[str, List[int]]:
+    grouped: Dict[str, List[int]] = {}
+    for stat in snapshot.statistics("traceback"):
+        key = _package_line(stat.traceback) or OUTSIDE_PACKAGE
+        entry = grouped.setdefault(key, [0, 0])
+        entry[0] += stat.size
+        entry[1] += stat.count
+    return grouped
+
+
+class AllocationTracker:
+    def __init__(self) -> None:
+        self._baseline: Optional[Dict[str, List[int]]] = None
+        self._baseline_at: Optional[float] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 16) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.reset()
+
+    def reset(self) -> Dict[str, Any]:
+        self._baseline = _group_by_package_line(tracemalloc.take_snapshot())
+        self._baseline_at = time.time()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        tracemalloc.stop()
+        self._baseline = None
+        self._baseline_at = None
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "baseline_at": self._baseline_at,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+        }
+
+    def diff(self, limit: int = 25) -> Dict[str, Any]:
+        if not self.tracing or self._baseline is None:
+            return {"lines": [], "outside": None}
+        current = _group_by_package_line(tracemalloc.take_snapshot())
+        rows = []
+        for key in current.keys() | self._baseline.keys():
+            size, count = current.get(key, (0, 0))
+            old_size, old_count = self._baseline.get(key, (0, 0))
+            if size == old_size and count == old_count:
+                continue
+            rows.append(
+                {
+                    "line": key,
+                    "size_bytes": size,
+                    "size_diff_bytes": size - old_size,
+                    "count": count,
+                    "count_diff": count - old_count,
+                }
+            )
+        rows.sort(key=lambda row: abs(row["size_diff_bytes"]), reverse=True)
+        outside = next((row for row in rows if row["line"] == OUTSIDE_PACKAGE), None)
+        return {"lines": [row for row in rows if row is not outside][:limit], "outside": outside}
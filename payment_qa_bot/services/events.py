@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set
+
+if TYPE_CHECKING:
+    from payment_qa_bot.models.db import ChangeCursor
+
+CREATED = "created"
+UPDATED = "updated"
+REMOVED = "removed"
+
+
+@dataclass(slots=True)
+class OrderEvent:
+    seq: int
+    kind: str
+    order_id: int
+    changes: Dict[str, Any]
+    # replaying changes_since() from here delivers this event again along with everything after it
+    cursor: Optional["ChangeCursor"] = None
+    frame: Optional[bytes] = field(default=None, repr=False)
+
+
+class Subscription:
+    def __init__(self, hub: "OrderEventHub", max_queue: int) -> None:
+        self._hub = hub
+        self._queue: "asyncio.Queue[Optional[OrderEvent]]" = asyncio.Queue(maxsize=max_queue)
+        self.lagged = False
+        self.closed = False
+
+    def _push(self, event: OrderEvent) -> bool:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the client stops here and replays the rest from the database on reconnect
+            self.lagged = True
+            return False
+        return True
+
+    @property
+    def finished(self) -> bool:
+        return self._queue.empty() and (self.lagged or self.closed)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[OrderEvent]:
+        # None means "nothing within timeout" (or closed); callers check ``finished`` afterwards
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self.finished:
+            return None
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._hub._subscribers.discard(self)
+        if not self._queue.full():
+            # wakes a reader blocked in get(); a full queue means the reader is not blocked
+            self._queue.put_nowait(None)
+
+
+class OrderEventHub:
+    def __init__(self, *, max_queue: int = 256) -> None:
+        self._seq = 0
+        self._max_queue = max_queue
+        self._subscribers: Set[Subscription] = set()
+        # the change cursor the hub has published everything up to; whoever tails the database advances it
+        self.position: Optional["ChangeCursor"] = None
+        self.published = 0
+        self.lagged = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, kind: str, order_id: int, changes: Dict[str, Any]) -> OrderEvent:
+        self._seq += 1
+        event = OrderEvent(self._seq, kind, order_id, changes, self.position)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            if not subscription._push(event):
+                self._subscribers.discard(subscription)
+                self.lagged += 1
+        return event
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self._max_queue)
+        self._subscribers.add(subscription)
+        return subscription
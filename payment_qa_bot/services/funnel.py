@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.states.order import OrderStates
+
+logger = logging.getLogger(__name__)
+
+FUNNEL_STEPS: Tuple[str, ...] = tuple(state.state.split(":", 1)[1] for state in OrderStates.__all_states__)
+STEP_INDEX = {step: index for index, step in enumerate(FUNNEL_STEPS)}
+STATE_PREFIX = OrderStates.__full_group_name__ + ":"
+DWELL_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0)
+DWELL_METRICS = tuple(f"dwell_le_{bound:g}" for bound in DWELL_BUCKETS) + ("dwell_le_inf",)
+COUNTERS = ("entered", "exited", "back", "abandoned", "completed", "dwell_seconds", "dwell_count")
+
+FunnelRow = Tuple[str, str, str, float]
+
+
+def step_of(raw_state: Optional[str]) -> Optional[str]:
+    if raw_state is None or not raw_state.startswith(STATE_PREFIX):
+        return None
+    step = raw_state[len(STATE_PREFIX):]
+    return step if step in STEP_INDEX else None
+
+
+@dataclass(slots=True)
+class StepCounters:
+    entered: int = 0
+    exited: int = 0
+    back: int = 0
+    abandoned: int = 0
+    completed: int = 0
+    dwell_seconds: float = 0.0
+    dwell_count: int = 0
+    dwell_buckets: List[int] = field(default_factory=lambda: [0] * len(DWELL_METRICS))
+
+    def observe_dwell(self, seconds: float) -> None:
+        self.dwell_seconds += seconds
+        self.dwell_count += 1
+        self.dwell_buckets[bisect_left(DWELL_BUCKETS, seconds)] += 1
+
+    def merge(self, other: "StepCounters") -> None:
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.dwell_buckets = [mine + theirs for mine, theirs in zip(self.dwell_buckets, other.dwell_buckets)]
+
+    def rows(self, period: str, step: str) -> List[FunnelRow]:
+        values = [(name, getattr(self, name)) for name in COUNTERS]
+        values.extend(zip(DWELL_METRICS, self.dwell_buckets))
+        return [(period, step, name, float(value)) for name, value in values if value]
+
+
+def _period_start(moment: float) -> str:
+    hour = datetime.fromtimestamp(moment, timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    return hour.isoformat(timespec="seconds")
+
+
+class FunnelTracker:
+    def __init__(
+        self,
+        *,
+        idle_timeout: float = 1800.0,
+        flush_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._idle_timeout = idle_timeout
+        self._flush_interval = flush_interval
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._pending: Dict[str, StepCounters] = {}
+        self._active: Dict[int, Tuple[str, float]] = {}
+        self._task: Optional[asyncio.Task[None]] = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @property
+    def active_users(self) -> int:
+        return len(self._active)
+
+    def _counters(self, step: str) -> StepCounters:
+        counters = self._pending.get(step)
+        if counters is None:
+            counters = self._pending[step] = StepCounters()
+        return counters
+
+    def observe(self, user_id: int, raw_state: Optional[str]) -> None:
+        # called after every private message with the state the handler left behind; plain dict work, no I/O
+        step = step_of(raw_state)
+        current = self._active.get(user_id)
+        if current is not None and current[0] == step:
+            return
+        now = self._clock()
+        if current is not None:
+            previous, entered_at = current
+            counters = self._counters(previous)
+            if step is None:
+                counters.abandoned += 1
+            elif STEP_INDEX[step] < STEP_INDEX[previous]:
+                counters.back += 1
+            else:
+                counters.exited += 1
+                counters.observe_dwell(now - entered_at)
+        if step is None:
+            self._active.pop(user_id, None)
+            return
+        self._active[user_id] = (step, now)
+        self._counters(step).entered += 1
+
+    def complete(self, user_id: int) -> None:
+        current = self._active.pop(user_id, None)
+        if current is None:
+            return
+        step, entered_at = current
+        counters = self._counters(step)
+        counters.exited += 1
+        counters.completed += 1
+        counters.observe_dwell(self._clock() - entered_at)
+
+    def _expire_idle(self) -> None:
+        cutoff = self._clock() - self._idle_timeout
+        idle = [user_id for user_id, (_, entered_at) in self._active.items() if entered_at < cutoff]
+        for user_id in idle:
+            step, _ = self._active.pop(user_id)
+            self._counters(step).abandoned += 1
+
+    def drain(self) -> Dict[str, StepCounters]:
+        self._expire_idle()
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def flush(self, repo: OrdersRepository) -> int:
+        pending = self.drain()
+        period = _period_start(self._wall_clock())
+        rows = [row for step, counters in pending.items() for row in counters.rows(period, step)]
+        if not rows:
+            return 0
+        try:
+            await repo.add_funnel_stats(rows)
+        except Exception:  # noqa: BLE001 - counters go back into memory and ride along with the next flush
+            self.flush_errors += 1
+            for step, counters in pending.items():
+                self._counters(step).merge(counters)
+            logger.exception("Funnel flush failed, %s rows kept for the next attempt", len(rows))
+            return 0
+        self.flushes += 1
+        return len(rows)
+
+    async def _run(self, repo: OrdersRepository) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush(repo)
+
+    def start(self, repo: OrdersRepository) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(repo), name="funnel-flush")
+
+    async def stop(self, repo: OrdersRepository) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(repo)
+
+
+def summarize_funnel(rows: Sequence[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    totals: Dict[str, Dict[str, float]] = {}
+    for step, metric, value in rows:
+        totals.setdefault(step, {})[metric] = value
+    summary = []
+    for step in FUNNEL_STEPS:
+        values = totals.get(step, {})
+        entered = int(values.get("entered", 0))
+        exited = int(values.get("exited", 0))
+        dwell_count = int(values.get("dwell_count", 0))
+        buckets = [int(values.get(name, 0)) for name in DWELL_METRICS]
+        summary.append(
+            {
+                "step": step,
+                "entered": entered,
+                "exited": exited,
+                "back": int(values.get("back", 0)),
+                "abandoned": int(values.get("abandoned", 0)),
+                "completed": int(values.get("completed", 0)),
+                "conversion": round(exited / entered, 4) if entered else None,
+                "dwell": {
+                    "count": dwell_count,
+                    "avg_seconds": round(values.get("dwell_seconds", 0.0) / dwell_count, 3) if dwell_count else None,
+                    "p50_seconds": _bucket_quantile(buckets, 0.5),
+                    "p90_seconds": _bucket_quantile(buckets, 0.9),
+                    "buckets": [
+                        {"le": bound, "count": count} for bound, count in zip((*DWELL_BUCKETS, None), buckets)
+                    ],
+                },
+            }
+        )
+    return summary
+
+
+def _bucket_quantile(buckets: List[int], fraction: float) -> Optional[float]:
+    # the upper bound of the bucket holding the quantile; None when it falls into the open-ended bucket
+    total = sum(buckets)
+    if not total:
+        return None
+    running = 0
+    for bound, count in zip(DWELL_BUCKETS, buckets):
+        running += count
+        if running >= total * fraction:
+            return bound
+    return None
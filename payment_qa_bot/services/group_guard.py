@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable
+
+REDIRECT = "redirect"
+IGNORE = "ignore"
+LEAVE = "leave"
+
+
+class _ChatEntry:
+    __slots__ = ("last_redirect", "window_start", "messages")
+
+    def __init__(self, window_start: float) -> None:
+        self.last_redirect = float("-inf")
+        self.window_start = window_start
+        self.messages = 0
+
+
+class GroupFloodGuard:
+    def __init__(
+        self,
+        cooldown: float,
+        *,
+        leave_threshold: int = 0,
+        leave_window: float = 600.0,
+        max_chats: int = 5000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._cooldown = cooldown
+        self._leave_threshold = leave_threshold
+        self._leave_window = leave_window
+        self._max_chats = max_chats
+        self._clock = clock
+        self._chats: "OrderedDict[int, _ChatEntry]" = OrderedDict()
+        self.redirects = 0
+        self.ignored = 0
+        self.left = 0
+
+    @property
+    def tracked_chats(self) -> int:
+        return len(self._chats)
+
+    def _entry(self, chat_id: int, now: float) -> _ChatEntry:
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            entry = _ChatEntry(now)
+            self._chats[chat_id] = entry
+            if len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return entry
+
+    def on_message(self, chat_id: int) -> str:
+        now = self._clock()
+        entry = self._entry(chat_id, now)
+        if now - entry.window_start >= self._leave_window:
+            entry.window_start = now
+            entry.messages = 0
+        entry.messages += 1
+        if self._leave_threshold > 0 and entry.messages > self._leave_threshold:
+            self._chats.pop(chat_id, None)
+            self.left += 1
+            return LEAVE
+        if now - entry.last_redirect >= self._cooldown:
+            entry.last_redirect = now
+            self.redirects += 1
+            return REDIRECT
+        self.ignored += 1
+        return IGNORE
+
+    def mark_redirected(self, chat_id: int) -> None:
+        now = self._clock()
+        self._entry(chat_id, now).last_redirect = now
+        self.redirects += 1
+
+    def __len__(self) -> int:
+        return len(self._chats)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.security import CredentialEncryptor
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "reencrypt_credentials"
+
+
+@dataclass(slots=True)
+class RotationReport:
+    job_name: str
+    scanned: int = 0
+    rewritten: int = 0
+    up_to_date: int = 0
+    skipped: int = 0
+    unreadable: int = 0
+    cursor: int = 0
+
+
+def job_name_for(encryptor: CredentialEncryptor) -> str:
+    # keyed by the primary key so that adding a new key starts a fresh pass instead of resuming a finished one
+    return f"{JOB_PREFIX}:{encryptor.key_id}"
+
+
+async def reencrypt_credentials(
+    repo: OrdersRepository,
+    encryptor: CredentialEncryptor,
+    *,
+    chunk_size: int = 500,
+    pause: float = 0.05,
+) -> RotationReport:
+    report = RotationReport(job_name=job_name_for(encryptor))
+    if not encryptor.enabled:
+        return report
+    report.cursor = await repo.get_job_cursor(report.job_name)
+    while True:
+        rows = await repo.fetch_credentials_after(report.cursor, chunk_size)
+        if not rows:
+            break
+        logins = await encryptor.rotate_many([row[1] for row in rows])
+        passwords = await encryptor.rotate_many([row[2] for row in rows])
+        updates: List[Tuple[int, Optional[str], Optional[str], Optional[str], Optional[str]]] = []
+        for (order_id, login, password_enc), new_login, new_password in zip(rows, logins, passwords):
+            if (login and new_login is None) or (password_enc and new_password is None):
+                # not decryptable with any configured key: leave the row untouched
+                report.unreadable += 1
+                continue
+            if new_login != login or new_password != password_enc:
+                updates.append((order_id, new_login, new_password, login, password_enc))
+            else:
+                report.up_to_date += 1
+        report.scanned += len(rows)
+        report.cursor = rows[-1][0]
+        updated = await repo.update_credentials_batch(updates, job_name=report.job_name, job_cursor=report.cursor)
+        # rows edited between the read and the write keep the new values, which are already on the primary key
+        report.rewritten += updated
+        report.skipped += len(updates) - updated
+        # short transactions plus a pause keep the single SQLite writer available for the bot
+        await asyncio.sleep(pause)
+    logger.info(
+        "Credential re-encryption %s: scanned=%s rewritten=%s up_to_date=%s skipped=%s unreadable=%s",
+        report.job_name,
+        report.scanned,
+        report.rewritten,
+        report.up_to_date,
+        report.skipped,
+        report.unreadable,
+    )
+    return report
+
+
+async def _main() -> None:
+    from payment_qa_bot.config import load_config
+    from payment_qa_bot.services.logs import setup_logging
+
+    config = load_config(require_token=False)
+    setup_logging(config.log_level, json_output=config.log_json, debug_sample=config.log_debug_sample)
+    repo = OrdersRepository(config.db_path)
+    await repo.init()
+    with ProcessPoolExecutor() as pool:
+        encryptor = CredentialEncryptor(config.encryption_key, executor=pool)
+        report = await reencrypt_credentials(repo, encryptor, pause=0)
+    print(report)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
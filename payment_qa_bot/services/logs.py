@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import secrets
+import sys
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, TextIO
+
+TRACE_ID: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+TRACE_HEADER = "X-Request-ID"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"
+
+_TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+# attributes every LogRecord carries; anything else arrived through extra= and is kept as a JSON field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(8)
+
+
+def accept_trace_id(raw: Optional[str]) -> str:
+    # a proxy's request id is reused so both sides log the same id; anything unexpected gets a fresh one
+    if raw and _TRACE_ID_PATTERN.match(raw):
+        return raw
+    return new_trace_id()
+
+
+def trace_sampled(trace_id: str, rate: float) -> bool:
+    # deterministic per id, so debug logs and tracing spans keep the same updates
+    return zlib.crc32(trace_id.encode("utf-8")) / 0xFFFFFFFF < rate
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = TRACE_ID.get()
+        if trace_id is not None:
+            record.trace_id = trace_id
+        return True
+
+
+class DebugSampler(logging.Filter):
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        trace_id = getattr(record, "trace_id", None)
+        # decided per trace id, so a sampled update or request keeps every one of its debug lines
+        if trace_id is not None:
+            keep = trace_sampled(trace_id, self.rate)
+        else:
+            keep = random.random() < self.rate
+        if not keep:
+            self.dropped += 1
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LoopSafeQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the stock prepare() formats the whole record on the caller's thread; only the message is merged here,
+        # because its arguments may change after the call, and the traceback and JSON are left to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class LogListener(logging.handlers.QueueListener):
+    def stop(self) -> None:
+        # stopped explicitly and again from atexit; the stock stop() fails the second time
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(
+    level: str = "INFO",
+    *,
+    json_output: bool = False,
+    debug_sample: float = 1.0,
+    stream: Optional[TextIO] = None,
+) -> LogListener:
+    output = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT, defaults={"trace_id": "-"}))
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = LoopSafeQueueHandler(log_queue)
+    # handler filters run on the thread that logged, where the context variable still holds its trace id
+    handler.addFilter(TraceIdFilter())
+    handler.addFilter(DebugSampler(debug_sample))
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+        existing.close()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    listener = LogListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
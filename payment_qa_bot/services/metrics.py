@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+Labels = Tuple[str, ...]
+ValueCallback = Callable[[], Union[float, Dict[Labels, float]]]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric is only touched from the event loop thread, so plain dict and list updates are enough:
+# an observation is a bisect and two additions, with no locks and no allocation after the first sample.
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _ValueMetric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[ValueCallback] = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Labels, float] = {}
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        values = self._values
+        if self.callback is not None:
+            # callbacks read live objects at scrape time, so there is nothing to update on the hot path
+            result = self.callback()
+            values = result if isinstance(result, dict) else {(): float(result)}
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Counter(_ValueMetric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: one count per bucket plus +Inf, then the running sum
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        bounds = (*self.buckets, float("inf"))
+        for labels, series in self._series.items():
+            cumulative = 0.0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {_format_value(cumulative)}"
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(series[-1])}"
+            yield f"{self.name}_count{label_text} {_format_value(cumulative)}"
+
+
+Metric = Union[_ValueMetric, Histogram]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"metric {metric.name} already registered as {existing.kind}")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[ValueCallback] = None,
+    ) -> Counter:
+        return self._with_callback(self._register(Counter(name, documentation, labels)), callback)  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))  # type: ignore[return-value]
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        callback: Optional[ValueCallback] = None,
+    ) -> Gauge:
+        return self._with_callback(self._register(Gauge(name, documentation, labels)), callback)  # type: ignore
+
+    @staticmethod
+    def _with_callback(metric: _ValueMetric, callback: Optional[ValueCallback]) -> _ValueMetric:
+        if callback is not None:
+            # the latest owner wins, e.g. an API app recreated in the same process
+            metric.callback = callback
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception:  # noqa: BLE001 - one broken gauge callback must not hide the rest
+                continue
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = MetricsRegistry()
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Time spent per OrdersRepository call, including lock waits", ("method",)
+)
+DB_ROWS = REGISTRY.counter("db_rows_total", "Rows read or written per OrdersRepository call", ("method",))
+TELEGRAM_REQUEST_SECONDS = REGISTRY.histogram(
+    "telegram_request_duration_seconds", "Latency of outbound Telegram Bot API calls", ("method",)
+)
+TELEGRAM_ERRORS = REGISTRY.counter("telegram_request_errors_total", "Failed Telegram Bot API calls", ("method", "error"))
+BOT_HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Private chat message handler latency by FSM state", ("state",)
+)
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    "api_request_duration_seconds", "API request latency by route", ("route", "method")
+)
+API_REQUESTS = REGISTRY.counter("api_requests_total", "API responses by route and status", ("route", "method", "status"))
+
+
+def observe_query(method: str, elapsed: float, rows: int) -> None:
+    DB_QUERY_SECONDS.observe(elapsed, method)
+    if rows:
+        DB_ROWS.inc(method, amount=rows)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterable, List, Optional
+
+from payment_qa_bot.services.outbound import OutboundScheduler
+from payment_qa_bot.texts.catalog import TEXTS
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MAX_LINES = 30
+
+
+@dataclass(slots=True)
+class AdminEvent:
+    kind: str
+    order_id: int
+    text: str
+    username: Optional[str] = None
+    geo: Optional[str] = None
+    total: int = 0
+    # the language the immediate notification was rendered in; the digest lines follow it
+    language: Optional[str] = None
+
+
+class AdminNotifier:
+    def __init__(
+        self,
+        outbound: OutboundScheduler,
+        admin_ids: Iterable[int],
+        *,
+        threshold: int = 5,
+        window: float = 60.0,
+        language: str = "en",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._outbound = outbound
+        self._admin_ids = list(admin_ids)
+        self._threshold = threshold
+        self._window = window
+        self._language = language
+        self._clock = clock
+        self._recent: Deque[float] = deque()
+        self._pending: List[AdminEvent] = []
+        self._flush_task: Optional[asyncio.Task[None]] = None
+        self.immediate_sent = 0
+        self.digests_sent = 0
+        self.events_digested = 0
+
+    def order_created(
+        self,
+        order_id: int,
+        username: object,
+        geo: str,
+        total: int,
+        text: str,
+        *,
+        language: Optional[str] = None,
+    ) -> None:
+        self._publish(
+            AdminEvent(
+                "order", order_id, text, username=str(username), geo=geo, total=int(total or 0), language=language
+            )
+        )
+
+    def payment_received(self, order_id: int, text: str, *, language: Optional[str] = None) -> None:
+        self._publish(AdminEvent("payment", order_id, text, language=language))
+
+    def _publish(self, event: AdminEvent) -> None:
+        if not self._admin_ids:
+            return
+        now = self._clock()
+        self._recent.append(now)
+        while self._recent and self._recent[0] <= now - self._window:
+            self._recent.popleft()
+        if self._pending or (self._threshold > 0 and len(self._recent) > self._threshold):
+            self._pending.append(event)
+            self._schedule_flush()
+            return
+        self.immediate_sent += 1
+        self._outbound.broadcast(self._admin_ids, event.text)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # no loop (e.g. sync callers in tests): the next flush() call delivers the buffer
+            self._flush_task = None
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._window)
+        self.flush()
+
+    def flush(self) -> None:
+        events, self._pending = self._pending, []
+        if not events:
+            return
+        self.digests_sent += 1
+        self.events_digested += len(events)
+        self._outbound.broadcast(self._admin_ids, self.render_digest(events))
+
+    def render_digest(self, events: List[AdminEvent]) -> str:
+        orders = [event for event in events if event.kind == "order"]
+        payments = [event for event in events if event.kind == "payment"]
+        # each line uses the language its immediate notification would have had; the header can only share
+        # it when every event agrees
+        languages = {event.language or self._language for event in events}
+        language = languages.pop() if len(languages) == 1 else self._language
+        lines = [
+            TEXTS.get(
+                "admin.digest.header",
+                language,
+                minutes=max(1, math.ceil(self._window / 60)),
+                orders=len(orders),
+                total=sum(event.total for event in orders),
+                payments=len(payments),
+            ),
+            "",
+        ]
+        for event in events[:DIGEST_MAX_LINES]:
+            event_language = event.language or self._language
+            if event.kind == "order":
+                lines.append(
+                    TEXTS.get(
+                        "admin.digest.order",
+                        event_language,
+                        order_id=event.order_id,
+                        username=event.username,
+                        geo=event.geo,
+                        total=event.total,
+                    )
+                )
+            else:
+                lines.append(TEXTS.get("admin.digest.payment", event_language, order_id=event.order_id))
+        if len(events) > DIGEST_MAX_LINES:
+            lines.append(TEXTS.get("admin.digest.more", language, count=len(events) - DIGEST_MAX_LINES))
+        return "\n".join(lines)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self.flush()
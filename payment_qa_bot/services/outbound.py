@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from payment_qa_bot.services.logs import TRACE_ID
+from payment_qa_bot.services.metrics import TELEGRAM_ERRORS, TELEGRAM_REQUEST_SECONDS
+from payment_qa_bot.services.ratelimit import TokenBucket
+from payment_qa_bot.services.tracing import CURRENT_SPAN, TRACER, Span
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+RETRYABLE_ERRORS = (TelegramRetryAfter, TelegramNetworkError, TelegramServerError)
+LATENCY_WINDOW = 1024
+
+
+def _is_group_chat(chat_id: ChatId) -> bool:
+    if isinstance(chat_id, str):
+        return True
+    return chat_id < 0
+
+
+class OutboundLimiter:
+    def __init__(
+        self,
+        *,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_chats: int = 10_000,
+    ) -> None:
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._chat_burst = chat_burst
+        self._max_chats = max_chats
+        self._chats: "OrderedDict[ChatId, TokenBucket]" = OrderedDict()
+        self._paused_until = 0.0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.flood_waits = 0
+
+    def _chat_bucket(self, chat_id: ChatId, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = self._group_rate if _is_group_chat(chat_id) else self._chat_rate
+            bucket = TokenBucket(rate, self._chat_burst, now)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def pause(self, seconds: float) -> None:
+        self.flood_waits += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: ChatId) -> None:
+        while True:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if wait <= 0:
+                chat_bucket = self._chat_bucket(chat_id, now)
+                wait = max(self._global.delay(now), chat_bucket.delay(now))
+                if wait <= 0:
+                    self._global.consume(now)
+                    chat_bucket.consume(now)
+                    return
+            self.throttled += 1
+            self.throttled_seconds += wait
+            await asyncio.sleep(wait)
+
+    @property
+    def tracked_chats(self) -> int:
+        return len(self._chats)
+
+
+class OutboundRequestMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: OutboundLimiter) -> None:
+        self._limiter = limiter
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._timed(make_request, bot, method)
+        await self._limiter.acquire(chat_id)
+        try:
+            return await self._timed(make_request, bot, method)
+        except TelegramRetryAfter as exc:
+            # only hold every sender back here; retrying is left to the caller (OutboundScheduler)
+            self._limiter.pause(exc.retry_after)
+            logger.warning("Telegram flood control on %s, paused for %ss", type(method).__name__, exc.retry_after)
+            raise
+
+    @staticmethod
+    async def _timed(
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        # measured after the limiter, so this is Telegram's latency and not our own throttling
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            with TRACER.span("telegram." + name):
+                return await make_request(bot, method)
+        except Exception as exc:
+            TELEGRAM_ERRORS.inc(name, type(exc).__name__)
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, name)
+
+
+@dataclass(slots=True)
+class OutboundMessage:
+    chat_id: ChatId
+    text: str
+    kwargs: Dict[str, Any]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    # workers outlive the update that queued the message; the id travels with it so the send logs under it
+    trace_id: Optional[str] = field(default_factory=TRACE_ID.get)
+    span: Optional[Span] = field(default_factory=CURRENT_SPAN.get)
+
+
+class OutboundScheduler:
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        workers: int = 8,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        max_queue: int = 10_000,
+    ) -> None:
+        self._bot = bot
+        self._workers = max(1, workers)
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._queue: "asyncio.Queue[OutboundMessage]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task[None]] = []
+        self._retries: Set[asyncio.Task[None]] = set()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(), name=f"outbound-{idx}") for idx in range(self._workers)]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbound queue not drained, %s messages dropped", self._queue.qsize())
+        for task in [*self._retries, *self._tasks]:
+            task.cancel()
+        await asyncio.gather(*self._retries, *self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self) -> None:
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                return
+            await asyncio.gather(*self._retries, return_exceptions=True)
+
+    def submit(self, chat_id: ChatId, text: str, **kwargs: Any) -> bool:
+        try:
+            self._queue.put_nowait(OutboundMessage(chat_id=chat_id, text=text, kwargs=kwargs))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error("Outbound queue full, dropping message to %s", chat_id)
+            return False
+        return True
+
+    def broadcast(self, chat_ids: Iterable[ChatId], text: str, **kwargs: Any) -> int:
+        return sum(1 for chat_id in chat_ids if self.submit(chat_id, text, **kwargs))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = min(self._max_delay, self._base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(delay / 2, delay)
+        if retry_after:
+            delay = max(delay, float(retry_after))
+        return delay
+
+    async def _retry_later(self, item: OutboundMessage, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _send(self, item: OutboundMessage) -> None:
+        item.attempts += 1
+        try:
+            await self._bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except RETRYABLE_ERRORS as exc:
+            if item.attempts >= self._max_attempts:
+                self.failed += 1
+                logger.error("Giving up on message to %s after %s attempts: %s", item.chat_id, item.attempts, exc)
+                return
+            self.retried += 1
+            delay = self._backoff(item.attempts, getattr(exc, "retry_after", None))
+            task = asyncio.create_task(self._retry_later(item, delay))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+        except Exception as exc:  # noqa: BLE001 - blocked bots, bad chat ids etc. are not worth retrying
+            self.failed += 1
+            logger.warning("Failed to deliver message to %s: %s", item.chat_id, exc)
+        else:
+            self.sent += 1
+            self._latencies.append(time.monotonic() - item.enqueued_at)
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            self.in_flight += 1
+            token = TRACE_ID.set(item.trace_id)
+            span_token = CURRENT_SPAN.set(item.span)
+            try:
+                with TRACER.span("outbound.send", attempt=item.attempts + 1) as span:
+                    span.set("queued_ms", round((time.monotonic() - item.enqueued_at) * 1000, 3))
+                    await self._send(item)
+            finally:
+                CURRENT_SPAN.reset(span_token)
+                TRACE_ID.reset(token)
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 4)
+
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pending_retries": len(self._retries),
+            "dropped": self.dropped,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": latencies[-1] if latencies else None,
+        }
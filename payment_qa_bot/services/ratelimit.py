@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float, amount: float = 1.0) -> float:
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, now: float, amount: float = 1.0) -> None:
+        self._refill(now)
+        self.tokens -= amount
+
+    def try_acquire(self, now: float, amount: float = 1.0) -> float:
+        wait = self.delay(now, amount)
+        if wait == 0.0:
+            self.tokens -= amount
+        return wait
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from payment_qa_bot.models.db import OrdersRepository
+
+logger = logging.getLogger(__name__)
+
+COMPACT_INTERVAL = 3600.0
+
+
+def compaction_cutoff(now: datetime, hourly_days: int) -> str:
+    # always a day boundary, so a compacted day never mixes hourly and daily rows
+    cutoff = (now - timedelta(days=hourly_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return cutoff.isoformat(timespec="seconds")
+
+
+async def compact_rollups_periodically(
+    repo: OrdersRepository,
+    *,
+    hourly_days: int,
+    interval: float = COMPACT_INTERVAL,
+) -> None:
+    while True:
+        try:
+            moved = await repo.compact_rollups(compaction_cutoff(datetime.utcnow(), hourly_days))
+        except Exception:  # noqa: BLE001 - try again on the next round
+            logger.exception("Failed to compact order rollups")
+        else:
+            if moved:
+                logger.info("Compacted %s hourly rollup rows into days", moved)
+        await asyncio.sleep(interval)
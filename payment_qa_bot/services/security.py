@@ -1,45 +1,149 @@
 from __future__ import annotations
 
+import asyncio
 import base64
-from typing import Optional
+import hashlib
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+ENCRYPT = "encrypt"
+DECRYPT = "decrypt"
+ROTATE = "rotate"
+
+
+def _normalize_key(key: bytes) -> Optional[bytes]:
+    try:
+        # allow base64 urlsafe strings or raw key material
+        decoded = base64.urlsafe_b64decode(key)
+        if len(decoded) == 32:
+            normalized = base64.urlsafe_b64encode(decoded)
+        else:
+            normalized = key
+        Fernet(normalized)
+    except Exception:  # noqa: BLE001 - best effort, invalid keys are skipped
+        return None
+    return normalized
+
+
+@lru_cache(maxsize=8)
+def _multi_fernet(keys: Tuple[bytes, ...]) -> MultiFernet:
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+@lru_cache(maxsize=8)
+def _primary_fernet(key: bytes) -> Fernet:
+    return Fernet(key)
+
+
+def _apply(fernet: MultiFernet, operation: str, value: Optional[str], primary: Optional[Fernet] = None) -> Optional[str]:
+    if not value:
+        return value
+    if operation == ENCRYPT:
+        return fernet.encrypt(value.encode("utf-8")).decode("utf-8")
+    try:
+        if operation == DECRYPT:
+            return fernet.decrypt(value.encode("utf-8")).decode("utf-8")
+        if primary is not None:
+            # MultiFernet.rotate re-encrypts even tokens that are already on the primary key; keep those as they are
+            try:
+                primary.decrypt(value.encode("utf-8"))
+                return value
+            except InvalidToken:
+                pass
+        return fernet.rotate(value.encode("utf-8")).decode("utf-8")
+    except InvalidToken:
+        return None
+
+
+def _crypt_chunk(keys: Tuple[bytes, ...], operation: str, values: Sequence[Optional[str]]) -> List[Optional[str]]:
+    # module-level so it can be shipped to a ProcessPoolExecutor; workers rebuild the Fernet from raw keys
+    fernet = _multi_fernet(keys)
+    primary = _primary_fernet(keys[0]) if operation == ROTATE else None
+    return [_apply(fernet, operation, value, primary) for value in values]
 
 
 class CredentialEncryptor:
-    def __init__(self, key: Optional[bytes]) -> None:
-        self._fernet: Optional[Fernet]
+    def __init__(
+        self,
+        key: Optional[bytes],
+        *,
+        batch_threshold: int = 64,
+        chunk_size: int = 256,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        keys: List[bytes] = []
         if key:
-            try:
-                # allow base64 urlsafe strings or raw key material
-                decoded = base64.urlsafe_b64decode(key)
-                if len(decoded) == 32:
-                    self._fernet = Fernet(base64.urlsafe_b64encode(decoded))
-                else:
-                    self._fernet = Fernet(key)
-            except Exception:  # noqa: BLE001 - best effort, fallback to disabled encryption
-                self._fernet = None
-        else:
-            self._fernet = None
+            # comma separated list: the first key encrypts, every key may decrypt (MultiFernet rotation)
+            for chunk in key.split(b","):
+                normalized = _normalize_key(chunk.strip()) if chunk.strip() else None
+                if normalized is not None:
+                    keys.append(normalized)
+        self._keys: Tuple[bytes, ...] = tuple(keys)
+        self._fernet: Optional[MultiFernet] = _multi_fernet(self._keys) if self._keys else None
+        self._batch_threshold = batch_threshold
+        self._chunk_size = max(1, chunk_size)
+        self._executor = executor
+
+    @property
+    def enabled(self) -> bool:
+        return self._fernet is not None
+
+    @property
+    def key_id(self) -> Optional[str]:
+        if not self._keys:
+            return None
+        return hashlib.sha256(self._keys[0]).hexdigest()[:12]
+
+    @property
+    def key_count(self) -> int:
+        return len(self._keys)
 
     def encrypt(self, value: Optional[str]) -> Optional[str]:
         if not value:
             return value
         if self._fernet is None:
             return value
-        token = self._fernet.encrypt(value.encode("utf-8"))
-        return token.decode("utf-8")
+        return _apply(self._fernet, ENCRYPT, value)
 
     def decrypt(self, token: Optional[str]) -> Optional[str]:
         if not token:
             return token
         if self._fernet is None:
             return token
-        try:
-            value = self._fernet.decrypt(token.encode("utf-8"))
-            return value.decode("utf-8")
-        except InvalidToken:
-            return None
+        return _apply(self._fernet, DECRYPT, token)
+
+    def rotate(self, token: Optional[str]) -> Optional[str]:
+        if not token or self._fernet is None:
+            return token
+        return _apply(self._fernet, ROTATE, token, _primary_fernet(self._keys[0]))
+
+    async def encrypt_many(self, values: Sequence[Optional[str]]) -> List[Optional[str]]:
+        if self._fernet is None:
+            return list(values)
+        return await self._map(ENCRYPT, values)
+
+    async def decrypt_many(self, tokens: Sequence[Optional[str]]) -> List[Optional[str]]:
+        if self._fernet is None:
+            return list(tokens)
+        return await self._map(DECRYPT, tokens)
+
+    async def rotate_many(self, tokens: Sequence[Optional[str]]) -> List[Optional[str]]:
+        if self._fernet is None:
+            return list(tokens)
+        return await self._map(ROTATE, tokens)
+
+    async def _map(self, operation: str, values: Sequence[Optional[str]]) -> List[Optional[str]]:
+        if len(values) < self._batch_threshold:
+            return _crypt_chunk(self._keys, operation, values)
+        loop = asyncio.get_running_loop()
+        chunks = [values[start : start + self._chunk_size] for start in range(0, len(values), self._chunk_size)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _crypt_chunk, self._keys, operation, chunk) for chunk in chunks)
+        )
+        return [value for chunk in results for value in chunk]
 
 
 def mask_secret(value: Optional[str]) -> str:
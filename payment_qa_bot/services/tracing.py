@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Protocol
+
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from payment_qa_bot.services.logs import TRACE_ID, new_trace_id, trace_sampled
+from payment_qa_bot.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "payment_qa_bot"
+EXPORT_BATCH = 512
+EXPORT_INTERVAL = 1.0
+MAX_PENDING_SPANS = 10_000
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    started: int = field(default_factory=time.perf_counter_ns, repr=False)
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        return None
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    __slots__ = ("_tracer", "_span", "_token")
+
+    def __init__(self, tracer: "Tracer", span: Span) -> None:
+        self._tracer = tracer
+        self._span = span
+        self._token: Any = None
+
+    def __enter__(self) -> Span:
+        self._token = CURRENT_SPAN.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        span = self._span
+        # wall clock for the start so spans line up across processes, a monotonic clock for the duration
+        span.end_ns = span.start_ns + time.perf_counter_ns() - span.started
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        CURRENT_SPAN.reset(self._token)
+        self._tracer.finish(span)
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: List[Span]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class FileExporter:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: List[Span]) -> None:
+        self._file.write("".join(json.dumps(span.as_dict(), default=str) + "\n" for span in spans))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _otlp_id(value: str, size: int) -> str:
+    # OTLP wants 16-byte trace ids; request ids taken from a proxy can be any short string
+    if len(value) == size * 2 and all(char in "0123456789abcdef" for char in value):
+        return value
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=size).hexdigest()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    otlp_spans = []
+    for span in spans:
+        entry: Dict[str, Any] = {
+            "traceId": _otlp_id(span.trace_id, 16),
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id is not None:
+            entry["parentSpanId"] = span.parent_id
+        otlp_spans.append(entry)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class OtlpHttpExporter:
+    def __init__(self, endpoint: str, *, timeout: float = 5.0) -> None:
+        self._endpoint = endpoint
+        self._timeout = timeout
+        self.failures = 0
+
+    def export(self, spans: List[Span]) -> None:
+        body = json.dumps(otlp_payload(spans)).encode("utf-8")
+        request = urllib.request.Request(
+            self._endpoint, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout):
+                pass
+        except OSError as exc:
+            self.failures += 1
+            if self.failures == 1 or self.failures % 100 == 0:
+                logger.warning("Span export to %s failed (%s times): %s", self._endpoint, self.failures, exc)
+
+    def close(self) -> None:
+        return None
+
+
+def build_exporter(target: str) -> SpanExporter:
+    if target.startswith(("http://", "https://")):
+        return OtlpHttpExporter(target)
+    return FileExporter(target)
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.sample_rate = 0.0
+        self._exporter: Optional[SpanExporter] = None
+        self._pending: "queue.Queue[Optional[Span]]" = queue.Queue(MAX_PENDING_SPANS)
+        self._thread: Optional[threading.Thread] = None
+        self.finished = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._exporter is not None and self.sample_rate > 0
+
+    def configure(self, sample_rate: float, exporter: SpanExporter) -> None:
+        self.shutdown()
+        self.sample_rate = sample_rate
+        self._exporter = exporter
+        # spans are written by a thread so neither a file nor a collector round trip runs on the event loop
+        self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join(EXPORT_INTERVAL * 5)
+            self._thread = None
+        if self._exporter is not None:
+            self._exporter.close()
+            self._exporter = None
+        self.sample_rate = 0.0
+
+    def start_trace(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Any:
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = CURRENT_SPAN.get()
+        if parent is not None:
+            return self._child(parent, name, attributes)
+        trace_id = trace_id or TRACE_ID.get() or new_trace_id()
+        # head-based: the decision is made once at the root, unsampled traces create no span objects at all
+        if not trace_sampled(trace_id, self.sample_rate):
+            return NOOP_SPAN
+        span = Span(name, trace_id, secrets.token_hex(8), None, time.time_ns(), attributes=attributes)
+        return _SpanScope(self, span)
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        parent = CURRENT_SPAN.get()
+        if parent is None:
+            return NOOP_SPAN
+        return self._child(parent, name, attributes)
+
+    def _child(self, parent: Span, name: str, attributes: Dict[str, Any]) -> _SpanScope:
+        span = Span(name, parent.trace_id, secrets.token_hex(8), parent.span_id, time.time_ns(), attributes=attributes)
+        return _SpanScope(self, span)
+
+    def finish(self, span: Span) -> None:
+        try:
+            self._pending.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.finished += 1
+
+    def _export_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH:
+                try:
+                    item = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch and self._exporter is not None:
+                try:
+                    self._exporter.export(batch)
+                except Exception:  # noqa: BLE001 - a broken exporter must not kill the thread
+                    logger.exception("Span export failed")
+
+
+TRACER = Tracer()
+REGISTRY.counter("tracing_spans_total", "Spans handed to the exporter", callback=lambda: TRACER.finished)
+REGISTRY.counter(
+    "tracing_spans_dropped_total", "Spans dropped because the export queue was full", callback=lambda: TRACER.dropped
+)
+
+
+def setup_tracing(sample_rate: float, target: str) -> None:
+    if sample_rate <= 0 or not target:
+        return
+    TRACER.configure(sample_rate, build_exporter(target))
+    atexit.register(TRACER.shutdown)
+
+
+class TracedStorage(BaseStorage):
+    def __init__(self, storage: BaseStorage) -> None:
+        self.inner = storage
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        with TRACER.span("fsm.set_state"):
+            await self.inner.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        with TRACER.span("fsm.get_state"):
+            return await self.inner.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        with TRACER.span("fsm.set_data"):
+            await self.inner.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        with TRACER.span("fsm.get_data"):
+            return await self.inner.get_data(key)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        with TRACER.span("fsm.update_data"):
+            return await self.inner.update_data(key, data)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+    def __getattr__(self, name: str) -> Any:
+        # MemoryStorage.storage is read by the size probes
+        return getattr(self.inner, name)
@@ -88,9 +88,15 @@ TEXTS = TextCatalog(
             "lang.prompt": "Send /lang to switch language anytime.",
             "admin.notify.new": "New order #{order_id} from @{username} ({geo}) — €{total}.",
             "admin.notify.payment": "Payment proof for order #{order_id} received.",
+            "admin.digest.header": "📬 {minutes} min digest: {orders} new orders (€{total}), {payments} payment proofs.",
+            "admin.digest.order": "• New #{order_id} @{username} ({geo}) — €{total}",
+            "admin.digest.payment": "• Proof for #{order_id}",
+            "admin.digest.more": "…and {count} more.",
             "admin.stats.header": "Admin dashboard",
             "admin.stats.line": "{status}: {count}",
             "admin.no.orders": "No orders found.",
+            "admin.find.usage": "Usage: /find &lt;text&gt; — searches username, email, method, comments, site and txid.",
+            "admin.find.more": "Showing the {limit} best matches, refine the query to narrow them down.",
             "group.restriction": "Please message the bot directly to place an order.",
             "group.button": "Open bot",
         },
@@ -161,9 +167,15 @@ TEXTS = TextCatalog(
             "lang.prompt": "Отправьте /lang, чтобы сменить язык в любой момент.",
             "admin.notify.new": "Новый заказ #{order_id} от @{username} ({geo}) — €{total}.",
             "admin.notify.payment": "Получен платёжный чек по заказу #{order_id}.",
+            "admin.digest.header": "📬 Сводка за {minutes} мин: новых заказов — {orders} (€{total}), чеков — {payments}.",
+            "admin.digest.order": "• Новый #{order_id} @{username} ({geo}) — €{total}",
+            "admin.digest.payment": "• Чек по #{order_id}",
+            "admin.digest.more": "…и ещё {count}.",
             "admin.stats.header": "Админ-панель",
             "admin.stats.line": "{status}: {count}",
             "admin.no.orders": "Заказов нет.",
+            "admin.find.usage": "Использование: /find &lt;текст&gt; — поиск по username, email, методу, комментариям, сайту и txid.",
+            "admin.find.more": "Показаны {limit} лучших совпадений, уточните запрос.",
             "group.restriction": "Пожалуйста, напишите боту в личные сообщения, чтобы оформить заказ.",
             "group.button": "Открыть бота",
         },
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:  # optional: .br files are only produced when the brotli package is installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None  # type: ignore[assignment]
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PATHS = ("index.html", "admin")
+EXTENSIONS = {".html", ".js", ".css", ".svg", ".json"}
+MIN_SIZE = 1024
+
+
+def iter_assets(paths: Iterable[Path]) -> Iterator[Path]:
+    for path in paths:
+        if path.is_dir():
+            for child in sorted(path.rglob("*")):
+                if child.is_file() and child.suffix in EXTENSIONS:
+                    yield child
+        elif path.is_file():
+            yield path
+
+
+def write_sibling(source: Path, suffix: str, data: bytes, original_size: int) -> bool:
+    target = source.with_name(source.name + suffix)
+    if len(data) >= original_size:
+        # nginx would serve the bigger file; drop a stale sibling instead
+        if target.exists():
+            target.unlink()
+        return False
+    target.write_bytes(data)
+    stat = source.stat()
+    # keep the source mtime so Last-Modified/ETag match whichever variant nginx serves
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+
+def precompress(source: Path) -> str:
+    raw = source.read_bytes()
+    if len(raw) < MIN_SIZE:
+        return "skipped"
+    written = []
+    if write_sibling(source, ".gz", gzip.compress(raw, compresslevel=9, mtime=0), len(raw)):
+        written.append("gz")
+    if brotli is not None and write_sibling(source, ".br", brotli.compress(raw, quality=11), len(raw)):
+        written.append("br")
+    return ",".join(written) or "incompressible"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write .gz/.br siblings for static assets served by nginx")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS, help="files or directories relative to the repo root")
+    args = parser.parse_args()
+    for source in iter_assets(ROOT / path for path in args.paths):
+        print(f"{source.relative_to(ROOT)}: {precompress(source)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+import warnings
+from dataclasses import replace
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from payment_qa_bot.api.encoding import get_encoder
+from payment_qa_bot.api.server import (
+    DEFAULT_FIELDS,
+    FULL_FIELDS,
+    compile_serializer,
+    create_api_app,
+    encode_orders,
+    etag_matches,
+    parse_fields,
+)
+from payment_qa_bot.config import load_config
+from payment_qa_bot.models.db import OrderCreate, OrderFilter, OrderRecord, OrdersRepository
+from payment_qa_bot.services.security import CredentialEncryptor
+
+
+class CountingEncryptor:
+    def __init__(self):
+        self.calls = 0
+
+    def decrypt(self, token):
+        self.calls += 1
+        return f"plain:{token}" if token else token
+
+
+def make_order(order_id=1, **overrides):
+    values = dict(
+        order_id=order_id,
+        user_id=42,
+        username="alice",
+        source="tg",
+        state="draft",
+        start_token="tok",
+        geo="IN",
+        method_user_text="UPI",
+        tests_count=2,
+        withdraw_required=True,
+        custom_test_required=False,
+        custom_test_text=None,
+        kyc_required=False,
+        comments='hello "world"',
+        site_url="https://example.com",
+        login="enc-login",
+        password_enc="enc-pass",
+        payout_surcharge=10,
+        price_eur=180,
+        status="draft",
+        payment_network=None,
+        payment_wallet=None,
+        payment_txid=None,
+        payment_proof_file_id=None,
+        admin_notes=None,
+        payload_hash=None,
+        tg_user_id=42,
+        email=None,
+        created_at="2024-01-01T10:00:00",
+        updated_at="2024-01-01T10:05:00",
+    )
+    values.update(overrides)
+    return OrderRecord(**values)
+
+
+class FieldsetTests(unittest.TestCase):
+    def test_default_fields_skip_credentials(self):
+        encryptor = CountingEncryptor()
+        payload = compile_serializer(parse_fields(None))(make_order(), encryptor)
+
+        self.assertEqual(tuple(payload), DEFAULT_FIELDS)
+        self.assertEqual(payload["payoutOption"], "withdraw")
+        self.assertEqual(encryptor.calls, 0)
+
+    def test_sparse_fields_and_cached_serializer(self):
+        fields = parse_fields("id, status,id")
+
+        self.assertEqual(fields, ("id", "status"))
+        self.assertIs(compile_serializer(fields), compile_serializer(("id", "status")))
+        self.assertEqual(compile_serializer(fields)(make_order(), CountingEncryptor()), {"id": 1, "status": "draft"})
+
+    def test_credentials_only_on_detail_requests(self):
+        with self.assertRaises(web.HTTPBadRequest):
+            parse_fields(None, include="credentials")
+        with self.assertRaises(web.HTTPBadRequest):
+            parse_fields("id,unknown", allow_credentials=True)
+
+        encryptor = CountingEncryptor()
+        fields = parse_fields("id", include="credentials", allow_credentials=True)
+        payload = compile_serializer(fields)(make_order(), encryptor)
+
+        self.assertEqual(payload, {"id": 1, "login": "plain:enc-login", "password": "plain:enc-pass"})
+        self.assertEqual(encryptor.calls, 2)
+
+
+class EncoderTests(unittest.TestCase):
+    def test_slots_encoder_matches_dict_serializer(self):
+        orders = [
+            make_order(1),
+            make_order(2, username="Кира", comments="line\nbreak", withdraw_required=False, kyc_required=True),
+            make_order(3, login=None, password_enc=None, price_eur=None, email=None),
+        ]
+        for encoder in (None, get_encoder("stdlib"), get_encoder("auto")):
+            for fields in (DEFAULT_FIELDS, FULL_FIELDS, ("status", "id")):
+                serializer = compile_serializer(fields)
+                body = encode_orders(orders, CountingEncryptor(), fields, encoder)
+                expected = [serializer(order, CountingEncryptor()) for order in orders]
+
+                self.assertEqual(json.loads(body), {"orders": expected})
+                self.assertEqual([list(item) for item in json.loads(body)["orders"]], [list(i) for i in expected])
+
+    def test_unknown_encoder_names_are_rejected(self):
+        with self.assertRaises(ValueError):
+            get_encoder("ujson")
+        with mock.patch.dict(os.environ, {"BOT_JSON_ENCODER": "orjosn"}):
+            with self.assertRaises(RuntimeError):
+                load_config(require_token=False)
+
+
+def make_create(geo, status="draft"):
+    return OrderCreate(
+        source="tg",
+        state="draft",
+        start_token="",
+        user_id=1,
+        username="alice",
+        geo=geo,
+        method_user_text="UPI",
+        tests_count=1,
+        withdraw_required=False,
+        custom_test_required=False,
+        custom_test_text=None,
+        kyc_required=False,
+        comments="a,b",
+        site_url=None,
+        login="secret",
+        password_enc="secret",
+        payout_surcharge=0,
+        price_eur=85,
+        status=status,
+        payment_network=None,
+        payment_wallet=None,
+        payload_hash=None,
+        tg_user_id=1,
+        email=None,
+    )
+
+
+class ApiTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = replace(load_config(require_token=False), db_path=os.path.join(self.tmp.name, "orders.db"))
+        self.repo = OrdersRepository(config.db_path)
+        await self.repo.init()
+        for index in range(7):
+            await self.repo.create_order(make_create("IN" if index % 2 else "BR", "paid" if index < 3 else "draft"))
+        self.client = TestClient(TestServer(create_api_app(self.repo, CredentialEncryptor(None), config)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+
+class ExportTests(ApiTestCase):
+    async def test_chunks_cover_filtered_rows_in_order(self):
+        chunks = [
+            [order.order_id for order in chunk]
+            async for chunk in self.repo.iter_orders(OrderFilter(geo="IN"), chunk_size=2)
+        ]
+
+        self.assertEqual(chunks, [[2, 4], [6]])
+
+    async def test_ndjson_and_csv_exports_apply_list_filters(self):
+        response = await self.client.get("/api/orders/export", params={"status": "draft", "fields": "id,geo"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        lines = [json.loads(line) for line in (await response.text()).splitlines()]
+        self.assertEqual([line["id"] for line in lines], [4, 5, 6, 7])
+
+        response = await self.client.get("/api/orders/export", params={"format": "csv", "geo": "br", "status": "paid"})
+        rows = list(csv.reader(io.StringIO(await response.text())))
+        self.assertEqual(rows[0], list(DEFAULT_FIELDS))
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "3"])
+        self.assertEqual(rows[1][DEFAULT_FIELDS.index("comments")], "a,b")
+
+        response = await self.client.get("/api/orders/export", params={"fields": "id,password"})
+        self.assertEqual(response.status, 400)
+
+
+class ConditionalGetTests(ApiTestCase):
+    def test_weak_comparison(self):
+        self.assertTrue(etag_matches('"x", W/"abc-1"', 'W/"abc-1"'))
+        self.assertTrue(etag_matches("*", 'W/"abc-1"'))
+        self.assertFalse(etag_matches('W/"abc-2"', 'W/"abc-1"'))
+        self.assertFalse(etag_matches(None, 'W/"abc-1"'))
+
+    async def test_not_modified_until_the_database_changes(self):
+        first = await self.client.get("/api/stats")
+        etag = first.headers["ETag"]
+        self.assertEqual(first.headers["Cache-Control"], "no-cache")
+
+        cached = await self.client.get("/api/stats", headers={"If-None-Match": etag})
+        self.assertEqual(cached.status, 304)
+        other = await self.client.get("/api/orders/1", headers={"If-None-Match": etag})
+        self.assertEqual(other.status, 200)
+
+        await self.repo.update_order(1, status="paid")
+        changed = await self.client.get("/api/stats", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status, 200)
+        self.assertEqual((await changed.json())["stats"]["paid"], 3)
+
+        secret = await self.client.get("/api/orders/1", params={"include": "credentials"})
+        self.assertEqual(secret.headers["Cache-Control"], "private, no-store")
+
+    async def test_data_version_follows_orders_when_file_stats_do_not_change(self):
+        # what a WAL restarted after a checkpoint looks like within one mtime tick
+        with mock.patch("payment_qa_bot.models.db.os.stat", return_value=os.stat(self.repo._db_path)):
+            before = await self.repo.data_version()
+            await self.repo.update_order(2, status="completed")
+            self.assertNotEqual(await self.repo.data_version(), before)
+
+
+class ReadinessTests(ApiTestCase):
+    async def test_draining_fails_readiness_without_touching_the_frozen_app(self):
+        self.assertEqual((await self.client.get("/health/ready")).status, 200)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            self.client.server.app["readiness"].ready = False
+
+        response = await self.client.get("/health/ready")
+        self.assertEqual((response.status, (await response.json())["status"]), (503, "draining"))
+        self.assertEqual((await self.client.get("/health/live")).status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from benchmarks.generate import generate
+from benchmarks.repository import CASES, compare, run_suite, uncovered_methods, working_copy
+
+
+class GeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "orders.db")
+
+    def test_fresh_load_rebuilds_indexes_rollups_and_search(self):
+        generate(self.db_path, 500, chunk_size=120)
+        generate(self.db_path, 100, append=True)
+
+        with sqlite3.connect(self.db_path) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM orders").fetchone()[0], 600)
+            rollup = db.execute("SELECT SUM(orders) FROM order_rollup_hourly WHERE dimension = 'geo'").fetchone()
+            self.assertEqual(rollup[0], 600)
+            indexed = db.execute("SELECT COUNT(*) FROM orders_fts WHERE orders_fts MATCH 'upi'").fetchone()[0]
+            expected = db.execute(
+                "SELECT COUNT(*) FROM orders WHERE method_user_text = 'UPI' OR comments LIKE '%UPI%'"
+            ).fetchone()[0]
+            self.assertEqual(indexed, expected)
+            triggers = db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0]
+            self.assertEqual(triggers, 10)
+
+    def test_every_repository_method_has_a_case_that_runs(self):
+        self.assertEqual(uncovered_methods(), [])
+        generate(self.db_path, 300)
+        run_path = working_copy(self.db_path, os.path.join(self.tmp.name, "run.db"))
+
+        results = asyncio.run(
+            run_suite(run_path, size=300, concurrency=[1, 4], cases=CASES, duration=1.0, max_ops=3, seed=1)
+        )
+        counts = []
+        for path in (self.db_path, run_path):
+            with sqlite3.connect(path) as db:
+                counts.append(db.execute("SELECT COUNT(*) FROM orders").fetchone()[0])
+        # the write cases only touched the copy
+        self.assertEqual(counts[0], 300)
+        self.assertGreater(counts[1], 300)
+
+        self.assertEqual(len(results), 2 * len(CASES))
+        self.assertEqual([row["case"] for row in results if row["errors"]], [])
+        self.assertTrue(all(row["ops"] == 3 and row["p50_ms"] <= row["p99_ms"] for row in results))
+
+        slower = [dict(row, p95_ms=row["p95_ms"] * 2 + 1) for row in results]
+        regressions = compare({"results": results}, {"results": slower}, threshold=0.25, min_delta_ms=0.5)
+        self.assertEqual(len(regressions), len(results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import gzip
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from payment_qa_bot.api.compression import choose_encoding, compression_middleware
+
+
+class CompressionTests(unittest.IsolatedAsyncioTestCase):
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate", allow_brotli=False), "gzip")
+        self.assertEqual(choose_encoding("br;q=1, gzip;q=0", allow_brotli=False), None)
+        self.assertEqual(choose_encoding("*", allow_brotli=False), "gzip")
+        self.assertIsNone(choose_encoding(""))
+
+    async def test_only_large_json_bodies_are_compressed(self):
+        large = b'{"orders":[' + b",".join(b'{"id":%d,"status":"draft"}' % i for i in range(500)) + b"]}"
+
+        async def handler(request):
+            body = large if request.query.get("size") == "large" else b'{"ok":true}'
+            return web.Response(body=body, content_type="application/json")
+
+        app = web.Application(middlewares=[compression_middleware(min_size=1024, executor_threshold=4096)])
+        app.router.add_get("/", handler)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get("/?size=large", headers={"Accept-Encoding": "gzip"}, auto_decompress=False)
+            raw = await response.read()
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(gzip.decompress(raw), large)
+
+            small = await client.get("/", headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("Content-Encoding", small.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
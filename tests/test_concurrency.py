@@ -0,0 +1,55 @@
+import unittest
+
+from payment_qa_bot.api.concurrency import HIGH, LOW, NORMAL, AdaptiveLimiter
+from tests.test_api_server import ApiTestCase
+from tests.test_ratelimit import FakeClock
+
+
+class AdaptiveLimiterTests(unittest.TestCase):
+    def test_backs_off_on_slow_queries_and_recovers_additively(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(max_limit=40, initial_limit=20, latency_target=0.1, cooldown=1.0, clock=clock)
+
+        limiter.observe(0.5)
+        limiter.observe(0.5)  # same cooldown window: one decrease per congestion episode
+        self.assertEqual((limiter.limit, limiter.decreases), (15.0, 1))
+
+        limiter.inflight = 10
+        for _ in range(15):
+            limiter.observe(0.01)
+        self.assertAlmostEqual(limiter.limit, 16.0, delta=0.1)
+
+        limiter.inflight = 0
+        limiter.observe(0.01)  # idle: no growth
+        self.assertAlmostEqual(limiter.limit, 16.0, delta=0.1)
+
+    def test_low_priority_is_shed_first(self):
+        limiter = AdaptiveLimiter(max_limit=10, initial_limit=10)
+        admitted = [limiter.try_acquire(LOW) for _ in range(6)]
+
+        self.assertEqual(admitted, [True] * 5 + [False])
+        self.assertTrue(limiter.try_acquire(NORMAL))
+        self.assertTrue(all(limiter.try_acquire(HIGH) for _ in range(4)))
+        self.assertFalse(limiter.try_acquire(HIGH))
+        self.assertEqual(limiter.shed, {LOW: 1, NORMAL: 0, HIGH: 1})
+
+
+class ConcurrencyMiddlewareTests(ApiTestCase):
+    async def test_sheds_listings_before_writes(self):
+        limiter = self.client.app["concurrency_limiter"]
+        decreases = limiter.decreases
+        for observer in self.repo.query_observers:
+            observer("get_order", 10.0, 1)
+        self.assertEqual(limiter.decreases, decreases + 1)
+
+        limiter.inflight = int(limiter.limit * 0.6)
+        shed = await self.client.get("/api/orders")
+        self.assertEqual((shed.status, shed.headers["Retry-After"]), (503, "1"))
+        self.assertEqual((await self.client.get("/api/orders/1")).status, 200)
+        self.assertEqual((await self.client.patch("/api/orders/1", json={"status": "paid"})).status, 200)
+        self.assertEqual((await self.client.get("/health/ready")).status, 200)
+        limiter.inflight = 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from dataclasses import replace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.config import load_config
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.diagnostics import AllocationTracker, LoopLagMonitor, collapse_stacks, sample_stacks
+from payment_qa_bot.services.events import OrderEventHub
+from payment_qa_bot.services.security import CredentialEncryptor
+
+
+def blocking_handler():
+    time.sleep(0.3)
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class LoopLagMonitorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_stall_is_reported_with_the_blocking_stack(self):
+        monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            with self.assertLogs("payment_qa_bot.services.diagnostics", "WARNING"):
+                blocking_handler()
+                await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        stats = monitor.stats()
+        self.assertEqual(stats["stalls"], 1)
+        self.assertGreaterEqual(stats["lag_max"], 0.2)
+        self.assertIn("blocking_handler", "\n".join(stats["last_stall"]["stack"]))
+
+
+class SamplingProfilerTests(unittest.TestCase):
+    def test_collapsed_stacks_of_another_thread(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=spin, args=(stop,))
+        worker.start()
+        try:
+            stacks = sample_stacks(worker.ident, 0.1, interval=0.001)
+        finally:
+            stop.set()
+            worker.join()
+
+        self.assertTrue(any(stack.endswith("tests/test_diagnostics.py:spin") for stack in stacks))
+        line = collapse_stacks(stacks).splitlines()[0]
+        self.assertRegex(line, r"^\S+(;\S+)* \d+$")
+
+
+class AllocationTrackerTests(unittest.TestCase):
+    def test_diff_is_attributed_to_package_lines(self):
+        tracker = AllocationTracker()
+        tracker.start()
+        try:
+            hub = OrderEventHub(max_queue=5000)
+            subscription = hub.subscribe()
+            for order_id in range(2000):
+                hub.publish("updated", order_id, {"status": "paid"})
+            diff = tracker.diff(limit=5)["lines"]
+        finally:
+            tracker.stop()
+
+        self.assertTrue(diff[0]["line"].startswith("payment_qa_bot/services/events.py:"))
+        subscription.close()
+        self.assertGreater(diff[0]["size_diff_bytes"], 0)
+        self.assertFalse(tracker.tracing)
+
+
+class DebugEndpointTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = replace(
+            load_config(require_token=False),
+            db_path=os.path.join(self.tmp.name, "orders.db"),
+            admin_api_token="s3cret",
+        )
+        repo = OrdersRepository(config.db_path)
+        await repo.init()
+        self.client = TestClient(TestServer(create_api_app(repo, CredentialEncryptor(None), config)))
+        await self.client.start_server()
+        self.headers = {"Authorization": "Bearer s3cret"}
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+    async def test_profile_tasks_and_loop(self):
+        profile = await self.client.get("/debug/profile", params={"seconds": "0.1"}, headers=self.headers)
+        self.assertEqual(profile.content_type, "text/plain")
+        self.assertIn("base_events.py:run_forever", await profile.text())
+
+        tasks = await (await self.client.get("/debug/tasks", headers=self.headers)).json()
+        self.assertIn("loop-lag-monitor", [task["name"] for task in tasks["tasks"]])
+
+        loop = await (await self.client.get("/debug/loop", headers=self.headers)).json()
+        self.assertTrue(loop["running"])
+        self.assertEqual((await self.client.get("/debug/loop")).status, 401)
+
+    async def test_memory_report(self):
+        memory = await (await self.client.get("/debug/memory", params={"types": "1"}, headers=self.headers)).json()
+        self.assertGreater(memory["process"]["rss_bytes"], 0)
+        self.assertIn("idempotency_cache", memory["structures"])
+        self.assertTrue(memory["types"])
+
+        url = "/debug/memory/allocations"
+        self.assertEqual((await self.client.get(url, headers=self.headers)).status, 409)
+        self.assertTrue((await (await self.client.post(url, headers=self.headers)).json())["tracing"])
+        self.assertIn("diff", await (await self.client.get(url, headers=self.headers)).json())
+        self.assertFalse((await (await self.client.delete(url, headers=self.headers)).json())["tracing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
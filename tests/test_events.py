@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from dataclasses import replace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.config import load_config
+from payment_qa_bot.models.db import ChangeCursor, OrdersRepository
+from payment_qa_bot.services.change_feed import relay_changes
+from payment_qa_bot.services.events import OrderEventHub
+from payment_qa_bot.services.security import CredentialEncryptor
+from tests.test_api_server import make_create
+
+
+class OrderEventHubTests(unittest.IsolatedAsyncioTestCase):
+    async def test_events_carry_the_hub_position(self):
+        hub = OrderEventHub()
+        subscription = hub.subscribe()
+        hub.publish("updated", 1, {"status": "paid"})
+        hub.position = ChangeCursor("2024-01-01T00:00:00", 1, 0)
+        hub.publish("updated", 2, {"status": "paid"})
+
+        self.assertEqual([(await subscription.next(0)).cursor for _ in range(2)], [None, hub.position])
+
+    async def test_slow_subscriber_is_dropped_after_draining(self):
+        hub = OrderEventHub(max_queue=2)
+        subscription = hub.subscribe()
+        for order_id in range(3):
+            hub.publish("created", order_id, {})
+
+        self.assertEqual(hub.subscribers, 0)
+        self.assertEqual(hub.lagged, 1)
+        self.assertEqual((await subscription.next(0)).order_id, 0)
+        self.assertEqual((await subscription.next(0)).order_id, 1)
+        self.assertIsNone(await subscription.next(0))
+        self.assertTrue(subscription.finished)
+
+
+class OrderStreamTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = replace(load_config(require_token=False), db_path=os.path.join(self.tmp.name, "orders.db"))
+        self.repo = OrdersRepository(self.config.db_path)
+        await self.repo.init()
+        self.client = await self.start_worker(self.repo)
+
+    async def start_worker(self, repo):
+        client = TestClient(TestServer(create_api_app(repo, CredentialEncryptor(None), self.config)))
+        await client.start_server()
+        return client
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+    async def read_event(self, response):
+        fields = {}
+        while True:
+            line = (await asyncio.wait_for(response.content.readline(), 5)).decode().rstrip("\n")
+            if not line:
+                if "event" in fields:
+                    return fields
+                continue
+            key, _, value = line.partition(": ")
+            fields[key] = value
+
+    async def test_updates_are_pushed_as_deltas(self):
+        response = await self.client.get("/api/orders/stream")
+        self.assertEqual(response.content_type, "text/event-stream")
+        await self.repo.update_order(1, status="paid")  # no such order: nothing is published
+        self.repo.events.publish("updated", 7, {"status": "paid", "password_enc": "secret", "kyc_required": 1})
+        self.repo.events.publish("updated", 7, {"admin_notes": "x"})
+
+        first = await self.read_event(response)
+        self.assertEqual(first["event"], "order")
+        self.assertEqual(
+            json.loads(first["data"]),
+            {"op": "updated", "id": 7, "changes": {"status": "paid", "kycRequired": True}},
+        )
+        response.close()
+
+        stale = await self.client.get("/api/orders/stream", headers={"Last-Event-ID": "not-a-cursor"})
+        self.assertEqual((await self.read_event(stale))["event"], "reset")
+        stale.close()
+
+    async def test_another_worker_resumes_from_the_database(self):
+        order_id = await self.repo.create_order(make_create("IN"))
+        response = await self.client.get("/api/orders/stream")
+        await self.repo.update_order(order_id, status="paid")
+        first = await self.read_event(response)
+        response.close()
+        await self.repo.update_order(order_id, status="completed")
+
+        other = await self.start_worker(OrdersRepository(self.config.db_path))
+        try:
+            resumed = await other.get("/api/orders/stream", headers={"Last-Event-ID": first["id"]})
+            event = await self.read_event(resumed)
+            resumed.close()
+        finally:
+            await other.close()
+
+        delta = json.loads(event["data"])
+        self.assertEqual((delta["op"], delta["id"], delta["changes"]["status"]), ("updated", order_id, "completed"))
+
+
+class ChangeCursorTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "orders.db")
+        self.repo = OrdersRepository(self.path)
+        await self.repo.init()
+        for _ in range(4):
+            await self.repo.create_order(make_create("IN"))
+        self.execute("UPDATE orders SET updated_at = '2024-01-01T00:00:00'")
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def execute(self, statement, params=()):
+        with sqlite3.connect(self.path) as db:
+            db.execute(statement, params)
+
+    async def test_pages_then_only_changes_and_tombstones(self):
+        first = await self.repo.changes_since(ChangeCursor(), limit=3)
+        self.assertEqual([order.order_id for order in first.orders], [1, 2, 3])
+        self.assertTrue(first.has_more)
+        second = await self.repo.changes_since(first.cursor, limit=3)
+        self.assertEqual([order.order_id for order in second.orders], [4])
+        self.assertFalse(second.has_more)
+
+        self.execute("UPDATE orders SET updated_at = '2024-01-02T00:00:00', status = 'archived' WHERE order_id = 2")
+        self.execute("UPDATE orders SET updated_at = '2024-01-02T00:00:00' WHERE order_id = 1")
+        self.execute("DELETE FROM orders WHERE order_id = 3")
+        third = await self.repo.changes_since(second.cursor)
+
+        self.assertEqual([order.order_id for order in third.orders], [1])
+        self.assertEqual([(item.order_id, item.reason) for item in third.tombstones], [(3, "deleted"), (2, "archived")])
+        self.assertEqual((await self.repo.changes_since(third.cursor)).orders, [])
+
+    async def test_cursor_does_not_pass_the_settle_horizon(self):
+        settled = (await self.repo.changes_since(ChangeCursor())).cursor
+        await self.repo.update_order(4, status="paid")
+
+        fresh = await self.repo.changes_since(settled)
+        self.assertEqual([order.order_id for order in fresh.orders], [4])
+        self.assertEqual(fresh.cursor, settled)
+
+    async def test_relay_publishes_writes_from_another_process(self):
+        bot_repo = OrdersRepository(self.path)
+        subscription = self.repo.events.subscribe()
+        relay = asyncio.create_task(relay_changes(self.repo, interval=0.01))
+        try:
+            await asyncio.sleep(0.05)
+            await bot_repo.update_order(2, status="paid")
+            event = await subscription.next(2)
+        finally:
+            relay.cancel()
+
+        self.assertEqual((event.kind, event.order_id, event.changes["status"]), ("updated", 2, "paid"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.funnel import FunnelTracker, summarize_funnel
+from tests.test_api_server import ApiTestCase
+from tests.test_ratelimit import FakeClock
+
+GEO = "OrderStates:GEO"
+METHOD = "OrderStates:METHOD"
+CHECK_UPLOAD = "OrderStates:CHECK_UPLOAD"
+
+
+class FunnelTrackerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = OrdersRepository(os.path.join(self.tmp.name, "orders.db"))
+        await self.repo.init()
+        self.clock = FakeClock()
+        self.funnel = FunnelTracker(idle_timeout=600, clock=self.clock, wall_clock=lambda: 1_700_000_000)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_steps_are_counted_and_flushed_in_one_batch(self):
+        self.funnel.observe(1, GEO)
+        self.clock.now += 12
+        self.funnel.observe(1, GEO)
+        self.funnel.observe(1, METHOD)
+        self.funnel.observe(1, GEO)
+        self.funnel.observe(2, GEO)
+        self.funnel.observe(2, None)
+        self.funnel.observe(3, CHECK_UPLOAD)
+        self.clock.now += 40
+        self.funnel.complete(3)
+        self.funnel.observe(3, None)
+        self.funnel.observe(4, METHOD)
+        self.clock.now += 700
+
+        self.assertGreater(await self.funnel.flush(self.repo), 0)
+        self.assertEqual(await self.funnel.flush(self.repo), 0)
+        steps = {step["step"]: step for step in summarize_funnel(await self.repo.get_funnel_stats())}
+
+        geo = steps["GEO"]
+        self.assertEqual((geo["entered"], geo["exited"], geo["abandoned"]), (3, 1, 2))
+        self.assertEqual(geo["dwell"]["p50_seconds"], 15.0)
+        self.assertEqual((steps["METHOD"]["back"], steps["METHOD"]["abandoned"]), (1, 1))
+        self.assertEqual(steps["CHECK_UPLOAD"]["completed"], 1)
+        self.assertEqual(steps["CHECK_UPLOAD"]["dwell"]["avg_seconds"], 40.0)
+        self.assertEqual(self.funnel.active_users, 0)
+
+        rows = await self.repo.get_funnel_stats(since="2023-11-14T22:00:00")
+        self.assertEqual(rows, await self.repo.get_funnel_stats())
+        self.assertEqual(await self.repo.get_funnel_stats(since="2023-11-14T23:00:00"), [])
+
+
+class FunnelEndpointTests(ApiTestCase):
+    async def test_steps_are_returned_in_wizard_order(self):
+        await self.repo.add_funnel_stats(
+            [("2024-01-01T10:00:00", "METHOD", "entered", 4.0), ("2024-01-01T11:00:00", "METHOD", "entered", 1.0)]
+        )
+
+        body = await (await self.client.get("/api/stats/funnel", params={"until": "2024-01-01T11:00:00"})).json()
+
+        self.assertEqual(body["steps"][0]["step"], "GEO")
+        self.assertEqual(body["steps"][1]["entered"], 4)
+        self.assertEqual((await self.client.get("/api/stats/funnel", params={"since": "yesterday"})).status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from payment_qa_bot.services.group_guard import IGNORE, LEAVE, REDIRECT, GroupFloodGuard
+
+
+class GroupFloodGuardTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def test_one_redirect_per_cooldown(self):
+        guard = GroupFloodGuard(600, clock=self.clock)
+
+        self.assertEqual(guard.on_message(-100), REDIRECT)
+        self.assertEqual(guard.on_message(-100), IGNORE)
+        self.assertEqual(guard.on_message(-200), REDIRECT)
+        self.now = 601
+        self.assertEqual(guard.on_message(-100), REDIRECT)
+
+    def test_leaves_chat_over_threshold_and_stays_bounded(self):
+        guard = GroupFloodGuard(600, leave_threshold=3, max_chats=2, clock=self.clock)
+
+        verdicts = [guard.on_message(-1) for _ in range(4)]
+        self.assertEqual(verdicts, [REDIRECT, IGNORE, IGNORE, LEAVE])
+
+        for chat_id in (-2, -3, -4):
+            guard.on_message(chat_id)
+        self.assertEqual(len(guard), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
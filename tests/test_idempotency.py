@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from aiohttp import web
+
+from payment_qa_bot.api.idempotency import IdempotencyStore
+from payment_qa_bot.models.db import OrdersRepository
+from tests.test_api_server import ApiTestCase
+
+
+class IdempotencyStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "orders.db")
+        self.repo = OrdersRepository(self.path)
+        await self.repo.init()
+        self.calls = 0
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def execute(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return web.json_response({"call": self.calls}, status=201)
+
+    async def test_concurrent_duplicates_run_once(self):
+        store = IdempotencyStore(self.repo)
+        responses = await asyncio.gather(*(store.run("POST /x k1", "fp", self.execute) for _ in range(5)))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({response.body for response in responses}, {b'{"call": 1}'})
+        self.assertEqual(store.coalesced, 4)
+
+        # a second process sees the persisted result instead of executing again
+        other = IdempotencyStore(OrdersRepository(self.path))
+        replay = await other.run("POST /x k1", "fp", self.execute)
+        self.assertEqual((replay.status, replay.headers["Idempotent-Replayed"]), (201, "true"))
+        self.assertEqual(self.calls, 1)
+
+    async def test_failures_release_the_key(self):
+        store = IdempotencyStore(self.repo)
+
+        async def fail():
+            raise web.HTTPBadRequest(text="invalid_json")
+
+        with self.assertRaises(web.HTTPBadRequest):
+            await store.run("POST /x k2", "fp", fail)
+        await store.run("POST /x k2", "fp", self.execute)
+        self.assertEqual(self.calls, 1)
+
+    async def test_takeover_only_removes_the_row_it_saw(self):
+        await self.repo.claim_idempotency_key("POST /x k3", "fp")
+        with sqlite3.connect(self.path) as db:
+            db.execute("UPDATE idempotency_keys SET created_at = '2000-01-01T00:00:00'")
+        # both workers read the abandoned claim; this one takes it over first and is still running
+        stale = await self.repo.claim_idempotency_key("POST /x k3", "fp")
+        await self.repo.release_idempotency_key("POST /x k3", pending_only=False, created_at=stale[4], fingerprint="fp")
+        self.assertIsNone(await self.repo.claim_idempotency_key("POST /x k3", "fp"))
+
+        released = await self.repo.release_idempotency_key(
+            "POST /x k3", pending_only=False, created_at=stale[4], fingerprint="fp"
+        )
+        self.assertFalse(released)
+        self.assertIsNone((await self.repo.claim_idempotency_key("POST /x k3", "fp"))[1])
+
+
+class IdempotentRouteTests(ApiTestCase):
+    async def test_retry_replays_and_reused_key_is_rejected(self):
+        headers = {"Idempotency-Key": "retry-1"}
+        first = await self.client.patch("/api/orders/1", json={"status": "paid"}, headers=headers)
+        await self.repo.update_order(1, status="draft")
+        retry = await self.client.patch("/api/orders/1", json={"status": "paid"}, headers=headers)
+
+        self.assertEqual(retry.headers.get("Idempotent-Replayed"), "true")
+        self.assertEqual(await retry.json(), await first.json())
+        self.assertEqual((await self.repo.get_order(1)).status, "draft")
+
+        reused = await self.client.patch("/api/orders/1", json={"status": "refunded"}, headers=headers)
+        self.assertEqual(reused.status, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
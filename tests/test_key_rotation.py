@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet
+
+from payment_qa_bot.models.db import OrderCreate, OrdersRepository
+from payment_qa_bot.services.key_rotation import reencrypt_credentials
+from payment_qa_bot.services.security import CredentialEncryptor
+
+
+def make_order(login, password_enc):
+    return OrderCreate(
+        source="tg",
+        state="draft",
+        start_token="",
+        user_id=1,
+        username="alice",
+        geo="IN",
+        method_user_text="UPI",
+        tests_count=1,
+        withdraw_required=False,
+        custom_test_required=False,
+        custom_test_text=None,
+        kyc_required=False,
+        comments=None,
+        site_url=None,
+        login=login,
+        password_enc=password_enc,
+        payout_surcharge=0,
+        price_eur=85,
+        status="draft",
+        payment_network=None,
+        payment_wallet=None,
+        payload_hash=None,
+        tg_user_id=1,
+        email=None,
+    )
+
+
+class KeyRotationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = OrdersRepository(os.path.join(self.tmp.name, "orders.db"))
+        await self.repo.init()
+        self.old_key = Fernet.generate_key()
+        self.new_key = Fernet.generate_key()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_batch_apis_match_inline_results_on_pool(self):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            encryptor = CredentialEncryptor(self.old_key, batch_threshold=4, chunk_size=3, executor=pool)
+            values = [f"secret-{idx}" if idx % 3 else None for idx in range(10)]
+
+            tokens = await encryptor.encrypt_many(values)
+            self.assertEqual(await encryptor.decrypt_many(tokens), values)
+            self.assertEqual([encryptor.decrypt(token) for token in tokens], values)
+
+    async def test_reencrypt_moves_rows_to_primary_key_and_resumes(self):
+        old = CredentialEncryptor(self.old_key)
+        for idx in range(5):
+            await self.repo.create_order(make_order(old.encrypt(f"login{idx}"), old.encrypt(f"pass{idx}")))
+        await self.repo.create_order(make_order("garbage", None))
+
+        rotated = CredentialEncryptor(self.new_key + b"," + self.old_key)
+        report = await reencrypt_credentials(self.repo, rotated, chunk_size=2, pause=0)
+
+        self.assertEqual((report.scanned, report.rewritten, report.up_to_date, report.unreadable), (6, 5, 0, 1))
+        new_only = CredentialEncryptor(self.new_key)
+        record = await self.repo.get_order(3)
+        self.assertEqual(new_only.decrypt(record.login), "login2")
+        self.assertEqual(new_only.decrypt(record.password_enc), "pass2")
+
+        again = await reencrypt_credentials(self.repo, rotated, chunk_size=2, pause=0)
+        self.assertEqual(again.scanned, 0)
+
+    async def test_rows_on_primary_key_and_concurrent_edits_are_not_rewritten(self):
+        current = CredentialEncryptor(self.new_key)
+        token = current.encrypt("login")
+        await self.repo.create_order(make_order(token, None))
+        rotated = CredentialEncryptor(self.new_key + b"," + self.old_key)
+
+        report = await reencrypt_credentials(self.repo, rotated, pause=0)
+        self.assertEqual((report.rewritten, report.up_to_date), (0, 1))
+        self.assertEqual((await self.repo.get_order(1)).login, token)
+
+        edited = current.encrypt("edited")
+        await self.repo.update_order(1, login=edited)
+        updated = await self.repo.update_credentials_batch(
+            [(1, current.encrypt("stale"), None, token, None)], job_name="test", job_cursor=1
+        )
+        self.assertEqual(updated, 0)
+        self.assertEqual((await self.repo.get_order(1)).login, edited)
+
+
+if __name__ == "__main__":
+    unittest.main()
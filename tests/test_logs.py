@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+import unittest
+
+from payment_qa_bot.services.logs import TRACE_HEADER, TRACE_ID, DebugSampler, setup_logging
+from tests.test_api_server import ApiTestCase
+
+
+class StructuredLoggingTests(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = (root.handlers[:], root.level)
+        self.addCleanup(self.restore)
+
+    def restore(self):
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved
+        root.setLevel(level)
+
+    def test_json_lines_carry_trace_id_and_extras(self):
+        stream = io.StringIO()
+        listener = setup_logging("DEBUG", json_output=True, stream=stream, debug_sample=0.0)
+        logger = logging.getLogger("payment_qa_bot.tests")
+        payload = {"order_id": 1}
+        token = TRACE_ID.set("abc123")
+        try:
+            logger.info("order %s", payload, extra={"slow_query": {"rows": 3}})
+            logger.debug("dropped by sampling")
+        finally:
+            TRACE_ID.reset(token)
+        payload["order_id"] = 2
+        logger.warning("no trace")
+        listener.stop()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["message"], "order {'order_id': 1}")
+        self.assertEqual(lines[0]["trace_id"], "abc123")
+        self.assertEqual(lines[0]["slow_query"], {"rows": 3})
+        self.assertIsNone(lines[1]["trace_id"])
+
+    def test_sampling_keeps_whole_traces(self):
+        sampler = DebugSampler(0.5)
+
+        def kept(trace_id):
+            record = logging.LogRecord("x", logging.DEBUG, "", 0, "debug", (), None)
+            record.trace_id = trace_id
+            return sampler.filter(record)
+
+        decisions = {trace_id: kept(trace_id) for trace_id in map(str, range(200))}
+        self.assertTrue(all(kept(trace_id) == keep for trace_id, keep in decisions.items()))
+        self.assertTrue(40 < sum(decisions.values()) < 160)
+
+
+class TraceHeaderTests(ApiTestCase):
+    async def test_request_id_is_echoed_or_generated(self):
+        response = await self.client.get("/api/orders/1", headers={TRACE_HEADER: "lb-42"})
+        self.assertEqual(response.headers[TRACE_HEADER], "lb-42")
+
+        response = await self.client.get("/api/orders/999", headers={TRACE_HEADER: "x" * 65})
+        self.assertRegex(response.headers[TRACE_HEADER], r"^[0-9a-f]{16}$")
+
+
+if __name__ == "__main__":
+    unittest.main()
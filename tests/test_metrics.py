@@ -0,0 +1,45 @@
+import unittest
+
+from payment_qa_bot.services.metrics import MetricsRegistry
+from tests.test_api_server import ApiTestCase
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_text_exposition(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        counter = registry.counter("hits_total", "Hits", ("status",))
+        registry.gauge("depth", "Depth", callback=lambda: 3)
+        for value in (0.05, 0.1, 0.5, 7.0):
+            histogram.observe(value, "/a")
+        counter.inc('2"00')
+
+        text = registry.render()
+
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count{route="/a"} 4', text)
+        self.assertIn('hits_total{status="2\\"00"} 1', text)
+        self.assertIn("# TYPE depth gauge\ndepth 3\n", text)
+        self.assertIs(registry.counter("hits_total", "Hits", ("status",)), counter)
+
+
+class MetricsEndpointTests(ApiTestCase):
+    async def test_routes_and_repository_calls_are_recorded(self):
+        await self.client.get("/api/orders/3")
+        await self.client.get("/api/orders/999")
+
+        response = await self.client.get("/metrics")
+        text = await response.text()
+
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('api_requests_total{route="/api/orders/{order_id}",method="GET",status="404"}', text)
+        self.assertIn('api_request_duration_seconds_count{route="/api/orders/{order_id}",method="GET"}', text)
+        self.assertIn('db_query_duration_seconds_count{method="get_order"}', text)
+        self.assertIn('db_rows_total{method="create_order"}', text)
+        self.assertIn("api_concurrency_limit ", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
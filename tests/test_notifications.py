@@ -0,0 +1,78 @@
+import unittest
+
+from payment_qa_bot.services.notifications import AdminNotifier
+
+
+class RecordingOutbound:
+    def __init__(self):
+        self.messages = []
+
+    def broadcast(self, chat_ids, text, **kwargs):
+        chat_ids = list(chat_ids)
+        self.messages.extend((chat_id, text) for chat_id in chat_ids)
+        return len(chat_ids)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class AdminNotifierTests(unittest.TestCase):
+    def setUp(self):
+        self.outbound = RecordingOutbound()
+        self.clock = FakeClock()
+        self.notifier = AdminNotifier(self.outbound, [1, 2], threshold=2, window=60, clock=self.clock)
+
+    def test_low_volume_is_sent_immediately(self):
+        self.notifier.order_created(10, "alice", "India", 85, "order 10")
+        self.clock.now += 61
+        self.notifier.payment_received(10, "proof 10")
+
+        self.assertEqual(
+            self.outbound.messages,
+            [(1, "order 10"), (2, "order 10"), (1, "proof 10"), (2, "proof 10")],
+        )
+        self.assertEqual(self.notifier.pending, 0)
+
+    def test_burst_is_coalesced_into_one_digest_per_admin(self):
+        for order_id in range(1, 6):
+            self.notifier.order_created(order_id, "user", "India", 100, f"order {order_id}")
+        self.notifier.payment_received(1, "proof 1")
+
+        self.assertEqual(len(self.outbound.messages), 4)
+        self.assertEqual(self.notifier.pending, 4)
+
+        self.notifier.flush()
+
+        digests = self.outbound.messages[4:]
+        self.assertEqual([chat for chat, _ in digests], [1, 2])
+        header = digests[0][1].splitlines()[0]
+        self.assertIn("3 new orders (€300)", header)
+        self.assertIn("1 payment proofs", header)
+        self.assertEqual(self.notifier.pending, 0)
+
+    def test_digest_follows_the_language_of_the_notifications(self):
+        for order_id in range(1, 4):
+            self.notifier.order_created(order_id, "user", "India", 100, f"order {order_id}", language="ru")
+        self.notifier.flush()
+
+        digest = self.outbound.messages[-1][1].splitlines()
+        self.assertIn("новых заказов — 1", digest[0])
+        self.assertEqual(digest[2], "• Новый #3 @user (India) — €100")
+
+        self.notifier.order_created(4, "user", "India", 100, "order 4", language="ru")
+        self.notifier.payment_received(4, "proof 4", language="en")
+        self.notifier.payment_received(4, "proof 4", language="en")
+        self.notifier.flush()
+
+        digest = self.outbound.messages[-1][1].splitlines()
+        self.assertIn("new orders", digest[0])
+        self.assertEqual(digest[2:], ["• Новый #4 @user (India) — €100", "• Proof for #4", "• Proof for #4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from payment_qa_bot.services.outbound import OutboundLimiter, OutboundRequestMiddleware, OutboundScheduler
+
+
+class FakeBot:
+    def __init__(self, failures=None):
+        self.failures = list(failures or [])
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((chat_id, text))
+
+
+class OutboundTests(unittest.IsolatedAsyncioTestCase):
+    async def test_middleware_pauses_on_flood_control_and_leaves_retries_to_the_caller(self):
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=1000)
+        middleware = OutboundRequestMiddleware(limiter)
+        method = SendMessage(chat_id=1, text="hi")
+        calls = []
+
+        async def make_request(bot, request_method):
+            calls.append(request_method)
+            raise TelegramRetryAfter(method=request_method, message="flood", retry_after=0)
+
+        with self.assertRaises(TelegramRetryAfter):
+            await middleware(make_request, None, method)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(limiter.flood_waits, 1)
+
+    async def test_scheduler_retries_transient_errors_and_drops_permanent_ones(self):
+        method = SendMessage(chat_id=1, text="hi")
+        bot = FakeBot(failures=[TelegramRetryAfter(method=method, message="flood", retry_after=0)])
+        scheduler = OutboundScheduler(bot, workers=2, base_delay=0.01)
+        await scheduler.start()
+
+        self.assertEqual(scheduler.broadcast([1, 2], "new order"), 2)
+        await scheduler.stop(drain_timeout=1.0)
+
+        self.assertEqual(sorted(chat for chat, _ in bot.sent), [1, 2])
+        self.assertEqual(scheduler.retried, 1)
+
+        blocked = FakeBot(failures=[TelegramForbiddenError(method=method, message="blocked")])
+        scheduler = OutboundScheduler(blocked, workers=1)
+        await scheduler.start()
+        scheduler.submit(3, "hello")
+        await scheduler.stop(drain_timeout=1.0)
+
+        self.assertEqual(scheduler.failed, 1)
+        self.assertEqual(blocked.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from dataclasses import replace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.config import load_config
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.models.profiling import QueryProfiler, fingerprint_sql
+from payment_qa_bot.services.security import CredentialEncryptor
+from tests.test_api_server import make_create
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_literals_and_in_lists_are_normalized(self):
+        self.assertEqual(
+            fingerprint_sql("SELECT *  FROM orders\n WHERE status = 'paid' AND id IN (?, ?, ?) LIMIT 50"),
+            "SELECT * FROM orders WHERE status = ? AND id IN (?+) LIMIT ?",
+        )
+
+
+class QueryProfilerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "orders.db")
+        self.profiler = QueryProfiler(slow_threshold=0.05)
+        self.repo = OrdersRepository(self.path, profiler=self.profiler)
+        await self.repo.init()
+        await self.repo.create_order(make_create("IN"))
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_aggregates_by_fingerprint(self):
+        for order_id in (1, 2, 3):
+            await self.repo.get_order(order_id)
+
+        top = {entry["fingerprint"]: entry for entry in self.profiler.top(50, order_by="calls")}
+        entry = top["SELECT * FROM orders WHERE order_id = ? LIMIT ?"]
+        self.assertEqual((entry["calls"], entry["rows"], entry["params"]), (3, 1, 1))
+        self.assertEqual(entry["methods"], {"get_order": 3})
+
+    async def test_executemany_is_recorded(self):
+        await self.repo.add_funnel_stats([("2026-01-01T00", "start", "count", 1.0), ("2026-01-01T00", "geo", "count", 2.0)])
+
+        entry = next(entry for entry in self.profiler.top(50) if entry["methods"].get("add_funnel_stats"))
+        self.assertTrue(entry["fingerprint"].startswith("INSERT INTO funnel_stats"))
+        self.assertEqual((entry["calls"], entry["rows"], entry["params"]), (1, 2, 4))
+
+    async def test_lock_wait_is_logged_with_plan(self):
+        blocker = sqlite3.connect(self.path, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+
+        async def release():
+            await asyncio.sleep(0.2)
+            blocker.commit()
+
+        with self.assertLogs("payment_qa_bot.slow_query", "WARNING") as logs:
+            await asyncio.gather(release(), self.repo.update_order(1, status="paid"))
+        blocker.close()
+
+        event = logs.records[0].slow_query
+        self.assertEqual(event["method"], "update_order")
+        self.assertTrue(event["lock_wait"])
+        self.assertEqual(event["plan"], ["SEARCH orders USING INTEGER PRIMARY KEY (rowid=?)"])
+        self.assertEqual(self.profiler.top(1)[0]["lock_waits"], 1)
+
+
+class QueryProfileEndpointTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = replace(
+            load_config(require_token=False),
+            db_path=os.path.join(self.tmp.name, "orders.db"),
+            admin_api_token="s3cret",
+        )
+        repo = OrdersRepository(config.db_path, profiler=QueryProfiler())
+        await repo.init()
+        self.client = TestClient(TestServer(create_api_app(repo, CredentialEncryptor(None), config)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+    async def test_requires_admin_token(self):
+        await self.client.get("/api/orders")
+        self.assertEqual((await self.client.get("/api/admin/queries")).status, 401)
+
+        response = await self.client.get(
+            "/api/admin/queries", params={"sort": "calls", "limit": "100"}, headers={"Authorization": "Bearer s3cret"}
+        )
+        body = await response.json()
+        self.assertEqual(response.headers["Cache-Control"], "private, no-store")
+        self.assertTrue(body["enabled"])
+        self.assertTrue(any("list_recent" in query["methods"] for query in body["queries"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
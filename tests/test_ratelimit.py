@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+
+from payment_qa_bot.api.ratelimit import RateLimiter, RateRule, client_address
+from payment_qa_bot.api.server import create_api_app
+from payment_qa_bot.config import load_config
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.ratelimit import TokenBucket
+from payment_qa_bot.services.security import CredentialEncryptor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_bucket_refills_at_rate(self):
+        bucket = TokenBucket(rate=2.0, capacity=2.0, now=0.0)
+
+        self.assertEqual(bucket.try_acquire(0.0), 0.0)
+        self.assertEqual(bucket.try_acquire(0.0), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(0.0), 0.5)
+        self.assertEqual(bucket.try_acquire(0.5), 0.0)
+
+    def test_bucket_never_exceeds_capacity(self):
+        bucket = TokenBucket(rate=10.0, capacity=3.0, now=0.0)
+        bucket.delay(100.0)
+
+        self.assertEqual(bucket.tokens, 3.0)
+
+
+class RateLimiterTests(unittest.TestCase):
+    def test_clients_are_limited_independently_and_refill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(clock=clock)
+        rule = RateRule("draft", rate=1.0, burst=2.0)
+
+        self.assertEqual([limiter.check(rule, "a") for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.check(rule, "a"), 1.0)
+        self.assertEqual(limiter.check(rule, "b"), 0.0)
+        clock.now = 1.0
+        self.assertEqual(limiter.check(rule, "a"), 0.0)
+        self.assertEqual((limiter.allowed, limiter.limited, limiter.limited_by_rule), (4, 1, {"draft": 1}))
+
+    def test_route_bucket_caps_all_clients_together(self):
+        limiter = RateLimiter(clock=FakeClock())
+        rule = RateRule("payloads", rate=1.0, burst=5.0, route_rate=2.0)
+
+        results = [limiter.check(rule, f"client-{index}") for index in range(3)]
+        self.assertEqual(results[:2], [0.0, 0.0])
+        self.assertGreater(results[2], 0.0)
+
+    def test_idle_and_excess_buckets_are_evicted(self):
+        clock = FakeClock()
+        limiter = RateLimiter(max_clients=2, idle_ttl=10.0, clock=clock)
+        rule = RateRule("draft", rate=1.0, burst=1.0)
+        for client in ("a", "b", "c"):
+            limiter.check(rule, client)
+        self.assertEqual(limiter.tracked_clients, 2)
+        clock.now = 20.0
+        limiter.check(rule, "d")
+        self.assertEqual(limiter.tracked_clients, 1)
+
+    def test_real_ip_is_trusted_only_from_private_peers(self):
+        request = make_mocked_request("GET", "/", headers={"X-Real-IP": "203.0.113.9"})
+
+        self.assertEqual(client_address(request.clone(remote="172.18.0.3")), "203.0.113.9")
+        self.assertEqual(client_address(request.clone(remote="8.8.8.8")), "8.8.8.8")
+
+
+class RateLimitMiddlewareTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = replace(
+            load_config(require_token=False),
+            db_path=os.path.join(self.tmp.name, "orders.db"),
+            api_rate_limit=60.0,
+            api_rate_burst=1.0,
+        )
+        repo = OrdersRepository(config.db_path)
+        await repo.init()
+        self.client = TestClient(TestServer(create_api_app(repo, CredentialEncryptor(None), config)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+    async def test_over_limit_gets_429_with_retry_after(self):
+        responses = [
+            await self.client.get("/orders/active_for_user", params={"email": "a@b.co"}, headers={"X-Real-IP": "10.1.1.1"})
+            for _ in range(5)
+        ]
+        self.assertEqual([response.status for response in responses], [200] * 4 + [429])
+        self.assertEqual(responses[-1].headers["Retry-After"], "1")
+        self.assertEqual(responses[-1].headers["Access-Control-Allow-Origin"], "*")
+
+        other = await self.client.get("/orders/active_for_user", headers={"X-Real-IP": "10.1.1.2"})
+        self.assertEqual(other.status, 200)
+        self.assertEqual((await self.client.get("/api/stats")).status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
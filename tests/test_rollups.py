@@ -0,0 +1,94 @@
+import os
+import re
+import sqlite3
+import unittest
+from datetime import datetime
+
+from payment_qa_bot.models.db import REVENUE_STATUSES
+
+from payment_qa_bot.services.rollups import compaction_cutoff
+from tests.test_api_server import ApiTestCase, make_create
+
+EXPECTED_BY_DAY = """
+    SELECT substr(created_at, 1, 10) || 'T00:00:00', COALESCE(geo, ''), COUNT(*),
+           SUM(CASE WHEN status IN ('paid', 'completed') THEN price_eur ELSE 0 END)
+    FROM orders GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+
+class RollupTests(ApiTestCase):
+    def move_orders(self, days):
+        with sqlite3.connect(self.repo._db_path) as db:
+            for order_id, day in days.items():
+                created_at = f"2024-03-{day:02d}T10:30:00"
+                db.execute("UPDATE orders SET created_at = ? WHERE order_id = ?", (created_at, order_id))
+            return db.execute(EXPECTED_BY_DAY).fetchall()
+
+    async def assert_rollups_match(self, expected):
+        rows = await self.repo.order_timeseries("day", "geo")
+        self.assertEqual([tuple(row) for row in rows], [tuple(row) for row in expected])
+
+    async def test_triggers_and_compaction_keep_rollups_exact(self):
+        expected = self.move_orders({1: 1, 2: 1, 3: 2, 4: 4, 5: 4, 6: 5, 7: 5})
+        await self.assert_rollups_match(expected)
+
+        self.assertGreater(await self.repo.compact_rollups("2024-03-05T00:00:00"), 0)
+        await self.repo.update_order(4, status="paid")
+        await self.repo.update_order(5, status="in_progress")
+        await self.repo.update_order(6, geo="PK")
+        with sqlite3.connect(self.repo._db_path) as db:
+            db.execute("DELETE FROM orders WHERE order_id = 2")
+            expected = db.execute(EXPECTED_BY_DAY).fetchall()
+        await self.assert_rollups_match(expected)
+
+        hourly = await self.repo.order_timeseries("hour", "geo", since="2024-03-05T00:00:00")
+        self.assertEqual({row[0] for row in hourly}, {"2024-03-05T10:00:00"})
+        weekly = await self.repo.order_timeseries("week")
+        self.assertEqual([(row[0], row[2]) for row in weekly], [("2024-02-26T00:00:00", 2), ("2024-03-04T00:00:00", 4)])
+
+    async def test_rollups_are_rebuilt_when_the_revenue_rule_changes(self):
+        expected = self.move_orders({1: 1, 2: 1, 3: 2, 4: 4, 5: 4, 6: 5, 7: 5})
+        await self.repo.compact_rollups("2024-03-03T00:00:00")
+        with sqlite3.connect(self.repo._db_path) as db:
+            db.execute("UPDATE order_rollup_state SET revenue_statuses = 'paid,in_progress,completed'")
+            db.execute("UPDATE order_rollup_daily SET revenue = revenue + 1000")
+        await self.repo.init()
+
+        await self.assert_rollups_match(expected)
+        with sqlite3.connect(self.repo._db_path) as db:
+            self.assertEqual(db.execute("SELECT compacted_before FROM order_rollup_state").fetchone()[0], "")
+
+    async def test_timeseries_endpoint(self):
+        self.move_orders({1: 1, 2: 1, 3: 2, 4: 2, 5: 3, 6: 3, 7: 3})
+        await self.repo.create_order(make_create(None))
+
+        response = await self.client.get(
+            "/api/stats/timeseries",
+            params={"metric": "revenue", "group": "geo", "bucket": "day", "from": "2024-03-01", "to": "2024-03-03"},
+        )
+        body = await response.json()
+
+        self.assertEqual(body["buckets"], ["2024-03-01T00:00:00", "2024-03-02T00:00:00"])
+        self.assertEqual({item["key"]: item["values"] for item in body["series"]}, {"BR": [85, 85], "IN": [85, 0]})
+        self.assertEqual((await self.client.get("/api/stats/timeseries", params={"group": "email"})).status, 400)
+
+
+class RevenueRuleTests(unittest.TestCase):
+    def test_dashboard_uses_the_server_revenue_statuses(self):
+        path = os.path.join(os.path.dirname(__file__), os.pardir, "admin", "app.js")
+        with open(path, encoding="utf-8") as handle:
+            source = handle.read()
+        declared = re.search(r"const REVENUE_STATUSES = \[([^\]]*)\];", source)
+        self.assertIsNotNone(declared)
+        self.assertEqual(tuple(re.findall(r"'([a-z_]+)'", declared.group(1))), REVENUE_STATUSES)
+        # every other status list in the dashboard would be a second, divergent definition
+        self.assertEqual(len(re.findall(r"\[\s*'paid'", source)), 1)
+
+
+class CompactionCutoffTests(unittest.TestCase):
+    def test_cutoff_is_a_day_boundary(self):
+        self.assertEqual(compaction_cutoff(datetime(2024, 3, 20, 15, 45), 14), "2024-03-06T00:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import sqlite3
+import unittest
+from unittest import mock
+
+from payment_qa_bot.models.db import SEARCH_WINDOW, build_search_query
+from payment_qa_bot.texts.catalog import TEXTS
+from tests.test_api_server import ApiTestCase
+
+
+class SearchTests(ApiTestCase):
+    async def search_ids(self, text):
+        return [order.order_id for order in await self.repo.search_orders(text)]
+
+    async def test_triggers_keep_the_index_in_sync(self):
+        await self.repo.update_order(3, comments="Paytm checkout fails", payment_txid="0xABCDEF12")
+        await self.repo.update_order(5, username="bob_payments")
+        self.assertEqual(await self.search_ids("paytm"), [3])
+        self.assertEqual(await self.search_ids("0xabc"), [3])
+        self.assertEqual(await self.search_ids("bob pay"), [5])
+
+        await self.repo.update_order(3, comments="fixed")
+        with sqlite3.connect(self.repo._db_path) as db:
+            db.execute("DELETE FROM orders WHERE order_id = 5")
+        self.assertEqual(await self.search_ids("paytm"), [])
+        self.assertEqual(await self.search_ids("bob"), [])
+        self.assertEqual(sorted(await self.search_ids("alice")), [1, 2, 3, 4, 6, 7])
+
+    async def test_identifiers_outrank_free_text(self):
+        await self.repo.update_order(2, comments="same as deadbeef")
+        await self.repo.update_order(4, payment_txid="deadbeef")
+
+        self.assertEqual(await self.search_ids("deadbeef"), [4, 2])
+
+    async def test_existing_orders_are_indexed_on_first_start(self):
+        with sqlite3.connect(self.repo._db_path) as db:
+            db.execute("DROP TABLE orders_fts")
+            for name in ("insert", "delete", "update"):
+                db.execute(f"DROP TRIGGER trg_orders_search_{name}")
+        await self.repo.init()
+
+        self.assertEqual(len(await self.search_ids("alice")), 7)
+
+    async def test_endpoint_paginates(self):
+        response = await self.client.get("/api/orders/search", params={"q": "alice", "limit": "5", "fields": "id"})
+        body = await response.json()
+        self.assertEqual((len(body["orders"]), body["hasMore"], body["nextOffset"]), (5, True, 5))
+
+        body = await (await self.client.get("/api/orders/search", params={"q": "alice", "offset": "5"})).json()
+        self.assertEqual((len(body["orders"]), body["hasMore"], body["window"]), (2, False, SEARCH_WINDOW))
+        self.assertEqual((await self.client.get("/api/orders/search", params={"q": " "})).status, 400)
+
+    async def test_pages_stop_at_the_ranking_window(self):
+        with mock.patch("payment_qa_bot.models.db.SEARCH_WINDOW", 4), mock.patch(
+            "payment_qa_bot.api.server.SEARCH_WINDOW", 4
+        ):
+            first = await (await self.client.get("/api/orders/search", params={"q": "alice", "limit": "2"})).json()
+            edge = await (
+                await self.client.get("/api/orders/search", params={"q": "alice", "limit": "2", "offset": "2"})
+            ).json()
+
+        self.assertEqual((len(first["orders"]), first["hasMore"]), (2, True))
+        self.assertEqual((len(edge["orders"]), edge["hasMore"], edge["nextOffset"]), (2, False, None))
+
+
+class SearchQueryTests(unittest.TestCase):
+    def test_input_cannot_use_query_syntax(self):
+        self.assertEqual(build_search_query('NOT "x" OR'), '"NOT"* """x"""* "OR"*')
+        self.assertIsNone(build_search_query("@ - *"))
+        self.assertEqual(build_search_query("u ab"), '"u" "ab"*')
+
+    def test_usage_text_is_valid_telegram_html(self):
+        # the bot sends with parse_mode=HTML, where an unknown tag such as <text> rejects the whole message
+        for language in TEXTS.messages:
+            usage = TEXTS.get("admin.find.usage", language)
+            self.assertNotRegex(usage, r"<[^>]*>")
+            self.assertIn("&lt;", usage)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading
+import unittest
+from unittest import mock
+
+from payment_qa_bot.api.service import WorkerSupervisor
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.pid = 1
+        self.alive = alive
+        self.stopped = False
+
+    def is_alive(self):
+        return self.alive and not self.stopped
+
+
+class ReloadTests(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = WorkerSupervisor(workers=2, shutdown_timeout=1.0)
+        self.old = [FakeProcess(), FakeProcess()]
+        self.supervisor._processes = list(self.old)
+        self.supervisor._context = mock.Mock(Event=threading.Event)
+        self.supervisor._stop_process = lambda process: setattr(process, "stopped", True)
+
+    def test_old_worker_is_stopped_only_after_the_new_one_is_ready(self):
+        def spawn(ready):
+            self.assertFalse(any(process.stopped for process in self.supervisor._processes))
+            ready.set()
+            return FakeProcess()
+
+        self.supervisor._spawn = spawn
+        self.supervisor._reload()
+
+        self.assertTrue(all(process.stopped for process in self.old))
+        self.assertFalse(any(process.stopped for process in self.supervisor._processes))
+
+    def test_reload_is_aborted_when_the_new_worker_dies(self):
+        dead = FakeProcess(alive=False)
+        self.supervisor._spawn = lambda ready: dead
+
+        with self.assertLogs("payment_qa_bot.api.service", "ERROR"):
+            self.supervisor._reload()
+
+        self.assertEqual(self.supervisor._processes, self.old)
+        self.assertFalse(any(process.stopped for process in self.old))
+        self.assertTrue(dead.stopped)
+
+
+if __name__ == "__main__":
+    unittest.main()
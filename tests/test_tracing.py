@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+from payment_qa_bot.models.db import OrdersRepository
+from payment_qa_bot.services.logs import trace_sampled
+from payment_qa_bot.services.tracing import TRACER, otlp_payload
+from tests.test_api_server import ApiTestCase, make_create
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def close(self):
+        pass
+
+
+class TracerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = OrdersRepository(os.path.join(self.tmp.name, "orders.db"))
+        await self.repo.init()
+        self.exporter = MemoryExporter()
+        TRACER.configure(1.0, self.exporter)
+        self.addCleanup(TRACER.shutdown)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_spans_nest_from_handler_to_repository(self):
+        with TRACER.start_trace("update", "trace-1", update_id=7):
+            with TRACER.span("handler"):
+                await self.repo.create_order(make_create("IN"))
+        TRACER.shutdown()
+
+        spans = {span.name: span for span in self.exporter.spans}
+        self.assertEqual(set(spans), {"update", "handler", "db.create_order"})
+        self.assertIsNone(spans["update"].parent_id)
+        self.assertEqual(spans["handler"].parent_id, spans["update"].span_id)
+        self.assertEqual(spans["db.create_order"].parent_id, spans["handler"].span_id)
+        self.assertEqual(spans["db.create_order"].attributes["rows"], 1)
+        self.assertTrue(all(span.trace_id == "trace-1" for span in spans.values()))
+        self.assertGreaterEqual(spans["update"].end_ns, spans["db.create_order"].end_ns)
+
+        otlp = otlp_payload([spans["db.create_order"]])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(len(otlp["traceId"]), 32)
+        self.assertEqual(otlp["parentSpanId"], spans["handler"].span_id)
+
+    async def test_unsampled_traces_create_no_spans(self):
+        TRACER.sample_rate = 0.5
+        kept = [trace_id for trace_id in map(str, range(50)) if trace_sampled(trace_id, 0.5)]
+        for trace_id in map(str, range(50)):
+            with TRACER.start_trace("update", trace_id):
+                await self.repo.get_order(1)
+        TRACER.shutdown()
+
+        roots = [span.trace_id for span in self.exporter.spans if span.parent_id is None]
+        self.assertEqual(roots, kept)
+        self.assertEqual(len(self.exporter.spans), 2 * len(kept))
+
+
+class RequestTraceTests(ApiTestCase):
+    async def test_request_span_uses_request_id(self):
+        exporter = MemoryExporter()
+        TRACER.configure(1.0, exporter)
+        try:
+            await self.client.get("/api/orders/1", headers={"X-Request-ID": "lb-7"})
+        finally:
+            TRACER.shutdown()
+
+        root = next(span for span in exporter.spans if span.parent_id is None)
+        self.assertEqual((root.name, root.trace_id), ("GET /api/orders/{order_id}", "lb-7"))
+        self.assertEqual(root.attributes["status"], 200)
+        self.assertIn("db.get_order", [span.name for span in exporter.spans])
+
+
+if __name__ == "__main__":
+    unittest.main()